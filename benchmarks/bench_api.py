@@ -0,0 +1,147 @@
+"""
+Пропускная способность JSON API и HTML-ленты.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_api.py --posts 100000
+
+Синтетические авторы, группы и посты пишутся во временную базу sqlite.
+Сначала сравнивается сериализация страницы из объектов Post и из
+кортежей values_list, затем полный запрос к view: HTML главной страницы
+без кэша фрагментов и с ним и /api/posts/ с теми же полями.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('YATUBE_CACHE', 'locmem')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from posts import views  # noqa: E402
+from posts.api import FIELDS, image_url, posts_page  # noqa: E402
+from posts.models import Group, Post, User  # noqa: E402
+
+WORDS = ['лента', 'пост', 'кот', 'новость', 'день', 'город', 'фото', 'друг']
+
+
+def fill(amount, seed=1):
+    generator = random.Random(seed)
+    # bulk_create в sqlite не возвращает первичные ключи
+    users = [
+        User.objects.create(
+            username=f'user{number}', first_name='Имя', last_name='Автор')
+        for number in range(100)
+    ]
+    groups = [
+        Group.objects.create(
+            title=f'Группа {number}', slug=f'group{number}',
+            description='Описание', author=users[0])
+        for number in range(20)
+    ]
+    Post.objects.bulk_create((
+        Post(
+            text=' '.join(generator.choices(WORDS, k=30)),
+            author=generator.choice(users),
+            group=generator.choice(groups + [None]),
+            likes_count=generator.randint(0, 50),
+            comments_count=generator.randint(0, 10),
+        )
+        for _ in range(amount)
+    ), batch_size=400)
+
+
+def instances_page(limit):
+    """ Та же страница через объекты модели, как у обычного
+    сериализатора """
+    posts = Post.objects.select_related('author', 'group').order_by(
+        '-pub_date', '-id')[:limit]
+    return [
+        {
+            'id': post.id,
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'author': post.author.username,
+            'group': post.group.slug if post.group else None,
+            'image': image_url(post.image.name),
+            'likes': post.likes_count,
+            'comments': post.comments_count,
+        }
+        for post in posts
+    ]
+
+
+def measure(operation, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return (
+        statistics.median(timings) * 1e3,
+        timings[int(len(timings) * 0.99) - 1] * 1e3,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    start = time.perf_counter()
+    fill(args.posts)
+    print(f'{args.posts} постов записаны за '
+          f'{time.perf_counter() - start:.1f} с')
+
+    factory = RequestFactory()
+
+    def request(path, **params):
+        request = factory.get(path, params)
+        request.user = AnonymousUser()
+        request.session = {}
+        return request
+
+    fields = ','.join(FIELDS)
+    page_request = request('/api/posts/', fields=fields, limit=args.limit)
+
+    def html(cold):
+        if cold:
+            cache.clear()
+        views.index(request('/'))
+
+    operations = [
+        (f'objects x{args.limit}', lambda: instances_page(args.limit)),
+        (f'values x{args.limit}',
+         lambda: posts_page(page_request, Post.objects.all())),
+        ('html index cold', lambda: html(cold=True)),
+        ('html index warm', lambda: html(cold=False)),
+        ('api posts', lambda: views.api_posts(request('/api/posts/'))),
+    ]
+    print(f'{"operation":<18} {"p50, мс":>10} {"p99, мс":>10} '
+          f'{"запросов/с":>12}')
+    for name, operation in operations:
+        p50, p99 = measure(operation, args.iterations)
+        print(f'{name:<18} {p50:>10.2f} {p99:>10.2f} {1e3 / p50:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Задержка подсказок автодополнения.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_autocomplete.py --entries 1000000
+
+Индекс строится из синтетических пользователей с логином и полным
+именем. Измеряются подсказки для коротких и длинных префиксов и
+добавление нового пользователя.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from posts.autocomplete import (  # noqa: E402
+    USER, PrefixIndex, normalize, user_item,
+)
+
+NAMES = ['Анна', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Жанна', 'Иван']
+PREFIXES = ['a', 'ab', 'abc', 'анна', 'вера с']
+
+
+def users(amount, seed=1):
+    generator = random.Random(seed)
+    for pk in range(1, amount + 1):
+        username = ''.join(generator.choices(string.ascii_lowercase, k=8))
+        surname = ''.join(generator.choices('абвгдеклмнопрст', k=7))
+        yield USER, pk, user_item(
+            username, generator.choice(NAMES), surname.capitalize())
+
+
+def measure(operation, iterations):
+    timings = []
+    for number in range(iterations):
+        start = time.perf_counter()
+        operation(number)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return (
+        statistics.median(timings) * 1e6,
+        timings[int(len(timings) * 0.99) - 1] * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = PrefixIndex(users(args.entries))
+    print(f'{len(index.rows)} ключей, индекс построен за '
+          f'{time.perf_counter() - start:.1f} с')
+
+    print(f'{"operation":<16} {"p50, мкс":>10} {"p99, мкс":>10}')
+    for prefix in PREFIXES:
+        key = normalize(prefix)
+        p50, p99 = measure(lambda _: index.lookup(key), args.iterations)
+        print(f'{"lookup " + repr(prefix):<16} {p50:>10.1f} {p99:>10.1f}')
+    pk = args.entries
+    p50, p99 = measure(
+        lambda number: index.add(
+            USER, pk + number + 1, user_item(f'new{number}', 'Ян', 'Новый')),
+        min(args.iterations, 1000))
+    print(f'{"add":<16} {p50:>10.1f} {p99:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Задержка попадания в кэш для разных бэкендов.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_cache.py --iterations 20000
+    python benchmarks/bench_cache.py --redis redis://localhost:6379/15
+
+Для каждого бэкенда измеряется get одного ключа (карточка поста около
+3 КБ HTML) и get_many десяти ключей (все карточки страницы ленты).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache.backends.filebased import FileBasedCache  # noqa: E402
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+from yatube.cache_backends import RedisCache, SQLiteCache  # noqa: E402
+
+CARD = '<div class="card">' + 'x' * 3000 + '</div>'
+PAGE_KEYS = [f'bench:card:{number}' for number in range(10)]
+
+
+def backends(redis_url):
+    directory = tempfile.mkdtemp()
+    yield 'locmem', LocMemCache('bench', {})
+    yield 'filebased', FileBasedCache(os.path.join(directory, 'files'), {})
+    yield 'sqlite', SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {})
+    if redis_url:
+        yield 'redis', RedisCache(redis_url, {'KEY_PREFIX': 'bench'})
+
+
+def measure(operation, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return (
+        statistics.median(timings) * 1e6,
+        timings[int(len(timings) * 0.99) - 1] * 1e6,
+        iterations / sum(timings),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--redis', help='адрес redis://, если есть сервер')
+    args = parser.parse_args()
+
+    print(f'{"backend":<10} {"operation":<9} {"p50, мкс":>10} '
+          f'{"p99, мкс":>10} {"оп/с":>10}')
+    for name, cache in backends(args.redis):
+        cache.set_many({key: CARD for key in PAGE_KEYS}, None)
+        operations = {
+            'get': lambda: cache.get(PAGE_KEYS[0]),
+            'get_many': lambda: cache.get_many(PAGE_KEYS),
+        }
+        for operation, call in operations.items():
+            p50, p99, rate = measure(call, args.iterations)
+            print(f'{name:<10} {operation:<9} {p50:>10.1f} '
+                  f'{p99:>10.1f} {rate:>10.0f}')
+        cache.clear()
+
+
+if __name__ == '__main__':
+    main()
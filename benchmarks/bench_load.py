@@ -0,0 +1,416 @@
+"""
+Задержка и число запросов к базе для всех адресов posts.urls.
+
+Запуск из корня проекта на базе, заполненной seed_bench:
+
+    python manage.py seed_bench --users 100000 --posts 1000000
+    python benchmarks/bench_load.py --iterations 200
+
+Запросы идут в WSGI-приложение yatube.wsgi в том же процессе, со всеми
+middleware, сессией и CSRF. Страницы смотрит пользователь с самой
+большой лентой подписок, анонимные страницы - гость. Посты, авторы и
+группы выбираются случайно с весом по числу лайков и постов, как их
+выбирали бы живые читатели. Изменяющие адреса идут парами: созданные
+посты, комментарии, группы, лайки и подписки затем удаляются, и база
+остаётся прежней. Для каждого адреса печатаются p50, p95 и p99,
+среднее число SQL-запросов и запросов в секунду.
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from collections import deque
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import caches  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils.crypto import get_random_string  # noqa: E402
+
+from posts.models import Comment, Follow, Group, Like, Post, User  # noqa
+from posts.urls import urlpatterns  # noqa: E402
+from yatube.wsgi import application  # noqa: E402
+
+SAMPLE_SIZE = 1000
+
+
+class Workload:
+    """ Запросы для каждого имени адреса из posts.urls: метод, путь,
+    данные формы и нужен ли вход. Методы вызываются по порядку адресов
+    в ROUTES, удаляющие адреса разбирают созданное до них """
+
+    def __init__(self, generator, prefix):
+        self.random = generator
+        self.viewer = User.objects.annotate(
+            follows_total=Count('follower')).order_by('-follows_total').first()
+        self.last_ids = {
+            model: model.objects.order_by('-pk').values_list(
+                'pk', flat=True).first() or 0
+            for model in (Post, Comment, Group)
+        }
+        self.posts = list(
+            Post.objects.order_by('-likes_count').values_list(
+                'pk', 'author__username', 'likes_count')[:SAMPLE_SIZE])
+        self.authors = list(
+            User.objects.annotate(posts_total=Count('posts'))
+            .filter(posts_total__gt=0).order_by('-posts_total')
+            .values_list('username', 'posts_total')[:SAMPLE_SIZE])
+        self.groups = list(
+            Group.objects.order_by('-posts_count').values_list(
+                'slug', 'posts_count')[:SAMPLE_SIZE])
+        self.words = Post.objects.order_by('-pk').values_list(
+            'text', flat=True).first().split()
+        self.liked = set(Like.objects.filter(user=self.viewer).values_list(
+            'post_id', flat=True))
+        self.followed = set(Follow.objects.filter(
+            user=self.viewer).values_list('author__username', flat=True))
+        self.prefix = prefix
+        self.number = 0
+        self.likes = deque()
+        self.follows = deque()
+        self.created = {}
+
+    def weighted(self, rows):
+        """ Случайная строка с весом по последней колонке """
+        return self.random.choices(
+            rows, weights=[row[-1] + 1 for row in rows])[0]
+
+    def any_post(self):
+        return self.weighted(self.posts)[:2]
+
+    def any_author(self):
+        return self.weighted(self.authors)[0]
+
+    def any_group(self):
+        return self.weighted(self.groups)[0]
+
+    def new_ids(self, model, **filters):
+        """ Записи зрителя, созданные во время замера, по порядку """
+        if model not in self.created:
+            self.created[model] = deque(
+                model.objects.filter(
+                    pk__gt=self.last_ids[model], **filters,
+                ).order_by('pk').values_list('pk', flat=True))
+        return self.created[model]
+
+    def next_text(self):
+        self.number += 1
+        return ' '.join(self.random.choices(self.words, k=10))
+
+    # Открытые страницы
+
+    def index(self):
+        return 'GET', reverse('index'), None, False
+
+    def group(self):
+        return 'GET', reverse('group', args=[self.any_group()]), None, False
+
+    def profile(self):
+        return 'GET', reverse('profile', args=[self.any_author()]), None, False
+
+    def post(self):
+        post_id, username = self.any_post()
+        return 'GET', reverse('post', args=[username, post_id]), None, False
+
+    def trending(self):
+        return 'GET', reverse('trending'), None, False
+
+    def search(self):
+        query = urlencode({'q': self.random.choice(self.words)})
+        return 'GET', f'{reverse("search")}?{query}', None, False
+
+    def autocomplete(self):
+        query = urlencode({'q': self.any_author()[:3]})
+        return 'GET', f'{reverse("autocomplete")}?{query}', None, False
+
+    def api_posts(self):
+        return 'GET', reverse('api_posts'), None, False
+
+    def api_group_posts(self):
+        return ('GET', reverse('api_group_posts', args=[self.any_group()]),
+                None, False)
+
+    def api_profile_posts(self):
+        return ('GET', reverse('api_profile_posts', args=[self.any_author()]),
+                None, False)
+
+    def site_feed(self):
+        return 'GET', reverse('site_feed', args=['atom']), None, False
+
+    def group_feed(self):
+        return ('GET', reverse('group_feed', args=[self.any_group(), 'rss']),
+                None, False)
+
+    def profile_feed(self):
+        return ('GET', reverse(
+            'profile_feed', args=[self.any_author(), 'atom']), None, False)
+
+    # Страницы для вошедших
+
+    def follow_index(self):
+        return 'GET', reverse('follow_index'), None, True
+
+    def groups_view(self):
+        return 'GET', reverse('groups_view'), None, True
+
+    def export(self):
+        return ('GET', f'{reverse("export", args=[self.viewer.username])}'
+                f'?format=ndjson', None, True)
+
+    # Изменения, которые затем отменяются
+
+    def new_post(self):
+        return 'POST', reverse('new_post'), {'text': self.next_text()}, True
+
+    def post_edit(self):
+        post_id = self.new_ids(Post, author=self.viewer)[0]
+        self.created[Post].rotate(-1)
+        return ('POST', reverse(
+            'post_edit', args=[self.viewer.username, post_id]),
+            {'text': self.next_text()}, True)
+
+    def delete_post(self):
+        post_id = self.new_ids(Post, author=self.viewer).popleft()
+        return ('GET', reverse(
+            'delete_post', args=[self.viewer.username, post_id]), None, True)
+
+    def new_group(self):
+        slug = f'{self.prefix}{self.number}'
+        self.number += 1
+        return 'POST', reverse('new_group'), {
+            'title': slug, 'slug': slug, 'description': self.next_text(),
+        }, True
+
+    def group_edit(self):
+        group_id = self.new_ids(Group, author=self.viewer)[0]
+        self.created[Group].rotate(-1)
+        slug = Group.objects.values_list('slug', flat=True).get(pk=group_id)
+        return 'POST', reverse('group_edit', args=[slug]), {
+            'title': slug, 'slug': slug, 'description': self.next_text(),
+        }, True
+
+    def group_delete(self):
+        group_id = self.new_ids(Group, author=self.viewer).popleft()
+        slug = Group.objects.values_list('slug', flat=True).get(pk=group_id)
+        return 'GET', reverse('group_delete', args=[slug]), None, True
+
+    def add_comment(self):
+        post_id, username = self.any_post()
+        return ('POST', reverse('add_comment', args=[username, post_id]),
+                {'text': self.next_text()}, True)
+
+    def comment_edit(self):
+        comment_id = self.new_ids(Comment, author=self.viewer)[0]
+        self.created[Comment].rotate(-1)
+        return ('POST', self.comment_url('comment_edit', comment_id),
+                {'text': self.next_text()}, True)
+
+    def delete_comment(self):
+        comment_id = self.new_ids(Comment, author=self.viewer).popleft()
+        return ('GET', self.comment_url('delete_comment', comment_id),
+                None, True)
+
+    def comment_url(self, name, comment_id):
+        post_id, username = Comment.objects.values_list(
+            'post_id', 'post__author__username').get(pk=comment_id)
+        return reverse(name, args=[username, post_id, comment_id])
+
+    def post_like(self):
+        post_id, username = self.any_post()
+        while post_id in self.liked:
+            post_id, username = self.any_post()
+        self.liked.add(post_id)
+        self.likes.append((username, post_id))
+        return ('GET', reverse('post_like', args=[username, post_id]),
+                None, True)
+
+    def post_unlike(self):
+        username, post_id = self.likes.popleft()
+        self.liked.discard(post_id)
+        return ('GET', reverse('post_unlike', args=[username, post_id]),
+                None, True)
+
+    def profile_follow(self):
+        username = self.any_author()
+        while username in self.followed or username == self.viewer.username:
+            username = self.any_author()
+        self.followed.add(username)
+        self.follows.append(username)
+        return ('GET', reverse('profile_follow', args=[username]),
+                None, True)
+
+    def profile_unfollow(self):
+        username = self.follows.popleft()
+        self.followed.discard(username)
+        return ('GET', reverse('profile_unfollow', args=[username]),
+                None, True)
+
+
+# Порядок замера: создающие адреса раньше изменяющих и удаляющих
+ROUTES = (
+    'index', 'group', 'profile', 'post', 'trending', 'search',
+    'autocomplete', 'api_posts', 'api_group_posts', 'api_profile_posts',
+    'site_feed', 'group_feed', 'profile_feed',
+    'follow_index', 'groups_view', 'export',
+    'new_post', 'post_edit', 'delete_post',
+    'new_group', 'group_edit', 'group_delete',
+    'add_comment', 'comment_edit', 'delete_comment',
+    'post_like', 'post_unlike',
+    'profile_follow', 'profile_unfollow',
+)
+
+# Изменяющие адреса замеряются только вместе: удаляющему нужно созданное,
+# а без удаляющего созданные записи остались бы в базе
+CHAINS = (
+    ('new_post', 'post_edit', 'delete_post'),
+    ('new_group', 'group_edit', 'group_delete'),
+    ('add_comment', 'comment_edit', 'delete_comment'),
+    ('post_like', 'post_unlike'),
+    ('profile_follow', 'profile_unfollow'),
+)
+
+
+def with_chains(names):
+    """ Выбранные адреса вместе с парными им изменяющими """
+    names = set(names)
+    for chain in CHAINS:
+        if names & set(chain):
+            names.update(chain)
+    return names
+
+
+class Browser:
+    """ Клиент WSGI-приложения с сессией и CSRF-токеном в cookie """
+
+    def __init__(self, user=None):
+        self.token = get_random_string(64)
+        self.cookies = {'csrftoken': self.token}
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            self.cookies['sessionid'] = client.cookies['sessionid'].value
+
+    def request(self, method, path, data=None):
+        path, _, query = path.partition('?')
+        body = urlencode(data or {}).encode()
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': '127.0.0.1',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': '127.0.0.1',
+            'HTTP_COOKIE': '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()),
+            'HTTP_X_CSRFTOKEN': self.token,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = application(
+            environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            # Потоковые ответы пишутся только при чтении тела
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return int(status[0].split()[0])
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def measure(browsers, workload, name, iterations, warmup):
+    build = getattr(workload, name)
+    timings = []
+    queries = errors = 0
+    for number in range(warmup + iterations):
+        method, path, data, login = build()
+        browser = browsers[login]
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            status = browser.request(method, path, data)
+            elapsed = time.perf_counter() - start
+        if status >= 400:
+            errors += 1
+        if number >= warmup:
+            timings.append(elapsed)
+            queries += len(captured)
+    timings.sort()
+    return timings, queries / iterations, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--prefix', default='load',
+                        help='Начало адресов создаваемых групп')
+    parser.add_argument('--cold', action='store_true',
+                        help='Очищать кэш перед каждым адресом')
+    parser.add_argument('--only', nargs='*', default=ROUTES,
+                        help='Замерить только эти адреса, изменяющие '
+                             'вместе с парными')
+    args = parser.parse_args()
+    unknown = set(args.only) - set(ROUTES)
+    if unknown:
+        parser.error(f'неизвестные адреса: {", ".join(sorted(unknown))}')
+    only = with_chains(args.only)
+
+    if not Post.objects.exists():
+        sys.exit('База пуста, сначала запустите manage.py seed_bench')
+    missing = {pattern.name for pattern in urlpatterns} - set(ROUTES)
+    if missing:
+        print(f'Без замера: {", ".join(sorted(missing))}')
+    workload = Workload(random.Random(args.seed), args.prefix)
+    browsers = {False: Browser(), True: Browser(workload.viewer)}
+    print(f'{Post.objects.count()} постов, {User.objects.count()} '
+          f'пользователей, зритель {workload.viewer.username}')
+    print(f'{"адрес":<18} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9} '
+          f'{"SQL":>6} {"запросов/с":>11} {"ошибок":>7}')
+    total_time = total_requests = 0
+    for name in ROUTES:
+        if name not in only:
+            continue
+        if args.cold:
+            for cache in caches.all():
+                cache.clear()
+        timings, queries, errors = measure(
+            browsers, workload, name, args.iterations, args.warmup)
+        spent = sum(timings)
+        total_time += spent
+        total_requests += len(timings)
+        print(f'{name:<18} {percentile(timings, 0.5) * 1e3:>9.2f} '
+              f'{percentile(timings, 0.95) * 1e3:>9.2f} '
+              f'{percentile(timings, 0.99) * 1e3:>9.2f} '
+              f'{queries:>6.1f} {len(timings) / spent:>11.0f} {errors:>7}')
+    print(f'Всего {total_requests} запросов, '
+          f'{total_requests / total_time:.0f} запросов/с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Задержка полнотекстового поиска по постам.
+
+Запуск из корня проекта:
+
+    python benchmarks/bench_search.py --posts 1000000
+    python benchmarks/bench_search.py --posts 100000 --fallback
+
+Синтетические посты из 20-60 слов со словарём, распределённым по закону
+Ципфа, пишутся в отдельную базу sqlite с той же таблицей FTS5, что
+создаёт миграция. Измеряется первая страница выдачи для редкого,
+частого и составного запросов. С --fallback те же запросы выполняются
+в обратном индексе в памяти, нужном базам без FTS5.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from posts.search import (  # noqa: E402
+    FTS_TABLE, FTS5Index, InvertedIndex, tokenize,
+)
+from posts.settings import POSTS_PER_PAGE  # noqa: E402
+
+VOCABULARY = 20000
+QUERIES = {
+    'rare': 'слово19000',
+    'common': 'слово3',
+    'phrase': 'слово10 слово200',
+}
+
+
+def posts(amount, seed=1):
+    generator = random.Random(seed)
+    words = [f'слово{number}' for number in range(VOCABULARY)]
+    weights = list(accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+    for post_id in range(1, amount + 1):
+        length = generator.randint(20, 60)
+        yield post_id, ' '.join(
+            generator.choices(words, cum_weights=weights, k=length))
+
+
+def fts5_database(amount):
+    path = os.path.join(tempfile.mkdtemp(), 'search.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.execute(
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+        f"text, tokenize = 'unicode61 remove_diacritics 0')")
+    with connection:
+        connection.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (?, ?)',
+            posts(amount))
+        connection.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return connection
+
+
+def fts5_search(connection):
+    sql = FTS5Index.query_sql(None).replace('%s', '?')
+
+    def search(query):
+        params = FTS5Index.query_params(
+            tokenize(query), None, POSTS_PER_PAGE + 1)
+        return connection.execute(sql, params).fetchall()
+    return search
+
+
+def fallback_search(amount):
+    index = InvertedIndex()
+    index.build(posts(amount))
+
+    def search(query):
+        return index.search(tokenize(query), None, POSTS_PER_PAGE + 1)
+    return search
+
+
+def measure(operation, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return (
+        statistics.median(timings) * 1e3,
+        timings[int(len(timings) * 0.99) - 1] * 1e3,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--fallback', action='store_true',
+                        help='измерить и обратный индекс в памяти')
+    args = parser.parse_args()
+
+    engines = []
+    start = time.perf_counter()
+    engines.append(('fts5', fts5_search(fts5_database(args.posts))))
+    print(f'fts5: индекс построен за {time.perf_counter() - start:.1f} с')
+    if args.fallback:
+        start = time.perf_counter()
+        engines.append(('fallback', fallback_search(args.posts)))
+        print(f'fallback: индекс построен за '
+              f'{time.perf_counter() - start:.1f} с')
+
+    print(f'{"engine":<10} {"query":<8} {"p50, мс":>10} {"p99, мс":>10}')
+    for name, search in engines:
+        for query_name, query in QUERIES.items():
+            p50, p99 = measure(lambda: search(query), args.iterations)
+            print(f'{name:<10} {query_name:<8} {p50:>10.2f} {p99:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_cache():
+    """ Общий кэш во временном каталоге на время прогона pytest """
+    from yatube.testing import isolated_caches
+    with isolated_caches():
+        yield
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post, Like
+from .search import search_hits, tokenize
+from .settings import ADMIN_SEARCH_LIMIT
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +11,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = ('-пусто-')
 
+    def get_search_results(self, request, queryset, search_term):
+        """ Поиск по полнотекстовому индексу вместо LIKE '%...%' """
+        if not tokenize(search_term):
+            return super().get_search_results(
+                request, queryset, search_term)
+        hits = search_hits(search_term, limit=ADMIN_SEARCH_LIMIT)
+        return queryset.filter(id__in=[hit.id for hit in hits]), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
@@ -0,0 +1,102 @@
+from django.http import JsonResponse
+
+from .models import Post
+from .paginator import (
+    BACKWARD, FORWARD, encode_values, keyset_window, read_cursor,
+    trim_window,
+)
+from .settings import API_MAX_LIMIT, POSTS_PER_PAGE
+
+KEYS = ('pub_date', 'id')
+
+# Поле ответа и поле для values_list
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'likes': 'likes_count',
+    'comments': 'comments_count',
+}
+
+IMAGE_STORAGE = Post._meta.get_field('image').storage
+
+
+def image_url(name):
+    return IMAGE_STORAGE.url(name) if name else None
+
+
+# Преобразования значений, которые json не умеет сам
+CONVERTERS = {
+    'pub_date': lambda value: value.isoformat(),
+    'image': image_url,
+}
+
+
+def parse_fields(raw):
+    """ Поля из ?fields=id,text, без параметра - все поля """
+    if not raw:
+        return list(FIELDS)
+    fields = list(dict.fromkeys(
+        field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def parse_limit(raw):
+    """ Размер страницы из ?limit=, не больше API_MAX_LIMIT """
+    if not raw:
+        return POSTS_PER_PAGE
+    if not raw.isdigit() or not 1 <= int(raw) <= API_MAX_LIMIT:
+        raise ValueError(f'limit должен быть от 1 до {API_MAX_LIMIT}')
+    return int(raw)
+
+
+def serialize_rows(rows, fields):
+    """ Словари ответа из кортежей values_list: ключи курсора в начале
+    строки, за ними выбранные поля """
+    converters = [CONVERTERS.get(field) for field in fields]
+    offset = len(KEYS)
+    results = []
+    for row in rows:
+        item = {}
+        for position, field in enumerate(fields):
+            value = row[offset + position]
+            convert = converters[position]
+            item[field] = value if convert is None else convert(value)
+        results.append(item)
+    return results
+
+
+def posts_page(request, post_list):
+    """ Страница постов для API без создания объектов Post """
+    fields = parse_fields(request.GET.get('fields', ''))
+    limit = parse_limit(request.GET.get('limit', ''))
+    cursor = read_cursor(request, Post, KEYS)
+    rows = keyset_window(
+        post_list.values_list(*KEYS, *[FIELDS[field] for field in fields]),
+        KEYS, cursor, limit + 1)
+    rows, has_next, has_previous = trim_window(rows, cursor, limit)
+    offset = len(KEYS)
+    return {
+        'results': serialize_rows(rows, fields),
+        'next': (encode_values(rows[-1][:offset], FORWARD)
+                 if rows and has_next else None),
+        'previous': (encode_values(rows[0][:offset], BACKWARD)
+                     if rows and has_previous else None),
+    }
+
+
+def posts_response(request, post_list):
+    """ JSON со страницей постов или ошибкой параметров """
+    try:
+        # Кириллица в UTF-8 вдвое короче экранированной \uXXXX
+        return JsonResponse(
+            posts_page(request, post_list),
+            json_dumps_params={'ensure_ascii': False})
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
@@ -0,0 +1,122 @@
+import bisect
+
+from .caching import ProcessIndex
+from .models import Group, User
+from .settings import AUTOCOMPLETE_LIMIT, FEED_BATCH_SIZE
+
+AUTOCOMPLETE_GENERATION_KEY = 'posts:autocomplete_generation'
+USER = 'user'
+GROUP = 'group'
+
+# Поля, от которых зависят ключи индекса
+USER_FIELDS = ('username', 'first_name', 'last_name')
+GROUP_FIELDS = ('slug', 'title')
+
+
+def normalize(text):
+    """ Ключ для сравнения префиксов без учёта регистра """
+    return ' '.join(text.casefold().split())
+
+
+def user_item(username, first_name, last_name):
+    """ Адрес, подпись и ключи пользователя """
+    full_name = f'{first_name} {last_name}'.strip()
+    keys = {normalize(username), normalize(full_name)} - {''}
+    return username, full_name or username, keys
+
+
+def group_item(slug, title):
+    """ Адрес, подпись и ключи группы """
+    return slug, title, {normalize(slug), normalize(title)} - {''}
+
+
+class PrefixIndex:
+    """ Отсортированный список строк (ключ, тип, id).
+
+    Все ключи с префиксом лежат подряд, их начало находится бинарным
+    поиском, поэтому ответ почти не зависит от размера индекса.
+    """
+
+    def __init__(self, items=()):
+        self.items = {}
+        rows = []
+        for kind, pk, item in items:
+            self.items[kind, pk] = item
+            rows.extend((key, kind, pk) for key in item[2])
+        rows.sort()
+        self.rows = rows
+
+    def add(self, kind, pk, item):
+        self.remove(kind, pk)
+        self.items[kind, pk] = item
+        for key in item[2]:
+            bisect.insort(self.rows, (key, kind, pk))
+
+    def remove(self, kind, pk):
+        item = self.items.pop((kind, pk), None)
+        if item is None:
+            return
+        for key in item[2]:
+            row = (key, kind, pk)
+            position = bisect.bisect_left(self.rows, row)
+            if position < len(self.rows) and self.rows[position] == row:
+                del self.rows[position]
+
+    def lookup(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """ До limit пар (тип, id) по возрастанию совпавшего ключа """
+        found = []
+        position = bisect.bisect_left(self.rows, (prefix,))
+        while position < len(self.rows) and len(found) < limit:
+            key, kind, pk = self.rows[position]
+            if not key.startswith(prefix):
+                break
+            if (kind, pk) not in found:
+                found.append((kind, pk))
+            position += 1
+        return [(kind, *self.items[kind, pk][:2]) for kind, pk in found]
+
+
+def build_index():
+    def items():
+        users = User.objects.values_list('pk', *USER_FIELDS).order_by()
+        for pk, *fields in users.iterator(chunk_size=FEED_BATCH_SIZE):
+            yield USER, pk, user_item(*fields)
+        groups = Group.objects.values_list('pk', *GROUP_FIELDS).order_by()
+        for pk, *fields in groups.iterator(chunk_size=FEED_BATCH_SIZE):
+            yield GROUP, pk, group_item(*fields)
+    return PrefixIndex(items())
+
+
+_index = ProcessIndex(AUTOCOMPLETE_GENERATION_KEY, build_index)
+
+
+def autocomplete(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """ Пользователи и группы, имя или адрес которых начинается
+    с prefix: список троек (тип, адрес, подпись) """
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    return _index.get().lookup(prefix, limit)
+
+
+def index_user(user):
+    item = user_item(*(getattr(user, field) for field in USER_FIELDS))
+    _index.change('add', USER, user.pk, item)
+
+
+def unindex_user(pk):
+    _index.change('remove', USER, pk)
+
+
+def index_group(group):
+    item = group_item(*(getattr(group, field) for field in GROUP_FIELDS))
+    _index.change('add', GROUP, group.pk, item)
+
+
+def unindex_group(pk):
+    _index.change('remove', GROUP, pk)
+
+
+def reindex():
+    """ Перестраивает индекс во всех процессах """
+    _index.reset()
@@ -0,0 +1,287 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.utils.safestring import mark_safe
+
+from .models import Group, User, UserStats
+from .settings import (
+    FEED_CACHE_TIMEOUT, PROCESS_INDEX_LOG_LIMIT, PROCESS_INDEX_LOG_TIMEOUT,
+    PROCESS_INDEX_LOG_WAIT,
+)
+
+GENERATION_KEY = 'posts:feed_generation'
+PAGE_GENERATION_KEY = 'posts:page_generation:{}:{}'
+WINDOW_KEY = 'posts:page_window:{}:{}:{}:{}'
+STATS_KEY = 'posts:stats:{}'
+
+# Ленты, страницы которых кэшируются фрагментами
+INDEX_PAGE = 'index'
+PROFILE_PAGE = 'profile'
+GROUP_PAGE = 'group'
+# Шапка профиля: кнопка подписки и счётчики подписок
+PROFILE_HEADER = 'profile_header'
+
+# Имя фрагмента страницы ленты в шаблонах
+FRAGMENT_NAME = 'feed_page'
+
+
+def get_generation(key=GENERATION_KEY):
+    """ Текущее поколение кэша лент или другого счётчика key.
+
+    Начальное значение берётся из времени, поэтому после вытеснения ключа
+    поколение не вернётся к старому номеру и не поднимет устаревшие
+    фрагменты.
+    """
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(key=GENERATION_KEY):
+    """ Делает недействительными все закэшированные фрагменты лент,
+    возвращает новое поколение """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_generation(key)
+
+
+def viewer_class(user):
+    """ Класс зрителя: гости видят одну и ту же ленту,
+    пользователю показываются его лайки и кнопки редактирования """
+    return f'user-{user.pk}' if user.is_authenticated else 'anon'
+
+
+def page_generation_key(kind, name=None):
+    """ Ключ поколения страниц ленты: главной, автора по логину или
+    группы по адресу. Ключ строится из адреса страницы, поэтому
+    поколение известно до запросов к базе """
+    return PAGE_GENERATION_KEY.format(kind, name or '')
+
+
+def page_generations(kind, name=None):
+    """ Лента и поколения, от которых зависит её страница: общее
+    (название группы и превью в карточках всех лент) и своей ленты.
+    Начальные поколения разных лент могут совпасть, поэтому ключ ленты
+    тоже входит в ключи кэша """
+    key = page_generation_key(kind, name)
+    return (key, get_generation(), get_generation(key))
+
+
+def feed_names(author_id, *group_ids):
+    """ Логин автора и адреса групп, по которым ключуются ленты """
+    usernames = list(User.objects.filter(pk=author_id).values_list(
+        'username', flat=True))
+    group_ids = {group_id for group_id in group_ids if group_id is not None}
+    slugs = []
+    if group_ids:
+        slugs = list(Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True))
+    return usernames, slugs
+
+
+def forget_pages(usernames, slugs):
+    """ Сбрасывает страницы лент, на которых есть пост: главную, автора
+    и групп. Остальные профили и группы сохраняют свои фрагменты """
+    bump_generation(page_generation_key(INDEX_PAGE))
+    for username in usernames:
+        bump_generation(page_generation_key(PROFILE_PAGE, username))
+    for slug in slugs:
+        bump_generation(page_generation_key(GROUP_PAGE, slug))
+
+
+def forget_profile_headers(*user_ids):
+    """ Подписка меняет шапки профилей обоих пользователей, но не ленты """
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True)
+    for username in usernames:
+        bump_generation(page_generation_key(PROFILE_HEADER, username))
+
+
+def page_viewer(user, author_ids, liked):
+    """ Класс зрителя для фрагмента страницы ленты.
+
+    От зрителя во фрагменте зависят только кнопки лайков и правки. Все
+    гости получают один фрагмент, читатели - один на набор лайкнутых
+    постов страницы, отдельный фрагмент нужен, только если на странице
+    есть свои посты.
+    """
+    if not user.is_authenticated:
+        return 'anon'
+    viewer = f'author-{user.pk}' if user.pk in author_ids else 'reader'
+    return viewer + ''.join(f',{post_id}' for post_id in sorted(liked))
+
+
+def page_window_key(generations, cursor):
+    """ Ключ окна страницы ленты. cursor - токен из cursor_token,
+    а не сырой параметр запроса """
+    return WINDOW_KEY.format(*generations, hashlib.md5(
+        cursor.encode()).hexdigest())
+
+
+def page_fragment(generations, viewer, cursor):
+    """ Ключ фрагмента страницы для тега {% cache %} и готовый
+    фрагмент, если он уже есть в кэше. cursor - токен из cursor_token """
+    key = ':'.join((*map(str, generations), viewer, cursor))
+    fragment = cache.get(make_template_fragment_key(FRAGMENT_NAME, [key]))
+    if fragment is not None:
+        fragment = mark_safe(fragment)
+    return key, fragment
+
+
+def make_etag(request, *parts):
+    """ ETag из значений, от которых зависит страница, и класса зрителя """
+    raw = repr((viewer_class(request.user),) + parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def not_modified(request, etag):
+    """ Ответ 304, если у клиента уже есть страница с этим ETag """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response = with_etag(response, etag)
+    return response
+
+
+def with_etag(response, etag):
+    """ Проставляет ETag отрисованной странице """
+    response['ETag'] = etag
+    return response
+
+
+def get_user_stats(user_id):
+    """ Статистика профиля из кэша, при промахе одна строка из базы """
+    key = STATS_KEY.format(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = UserStats.for_user(user_id)
+        cache.set(key, stats, FEED_CACHE_TIMEOUT)
+    return stats
+
+
+def forget_user_stats(*user_ids):
+    """ Сбрасывает закэшированную статистику во всех воркерах """
+    cache.delete_many([STATS_KEY.format(user_id) for user_id in user_ids])
+
+
+class ProcessIndex:
+    """ Индекс в памяти процесса, согласованный с другими воркерами.
+
+    build() строит индекс из базы. Каждое изменение после коммита
+    сдвигает счётчик key в общем кэше и пишет под новым номером запись
+    журнала: имя метода индекса и аргументы. Остальные процессы при чтении
+    забирают недостающие записи одним get_many и повторяют их по порядку,
+    как TwoTierCache. Индекс перестраивается только при сбросе, потере
+    журнала или слишком большом отставании, и не под блокировкой чтения.
+    """
+
+    LOG_KEY = '{}:log:{}'
+    # Запись журнала, после которой индекс строится заново
+    RESET = 'reset'
+
+    def __init__(self, key, build):
+        self.key = key
+        self.build = build
+        self.index = None
+        self.generation = None
+        # С какого момента не хватает следующей записи журнала
+        self.missing_since = None
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def log_key(self, generation):
+        return self.LOG_KEY.format(self.key, generation)
+
+    def get(self):
+        generation = get_generation(self.key)
+        with self.lock:
+            index, seen = self.index, self.generation
+            if index is not None and seen == generation:
+                return index
+        if index is not None and \
+                seen < generation <= seen + PROCESS_INDEX_LOG_LIMIT:
+            logs = cache.get_many([
+                self.log_key(number)
+                for number in range(seen + 1, generation + 1)
+            ])
+            with self.lock:
+                if self.replay(logs, generation):
+                    return self.index
+        return self.rebuild()
+
+    def replay(self, logs, generation):
+        """ Повторяет записи журнала после своего поколения. False, если
+        индекс нужно перестроить """
+        while self.generation < generation:
+            number = self.generation + 1
+            name = self.log_key(number)
+            if name not in logs:
+                if self.generation + PROCESS_INDEX_LOG_LIMIT < generation:
+                    return False
+                # Запись могли ещё не успеть записать: пока отдаётся
+                # индекс без неё, перестройка - если она так и не пришла
+                now = time.monotonic()
+                if self.missing_since is None:
+                    self.missing_since = now
+                return now - self.missing_since < PROCESS_INDEX_LOG_WAIT
+            entry = logs[name]
+            if entry == self.RESET:
+                return False
+            operation, args = entry
+            getattr(self.index, operation)(*args)
+            self.generation = number
+            self.missing_since = None
+        return True
+
+    def rebuild(self):
+        """ Строит индекс заново. Пока его строит другой поток, остальные
+        читают прежний индекс """
+        if not self.build_lock.acquire(blocking=self.index is None):
+            return self.index
+        try:
+            # Изменения, сделанные во время построения, повторятся из
+            # журнала: методы индекса можно применять повторно
+            generation = get_generation(self.key)
+            if self.index is not None and self.generation == generation:
+                # Индекс построил поток, которого ждали
+                return self.index
+            index = self.build()
+            with self.lock:
+                self.index = index
+                self.generation = generation
+                self.missing_since = None
+            return index
+        finally:
+            self.build_lock.release()
+
+    def publish(self, entry):
+        generation = bump_generation(self.key)
+        cache.set(self.log_key(generation), entry, PROCESS_INDEX_LOG_TIMEOUT)
+        return generation
+
+    def change(self, operation, *args):
+        """ После коммита текущей транзакции вызывает метод operation
+        индекса с аргументами args во всех процессах """
+        def on_commit():
+            generation = self.publish((operation, args))
+            with self.lock:
+                # Если раньше есть чужие записи, своя повторится из
+                # журнала после них при следующем чтении
+                if self.index is not None and \
+                        generation == self.generation + 1:
+                    getattr(self.index, operation)(*args)
+                    self.generation = generation
+        transaction.on_commit(on_commit)
+
+    def reset(self):
+        """ Перестройка индекса во всех процессах после коммита, например
+        после массовой загрузки без сигналов """
+        transaction.on_commit(lambda: self.publish(self.RESET))
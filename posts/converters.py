@@ -0,0 +1,14 @@
+from .syndication import FEED_FORMATS
+
+
+class FeedFormatConverter:
+    """ Формат ленты RSS или Atom. Другие значения не совпадают с адресом
+    ленты, поэтому /feed/5/ пользователя feed остаётся страницей поста """
+
+    regex = '|'.join(FEED_FORMATS)
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
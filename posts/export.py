@@ -0,0 +1,102 @@
+import csv
+import json
+
+from django.http import Http404, StreamingHttpResponse
+
+from .api import image_url
+from .models import Comment, Like, Post
+from .settings import EXPORT_CHUNK_LENGTH, EXPORT_CHUNK_SIZE
+
+# Колонки CSV, у каждого типа записи заполнена их часть
+COLUMNS = (
+    'type', 'id', 'post', 'created', 'text', 'group', 'image', 'image_url',
+)
+
+
+def user_records(user_id):
+    """ Посты, комментарии и лайки пользователя словарями. Строки
+    читаются частями через iterator(), объекты моделей не создаются """
+    posts = Post.objects.filter(author_id=user_id).order_by(
+        'id').values_list('id', 'pub_date', 'text', 'group__slug', 'image')
+    for post_id, pub_date, text, group, image in posts.iterator(
+            chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'post',
+            'id': post_id,
+            'created': pub_date.isoformat(),
+            'text': text,
+            'group': group,
+            'image': image or None,
+            'image_url': image_url(image),
+        }
+    comments = Comment.objects.filter(author_id=user_id).order_by(
+        'id').values_list('id', 'post_id', 'created', 'text')
+    for comment_id, post_id, created, text in comments.iterator(
+            chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'comment',
+            'id': comment_id,
+            'post': post_id,
+            'created': created.isoformat(),
+            'text': text,
+        }
+    likes = Like.objects.filter(user_id=user_id).order_by(
+        'id').values_list('id', 'post_id')
+    for like_id, post_id in likes.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'type': 'like', 'id': like_id, 'post': post_id}
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class Line:
+    """ Файл для csv.writer, который возвращает строку вместо записи """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(Line(), COLUMNS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+def chunked(lines, length=EXPORT_CHUNK_LENGTH):
+    """ Склеивает строки в куски примерно по length символов, чтобы не
+    отдавать серверу по строке. Первая строка уходит сразу: клиент
+    получает заголовок, пока читаются следующие строки """
+    lines = iter(lines)
+    for line in lines:
+        yield line
+        break
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= length:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson; charset=utf-8'),
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+}
+
+
+def export_response(user, export_format):
+    """ Выгрузка данных пользователя потоком с постоянной памятью """
+    if export_format not in EXPORT_FORMATS:
+        raise Http404
+    lines, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        chunked(lines(user_records(user.pk))), content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{user.username}.{export_format}"')
+    return response
@@ -0,0 +1,270 @@
+import heapq
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import SimpleLazyObject
+
+from .caching import page_fragment, page_viewer, page_window_key
+from .images import PageImages
+from .models import FeedEntry, Follow, Like, Post, UserStats
+from .paginator import (
+    BACKWARD, cursor_page, cursor_token, get_cursor_page, keyset_window,
+    make_page, read_cursor,
+)
+from .settings import (
+    FEED_BATCH_SIZE, FEED_CACHE_TIMEOUT, FEED_PULL_THRESHOLD,
+    FEED_PUSH_THRESHOLD, POSTS_PER_PAGE,
+)
+
+ENTRY_KEYS = ('pub_date', 'post_id')
+FEED_KEYS = ('pub_date', 'id')
+
+
+def batches(iterable, size=FEED_BATCH_SIZE):
+    """ Делит поток на списки не длиннее size """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def is_pulled(author_id):
+    """ Посты популярного автора читаются из Post, а не из FeedEntry """
+    return UserStats.for_user(author_id).feed_pulled
+
+
+def pulled_authors(user):
+    """ Популярные авторы, на которых подписан пользователь """
+    followed = Follow.objects.filter(user=user).values('author_id')
+    return list(UserStats.objects.filter(
+        user_id__in=followed,
+        feed_pulled=True,
+    ).values_list('user_id', flat=True))
+
+
+def fan_out_post(post):
+    """ Раскладывает новый пост по лентам всех подписчиков автора """
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True).order_by()
+    for batch in batches(followers.iterator()):
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, post_id=post.id,
+                       pub_date=post.pub_date) for user_id in batch),
+            ignore_conflicts=True,
+        )
+
+
+def fill_follow_feed(follow):
+    """ Добавляет в ленту нового подписчика уже написанные посты автора.
+    Автор, набравший FEED_PULL_THRESHOLD подписчиков, переходит на
+    чтение по запросу: это только флаг, записи ленты не трогаются """
+    stats = UserStats.for_user(follow.author_id)
+    if stats.feed_pulled:
+        return
+    if stats.followers_count >= FEED_PULL_THRESHOLD:
+        UserStats.objects.filter(user_id=follow.author_id).update(
+            feed_pulled=True)
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'id', 'pub_date').order_by()
+    for batch in batches(posts.iterator()):
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=follow.user_id, post_id=post_id,
+                       pub_date=pub_date) for post_id, pub_date in batch),
+            ignore_conflicts=True,
+        )
+
+
+def clear_follow_feed(follow):
+    """ Убирает посты автора из ленты отписавшегося пользователя.
+    Обратно на раскладку автор переводится фоновой push_feeds """
+    FeedEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id,
+    ).delete()
+
+
+def insert_author_entries(author_id, first_id, last_id=None):
+    """ Раскладывает посты автора с id от first_id до last_id по лентам
+    всех его подписчиков. Строки собирает сама база одним
+    INSERT ... SELECT, уже разложенные пропускаются """
+    ops = connection.ops
+    params = [author_id, first_id]
+    last = ''
+    if last_id is not None:
+        last = ' AND post.id <= %s'
+        params.append(last_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{FeedEntry._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            f'ON post.author_id = follow.author_id '
+            f'WHERE follow.author_id = %s AND post.id >= %s{last}'
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params)
+
+
+def push_author_posts(author_id, after_id=0):
+    """ Раскладывает посты автора с id больше after_id пачками примерно
+    по FEED_BATCH_SIZE записей ленты. Возвращает id последнего поста """
+    followers = Follow.objects.filter(author_id=author_id).count()
+    size = max(1, FEED_BATCH_SIZE // max(1, followers))
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        'id').values_list('id', flat=True)
+    while True:
+        ids = list(posts.filter(id__gt=after_id)[:size])
+        if not ids:
+            return after_id
+        insert_author_entries(author_id, ids[0], ids[-1])
+        after_id = ids[-1]
+
+
+def push_author(author_id):
+    """ Переводит автора с чтения по запросу обратно на раскладку.
+    Посты раскладываются, пока флаг ещё стоит и лента читателей полна,
+    затем флаг снимается и догоняется то, что появилось за это время:
+    посты, которые пропустил fan_out_post, и новые подписки """
+    last_follow = Follow.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    last_post = push_author_posts(author_id)
+    UserStats.objects.filter(user_id=author_id).update(feed_pulled=False)
+    push_author_posts(author_id, last_post)
+    for follow in Follow.objects.filter(
+            author_id=author_id, id__gt=last_follow):
+        fill_follow_feed(follow)
+
+
+def push_unpopular_authors():
+    """ Авторы, у которых подписчиков стало меньше FEED_PUSH_THRESHOLD,
+    снова раскладываются по лентам. Запускается из push_feeds """
+    authors = list(UserStats.objects.filter(
+        feed_pulled=True,
+        followers_count__lt=FEED_PUSH_THRESHOLD,
+    ).values_list('user_id', flat=True))
+    for author_id in authors:
+        push_author(author_id)
+    return len(authors)
+
+
+def fill_author_feeds(author_id):
+    """ Раскладывает все посты автора по лентам всех его подписчиков,
+    например после массовой загрузки без сигналов """
+    if not is_pulled(author_id):
+        push_author_posts(author_id)
+
+
+def follow_feed(user):
+    """ Материализованная лента подписок пользователя """
+    return FeedEntry.objects.filter(user=user)
+
+
+def get_follow_page(request, per_page=POSTS_PER_PAGE):
+    """ Страница гибридной ленты подписок.
+
+    Разложенные записи FeedEntry сливаются с постами популярных авторов
+    через heapq.merge по (pub_date, id). Из каждого источника читается
+    не больше одной страницы, поэтому чтение ограничено.
+    """
+    user = request.user
+    entries = follow_feed(user)
+    cursor = read_cursor(request, FeedEntry, ENTRY_KEYS)
+    limit = per_page + 1
+    sources = [keyset_window(entries, ENTRY_KEYS, cursor, limit)]
+    authors = pulled_authors(user)
+    if authors:
+        posts = Post.objects.filter(author_id__in=authors).only(
+            'id', 'pub_date')
+        sources.append([
+            FeedEntry(user=user, post_id=post.id, pub_date=post.pub_date)
+            for post in keyset_window(posts, ('pub_date', 'id'),
+                                      cursor, limit)
+        ])
+    backward = cursor is not None and cursor[0] == BACKWARD
+    merged = heapq.merge(
+        *sources,
+        key=lambda entry: (entry.pub_date, entry.post_id),
+        reverse=not backward,
+    )
+    items, seen = [], set()
+    for entry in merged:
+        if entry.post_id not in seen:
+            seen.add(entry.post_id)
+            items.append(entry)
+        if len(items) == limit:
+            break
+    return make_page(items, Paginator(entries, per_page), cursor, ENTRY_KEYS)
+
+
+def entries_to_posts(entries):
+    """ Заменяет записи ленты постами для карточек, сохраняя порядок """
+    posts = Post.objects.feed().in_bulk(
+        [entry.post_id for entry in entries])
+    return [posts[entry.post_id] for entry in entries
+            if entry.post_id in posts]
+
+
+def liked_post_ids(user, posts):
+    """ Множество id постов страницы, лайкнутых пользователем,
+    одним запросом на всю страницу """
+    return liked_ids(user, [post.id for post in posts])
+
+
+def liked_ids(user, ids):
+    """ Те из ids, которые лайкнул пользователь """
+    if not user.is_authenticated or not ids:
+        return set()
+    return set(Like.objects.filter(user=user, post_id__in=ids).values_list(
+        'post_id', flat=True))
+
+
+def feed_page_context(request, post_list, generations):
+    """ Контекст страницы ленты, закэшированной фрагментом.
+
+    Готовый фрагмент ищется до запросов страницы. Для его ключа нужны
+    только id и авторы постов страницы, они лежат в кэше по поколениям
+    ленты вместе с курсорами соседних страниц. Если окно страницы есть в
+    кэше, посты читаются лениво, при первом обращении к странице: гостю
+    готовый фрагмент не стоит ни одного запроса, пользователю - один
+    запрос его лайков.
+    """
+    cursor = cursor_token(request, post_list.model, FEED_KEYS)
+    window_key = page_window_key(generations, cursor)
+    window = cache.get(window_key)
+    if window is None:
+        page = get_cursor_page(request, post_list, keys=FEED_KEYS)
+        window = {
+            'rows': [(post.id, post.author_id) for post in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+        cache.set(window_key, window, FEED_CACHE_TIMEOUT)
+    else:
+        posts = post_list.filter(
+            pk__in=[post_id for post_id, _ in window['rows']],
+        ).order_by(*[f'-{key}' for key in FEED_KEYS])
+        page = cursor_page(
+            SimpleLazyObject(lambda: list(posts)),
+            Paginator(post_list, POSTS_PER_PAGE),
+            window['next'], window['previous'])
+    liked = liked_ids(request.user, [post_id for post_id, _ in window['rows']])
+    viewer = page_viewer(
+        request.user, {author_id for _, author_id in window['rows']}, liked)
+    key, fragment = page_fragment(generations, viewer, cursor)
+    return {
+        'page': page,
+        'paginator': page.paginator,
+        'page_images': PageImages(page),
+        'liked_posts': liked,
+        'feed_cache_key': key,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_fragment': fragment,
+    }
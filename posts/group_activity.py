@@ -0,0 +1,131 @@
+import hashlib
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count, F, IntegerField, OuterRef, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce
+from django.utils.timezone import utc
+
+from .models import Comment, Group, GroupActivity, Post
+from .settings import (
+    GROUP_ACTIVITY_DAYS, GROUPS_SNAPSHOT_TIMEOUT, POSTS_PER_PAGE,
+)
+
+DAY = 24 * 60 * 60
+SNAPSHOT_KEY = 'posts:groups_snapshot:{}'
+
+
+def day_number(moment=None):
+    """ Номер дня для datetime или текущего времени """
+    timestamp = time.time() if moment is None else moment.timestamp()
+    return int(timestamp // DAY)
+
+
+def first_day(now=None):
+    """ Первый день окна активности """
+    return day_number(now) - GROUP_ACTIVITY_DAYS + 1
+
+
+def change_posts_count(group_id, delta):
+    """ Атомарно меняет число записей группы """
+    groups = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        groups = groups.filter(posts_count__gte=-delta)
+    groups.update(posts_count=F('posts_count') + delta)
+
+
+def record_group_activity(group_id, field, moment, delta):
+    """ Меняет дневной счётчик группы и её активность.
+
+    Учитываются только события внутри окна. Вычитание не создаёт строк:
+    при каскадном удалении группы ссылки на неё не остаются.
+    """
+    day = day_number(moment)
+    if day < first_day():
+        return
+    groups = Group.objects.filter(pk=group_id)
+    days = GroupActivity.objects.filter(group_id=group_id, day=day)
+    if delta < 0:
+        groups = groups.filter(activity__gte=-delta)
+        days.update(**{field: F(field) + delta})
+    elif not days.update(**{field: F(field) + delta}):
+        try:
+            with transaction.atomic():
+                GroupActivity.objects.create(
+                    group_id=group_id, day=day, **{field: delta})
+        except IntegrityError:
+            days.update(**{field: F(field) + delta})
+    groups.update(activity=F('activity') + delta)
+
+
+def refresh_group_activity(now=None):
+    """ Пересчитывает активность групп по дням окна и удаляет старые
+    дни: без этого события, вышедшие из окна, продолжали бы считаться """
+    start = first_day(now)
+    GroupActivity.objects.filter(day__lt=start).delete()
+    totals = GroupActivity.objects.filter(
+        group=OuterRef('pk'), day__gte=start,
+    ).order_by().values('group').annotate(
+        total=Sum(F('posts') + F('comments')),
+    ).values('total')
+    return Group.objects.update(activity=Coalesce(
+        Subquery(totals, output_field=IntegerField()), 0))
+
+
+def rebuild_group_activity(group_ids, now=None):
+    """ Заново считает число записей и дни окна активности групп по
+    постам и комментариям, например после массовой загрузки """
+    groups = Group.objects.filter(pk__in=group_ids)
+    posts = Post.objects.filter(group=OuterRef('pk')).order_by().values(
+        'group').annotate(total=Count('pk')).values('total')
+    groups.update(posts_count=Coalesce(
+        Subquery(posts, output_field=IntegerField()), 0))
+    since = datetime.fromtimestamp(first_day(now) * DAY, utc)
+    days = Counter()
+    events = (
+        ('posts', Post.objects.filter(
+            group_id__in=group_ids, pub_date__gte=since,
+        ).values_list('group_id', 'pub_date')),
+        ('comments', Comment.objects.filter(
+            post__group_id__in=group_ids, created__gte=since,
+        ).values_list('post__group_id', 'created')),
+    )
+    for field, rows in events:
+        for group_id, moment in rows.iterator():
+            days[group_id, day_number(moment), field] += 1
+    GroupActivity.objects.filter(group_id__in=group_ids).delete()
+    rows = {}
+    for (group_id, day, field), count in days.items():
+        row = rows.setdefault(
+            (group_id, day), GroupActivity(group_id=group_id, day=day))
+        setattr(row, field, count)
+    GroupActivity.objects.bulk_create(rows.values(), batch_size=1000)
+    return refresh_group_activity(now)
+
+
+def groups_page(request, per_page=POSTS_PER_PAGE):
+    """ Страница списка групп, самые активные сверху, и ключ порядка.
+
+    Активность меняется, пока список листают, поэтому порядок групп
+    запоминается при открытии первой страницы. Следующие страницы по
+    ?snapshot= и ?page= берутся из того же списка id: группы не
+    пропускаются и не повторяются. Вытесненный порядок берётся заново.
+    """
+    snapshot = request.GET.get('snapshot', '')
+    ids = cache.get(SNAPSHOT_KEY.format(snapshot)) if snapshot else None
+    if ids is None:
+        ids = list(Group.objects.order_by('-activity', '-id').values_list(
+            'pk', flat=True))
+        snapshot = hashlib.md5(repr(ids).encode()).hexdigest()
+        cache.set(SNAPSHOT_KEY.format(snapshot), ids, GROUPS_SNAPSHOT_TIMEOUT)
+    page = Paginator(ids, per_page).get_page(request.GET.get('page'))
+    groups = Group.objects.select_related('author').in_bulk(page.object_list)
+    # Удалённые после снимка группы пропускаются
+    page.object_list = [groups[pk] for pk in page.object_list if pk in groups]
+    return page, snapshot
@@ -0,0 +1,377 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .caching import forget_pages
+from .models import Post, StoredImage
+from .settings import (
+    IMAGE_CACHE_SIZE, IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_RATIO,
+    IMAGE_VARIANT_WIDTHS, IMAGE_WORKERS, THUMBNAIL_GEOMETRIES,
+)
+
+# Превью карточки, пока для картинки нет вариантов
+CARD_GEOMETRY, CARD_OPTIONS = THUMBNAIL_GEOMETRIES[0]
+
+# Ширина колонки с карточкой на больших экранах
+CARD_SIZES = '(max-width: 992px) 100vw, 960px'
+
+logger = logging.getLogger(__name__)
+
+
+def source_file(file_):
+    """ Исходник для sorl-thumbnail по имени файла. Превью создаются
+    и ищутся по имени в хранилище по умолчанию, поэтому ключи не зависят
+    от хранилища поля модели """
+    return ImageFile(getattr(file_, 'name', file_), default.storage)
+
+
+class LookupBackend(ThumbnailBackend):
+    """ Бэкенд sorl-thumbnail, который только ищет готовое превью """
+
+    def thumbnail_options(self, source, options):
+        """ Те же опции по умолчанию, что добавляет get_thumbnail """
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def lookup(self, file_, geometry_string, **options):
+        """ Готовое превью из хранилища ключей или None """
+        source = source_file(file_)
+        options = self.thumbnail_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def lookup_many(self, files, geometry_string, **options):
+        """ Готовые превью нескольких картинок по имени исходного файла:
+        один get_many к кэшу sorl и один запрос к базе для промахов """
+        kvstore = default.kvstore
+        if not isinstance(kvstore, CachedDBKVStore):
+            return {file_.name: self.lookup(file_, geometry_string, **options)
+                    for file_ in files}
+        keys = {}
+        for file_ in files:
+            source = source_file(file_)
+            name = self._get_thumbnail_filename(
+                source, geometry_string,
+                self.thumbnail_options(source, options))
+            keys[file_.name] = add_prefix(ImageFile(name, default.storage).key)
+        raw = kvstore.cache.get_many(list(keys.values()))
+        missing = [key for key in keys.values() if key not in raw]
+        if missing:
+            raw.update(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+        found = {}
+        for name, key in keys.items():
+            value = raw.get(key)
+            found[name] = (None if value is None or value == EMPTY_VALUE
+                           else deserialize_image_file(value))
+        return found
+
+
+lookup_backend = LookupBackend()
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def executor():
+    """ Пул потоков процесса для обработки картинок """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                thread_name_prefix='images',
+            )
+        return _executor
+
+
+def generate_variants(name):
+    """ Варианты картинки для srcset во всех ширинах и форматах.
+    Картинка не растягивается, совпавшие по ширине варианты
+    пропускаются """
+    variants, seen = [], set()
+    for image_format in IMAGE_VARIANT_FORMATS:
+        for width in IMAGE_VARIANT_WIDTHS:
+            geometry = f'{width}x{round(width * IMAGE_VARIANT_RATIO)}'
+            thumbnail = get_thumbnail(
+                name, geometry, crop='center', upscale=False,
+                format=image_format)
+            if (image_format, thumbnail.width) in seen:
+                continue
+            seen.add((image_format, thumbnail.width))
+            variants.append({
+                'format': image_format.lower(),
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+                'name': thumbnail.name,
+            })
+    return variants
+
+
+def generate_thumbnails(name):
+    """ Создаёт все превью и варианты картинки, записывает варианты
+    в StoredImage и обновляет карточки её постов. Сбрасываются только
+    страницы лент, на которых есть эти посты """
+    images = StoredImage.objects.filter(name=name)
+    if not images.exists():
+        # На картинку уже не ссылается ни один пост
+        return
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        get_thumbnail(name, geometry, **options)
+    images.update(variants=json.dumps(generate_variants(name)))
+    posts = Post.objects.filter(image=name)
+    names = list(posts.values_list('author__username', 'group__slug'))
+    posts.update(version=F('version') + 1)
+    forget_pages({username for username, _ in names},
+                 {slug for _, slug in names if slug})
+
+
+def _work(name):
+    try:
+        generate_thumbnails(name)
+    except Exception:
+        logger.exception('Не удалось создать превью %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        # Соединения с базой у каждого потока свои
+        connections.close_all()
+
+
+def submit(name):
+    """ Отдаёт картинку пулу, если она ещё не в очереди """
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    executor().submit(_work, name)
+
+
+def enqueue_thumbnails(image):
+    """ Ставит генерацию превью в очередь после коммита транзакции.
+    При IMAGE_WORKERS = 0 превью создаются сразу """
+    if not image:
+        return
+    name = image.name
+    if StoredImage.objects.filter(name=name).exclude(variants='[]').exists():
+        # Такой же файл уже загружали, превью у него общие
+        return
+    if IMAGE_WORKERS:
+        transaction.on_commit(lambda: submit(name))
+    else:
+        transaction.on_commit(lambda: generate_thumbnails(name))
+
+
+def retain_image(name):
+    """ Пост ссылается на файл картинки """
+    if not name:
+        return
+    images = StoredImage.objects.filter(name=name)
+    if images.update(references=F('references') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredImage.objects.create(name=name, references=1)
+    except IntegrityError:
+        images.update(references=F('references') + 1)
+
+
+def count_image_references(names):
+    """ Заново считает ссылки на файлы по постам, например после
+    массовой загрузки. Число записывается, а не прибавляется, поэтому
+    повторный пересчёт безопасен """
+    names = [name for name in set(names) if name]
+    counts = dict(
+        Post.objects.filter(image__in=names).order_by().values('image')
+        .annotate(total=Count('pk')).values_list('image', 'total'))
+    missing = []
+    for name, count in counts.items():
+        if not StoredImage.objects.filter(name=name).update(
+                references=count):
+            missing.append(StoredImage(name=name, references=count))
+    StoredImage.objects.bulk_create(
+        missing, batch_size=1000, ignore_conflicts=True)
+
+
+def release_image(name):
+    """ Пост больше не ссылается на файл. Последняя ссылка оставляет
+    запись с нулём ссылок, файл удаляется после коммита """
+    if not name:
+        return
+    released = StoredImage.objects.filter(
+        name=name, references__gte=1,
+    ).update(references=F('references') - 1)
+    if released:
+        transaction.on_commit(lambda: delete_image_files(name))
+
+
+def delete_image_files(name):
+    """ Удаляет файл без ссылок вместе с превью и вариантами.
+
+    Число ссылок проверяется тем же запросом, что удаляет запись, а файлы
+    удаляются до коммита. Хранилище берёт ссылку загрузки до проверки
+    файла в той же транзакции, поэтому одинаковая загрузка либо успевает
+    раньше, и файл остаётся, либо ждёт удаления, создаёт запись заново
+    и записывает файл.
+    """
+    with transaction.atomic():
+        deleted, _ = StoredImage.objects.filter(
+            name=name, references=0).delete()
+        if deleted:
+            _pictures.discard(name)
+            _thumbnails.discard_if(lambda key: key[0] == name)
+            delete(name)
+
+
+def picture_sources(variants):
+    """ Источники <picture> по форматам и картинка для старых браузеров.
+    Адреса собираются из имён без обращений к хранилищу """
+    formats = {}
+    for variant in variants:
+        variant = dict(variant, url=default.storage.url(variant['name']))
+        formats.setdefault(variant['format'], []).append(variant)
+    sources = [
+        {
+            'type': f'image/{image_format}',
+            'srcset': ', '.join(
+                f'{variant["url"]} {variant["width"]}w'
+                for variant in sorted(items, key=lambda v: v['width'])),
+        }
+        for image_format, items in formats.items()
+    ]
+    fallback = max(
+        formats.get('jpeg', next(iter(formats.values()))),
+        key=lambda v: v['width'])
+    return {'sources': sources, 'fallback': fallback}
+
+
+class _Pictures:
+    """ LRU процесса для разметки картинок. Варианты файла не меняются,
+    поэтому запись не устаревает, пока файл не удалён """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, names):
+        with self.lock:
+            found = {}
+            for name in names:
+                if name in self.entries:
+                    self.entries.move_to_end(name)
+                    found[name] = self.entries[name]
+            return found
+
+    def set_many(self, pictures):
+        with self.lock:
+            self.entries.update(pictures)
+            for name in pictures:
+                self.entries.move_to_end(name)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, name):
+        with self.lock:
+            self.entries.pop(name, None)
+
+    def discard_if(self, test):
+        with self.lock:
+            for key in [key for key in self.entries if test(key)]:
+                del self.entries[key]
+
+
+# Имя картинки - разметка её вариантов
+_pictures = _Pictures(IMAGE_CACHE_SIZE)
+# (имя, геометрия, версия поста) - превью картинки без вариантов. Превью
+# или варианты появляются вместе с новой версией поста, поэтому запись
+# с прежней версией, в том числе без превью, больше не читается
+_thumbnails = _Pictures(IMAGE_CACHE_SIZE)
+
+
+def resolve_pictures(images, versions=None):
+    """ Разметка картинок по имени файла: варианты из LRU или одним
+    запросом к StoredImage, для картинок без вариантов - готовые превью
+    из LRU по версии поста из versions или одним обращением к хранилищу
+    ключей sorl """
+    versions = versions or {}
+    images = {image.name: image for image in images if image}
+    pictures = _pictures.get_many(images)
+    missing = [name for name in images if name not in pictures]
+    if missing:
+        stored = {
+            item.name: picture_sources(item.variant_list())
+            for item in StoredImage.objects.filter(name__in=missing)
+            if item.variant_list()
+        }
+        _pictures.set_many(stored)
+        pictures.update(stored)
+    keys = {
+        name: (name, CARD_GEOMETRY, versions[name])
+        for name in images if name not in pictures and name in versions
+    }
+    memo = _thumbnails.get_many(keys.values())
+    for name, key in keys.items():
+        if key in memo:
+            pictures[name] = memo[key]
+    pending = [images[name] for name in images if name not in pictures]
+    if pending:
+        thumbnails = lookup_backend.lookup_many(
+            pending, CARD_GEOMETRY, **CARD_OPTIONS)
+        resolved = {}
+        for name, thumbnail in thumbnails.items():
+            pictures[name] = {'thumbnail': thumbnail}
+            if name in keys:
+                resolved[keys[name]] = pictures[name]
+            if thumbnail is None and IMAGE_WORKERS:
+                transaction.on_commit(lambda name=name: submit(name))
+        _thumbnails.set_many(resolved)
+    return pictures
+
+
+class PageImages:
+    """ Картинки постов страницы для шаблона. Разрешаются все сразу при
+    первом обращении, поэтому страница из кэша фрагментов не делает
+    запросов. Превью картинок без вариантов запоминаются по версиям
+    постов """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.pictures = None
+
+    def picture(self, image):
+        if self.pictures is None:
+            versions = {}
+            for post in self.posts:
+                if post.image:
+                    versions[post.image.name] = max(
+                        post.version, versions.get(post.image.name, 0))
+            self.pictures = resolve_pictures(
+                [post.image for post in self.posts], versions)
+        if image.name not in self.pictures:
+            self.pictures.update(resolve_pictures([image]))
+        return self.pictures[image.name]
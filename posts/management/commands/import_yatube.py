@@ -0,0 +1,387 @@
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.autocomplete import reindex
+from posts.caching import bump_generation, forget_user_stats
+from posts.feed import batches, fill_author_feeds
+from posts.group_activity import rebuild_group_activity
+from posts.images import count_image_references
+from posts.models import Comment, Follow, Group, Like, Post, User, UserStats
+from posts.search import index_post_range
+from posts.syndication import (
+    AUTHOR, GROUP, SITE, syndication_key,
+)
+
+# Порядок вставки внутри пачки: сначала то, на что ссылаются
+KINDS = ('user', 'group', 'post', 'comment', 'follow', 'like')
+
+# Записи со старым id, который нужен для ссылок других записей
+MAPPED = {
+    'user': User,
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+}
+
+# Размер списков для __in, sqlite принимает не больше 999 параметров
+IN_BATCH_SIZE = 500
+
+
+@contextmanager
+def original_dates():
+    """ Даты из файла вместо текущего времени у полей auto_now_add """
+    fields = [Post._meta.get_field('pub_date'),
+              Comment._meta.get_field('created')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def parse_date(value):
+    moment = parse_datetime(value) if value else None
+    if moment is None:
+        return timezone.now()
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии, подписки '
+        'и лайки со старой платформы из JSONL. В каждой строке объект '
+        'с полем type (user, group, post, comment, follow, like), старым '
+        'id и ссылками на старые id: author, group, post, user. Записи '
+        'пишутся пачками через bulk_create без сигналов, счётчики, ленты '
+        'и индексы пересчитываются в конце. После сбоя повторный запуск '
+        'продолжает с последней сохранённой пачки или заново делает '
+        'пересчёт. Первичные ключи команда назначает сама, поэтому на '
+        'время загрузки сайт нужно остановить: пост или пользователь, '
+        'созданный на сайте, займёт ключ из пачки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько строк файла загружать в одной транзакции')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольных точек, по умолчанию <path>.checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Нет файла {path}')
+        self.checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        self.ids = {kind: {} for kind in MAPPED}
+        self.counts = Counter()
+        offset, rebuilt = self.resume()
+        self.next_pk = {
+            kind: (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+            for kind, model in MAPPED.items()
+        }
+        start = time.perf_counter()
+        imported = 0
+        with open(path, encoding='utf-8') as source:
+            lines = islice(source, offset, None)
+            for batch in batches(lines, options['batch_size']):
+                offset += len(batch)
+                self.import_batch(batch, offset)
+                imported += len(batch)
+                self.report(offset, imported / (time.perf_counter() - start))
+        if rebuilt and not imported:
+            self.stdout.write('Файл уже загружен и пересчитан')
+            return
+        self.rebuild()
+        self.save_entry({'offset': offset, 'rebuilt': True})
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
+
+    def resume(self):
+        """ Восстанавливает карту id и позицию в файле по контрольным
+        точкам. Точка пишется до транзакции пачки, поэтому последняя
+        действительна, только если её записи есть в базе. Вторым
+        значением возвращает, закончен ли после неё пересчёт """
+        if not os.path.exists(self.checkpoint):
+            return 0, False
+        with open(self.checkpoint, encoding='utf-8') as checkpoint:
+            entries = [json.loads(line) for line in checkpoint if line.strip()]
+        if entries and not self.committed(entries[-1]):
+            entries.pop()
+            with open(self.checkpoint, 'w', encoding='utf-8') as checkpoint:
+                checkpoint.writelines(
+                    json.dumps(entry) + '\n' for entry in entries)
+        offset = 0
+        for entry in entries:
+            for kind, pairs in entry.get('ids', {}).items():
+                self.ids[kind].update(pairs)
+            self.counts.update(entry.get('counts', {}))
+            offset = entry['offset']
+        if offset:
+            self.stdout.write(f'Продолжение со строки {offset + 1}')
+        return offset, bool(entries) and entries[-1].get('rebuilt', False)
+
+    def committed(self, entry):
+        if entry.get('rebuilt'):
+            return True
+        # В пачке без новых записей с id только подписки и лайки,
+        # повторная загрузка которых ничего не дублирует
+        if entry['check'] is None:
+            return False
+        kind, pk = entry['check']
+        return MAPPED[kind].objects.filter(pk=pk).exists()
+
+    def save_entry(self, entry):
+        with open(self.checkpoint, 'a', encoding='utf-8') as checkpoint:
+            checkpoint.write(json.dumps(entry) + '\n')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+    def import_batch(self, lines, offset):
+        records = defaultdict(list)
+        for line in lines:
+            if line.strip():
+                record = json.loads(line)
+                records[record.get('type')].append(record)
+        counts = Counter()
+        for kind in set(records) - set(KINDS):
+            counts['skipped'] += len(records[kind])
+        ids = {kind: [] for kind in MAPPED}
+        objects = {}
+        for kind in KINDS:
+            objects[kind] = getattr(self, f'build_{kind}s')(
+                records[kind], ids, counts)
+        check = None
+        for kind in MAPPED:
+            created = [obj for obj in objects[kind] if obj.pk is not None]
+            if created:
+                check = (kind, created[-1].pk)
+        self.save_entry({'offset': offset, 'ids': ids, 'counts': counts,
+                         'check': check})
+        with transaction.atomic(), original_dates():
+            for kind in KINDS:
+                model = objects[kind][0].__class__ if objects[kind] else None
+                if model is not None:
+                    model.objects.bulk_create(
+                        objects[kind], batch_size=IN_BATCH_SIZE,
+                        ignore_conflicts=kind in ('follow', 'like'))
+        # Ключи назначены явно, последовательности их не видели. Сдвиг
+        # после каждой пачки, чтобы после сбоя база была согласована
+        self.reset_sequences()
+        self.counts.update(counts)
+
+    def reset_sequences(self):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), list(MAPPED.values())):
+                cursor.execute(sql)
+
+    def map(self, kind, old_id, ids, pk):
+        self.ids[kind][old_id] = pk
+        ids[kind].append((old_id, pk))
+
+    def allocate(self, kind):
+        pk = self.next_pk[kind]
+        self.next_pk[kind] += 1
+        return pk
+
+    def resolve(self, kind, old_id):
+        return self.ids[kind].get(old_id)
+
+    def build_users(self, records, ids, counts):
+        """ Новые пользователи; логин, который уже есть в базе или
+        раньше в файле, связывается с существующим пользователем """
+        existing = {}
+        for batch in batches(records, IN_BATCH_SIZE):
+            existing.update(User.objects.filter(
+                username__in=[record['username'] for record in batch],
+            ).values_list('username', 'pk'))
+        users = []
+        for record in records:
+            pk = existing.get(record['username'])
+            if pk is None:
+                pk = self.allocate('user')
+                existing[record['username']] = pk
+                users.append(User(
+                    pk=pk,
+                    username=record['username'],
+                    first_name=record.get('first_name', ''),
+                    last_name=record.get('last_name', ''),
+                    email=record.get('email', ''),
+                    password=record.get('password') or make_password(None),
+                    date_joined=parse_date(record.get('date_joined')),
+                ))
+                counts['user'] += 1
+            self.map('user', record['id'], ids, pk)
+        return users
+
+    def build_groups(self, records, ids, counts):
+        existing = {}
+        for batch in batches(records, IN_BATCH_SIZE):
+            existing.update(Group.objects.filter(
+                slug__in=[record['slug'] for record in batch],
+            ).values_list('slug', 'pk'))
+        groups = []
+        for record in records:
+            pk = existing.get(record['slug'])
+            if pk is None:
+                author_id = self.resolve('user', record.get('author'))
+                if author_id is None:
+                    counts['skipped'] += 1
+                    continue
+                pk = self.allocate('group')
+                existing[record['slug']] = pk
+                groups.append(Group(
+                    pk=pk,
+                    title=record['title'],
+                    slug=record['slug'],
+                    description=record.get('description', ''),
+                    author_id=author_id,
+                ))
+                counts['group'] += 1
+            self.map('group', record['id'], ids, pk)
+        return groups
+
+    def build_posts(self, records, ids, counts):
+        posts = []
+        for record in records:
+            author_id = self.resolve('user', record.get('author'))
+            group_id = self.resolve('group', record.get('group'))
+            if author_id is None or (record.get('group') is not None
+                                     and group_id is None):
+                counts['skipped'] += 1
+                continue
+            pk = self.allocate('post')
+            posts.append(Post(
+                pk=pk,
+                text=record['text'],
+                pub_date=parse_date(record.get('pub_date')),
+                author_id=author_id,
+                group_id=group_id,
+                image=record.get('image') or '',
+            ))
+            self.map('post', record['id'], ids, pk)
+            counts['post'] += 1
+        return posts
+
+    def build_comments(self, records, ids, counts):
+        comments = []
+        for record in records:
+            post_id = self.resolve('post', record.get('post'))
+            author_id = self.resolve('user', record.get('author'))
+            if post_id is None or author_id is None:
+                counts['skipped'] += 1
+                continue
+            pk = self.allocate('comment')
+            comments.append(Comment(
+                pk=pk,
+                post_id=post_id,
+                author_id=author_id,
+                text=record['text'],
+                created=parse_date(record.get('created')),
+            ))
+            self.map('comment', record['id'], ids, pk)
+            counts['comment'] += 1
+        return comments
+
+    def build_follows(self, records, ids, counts):
+        follows = []
+        for record in records:
+            user_id = self.resolve('user', record.get('user'))
+            author_id = self.resolve('user', record.get('author'))
+            if user_id is None or author_id is None or user_id == author_id:
+                counts['skipped'] += 1
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+            counts['follow'] += 1
+        return follows
+
+    def build_likes(self, records, ids, counts):
+        likes = []
+        for record in records:
+            post_id = self.resolve('post', record.get('post'))
+            user_id = self.resolve('user', record.get('user'))
+            if post_id is None or user_id is None:
+                counts['skipped'] += 1
+                continue
+            likes.append(Like(post_id=post_id, user_id=user_id))
+            counts['like'] += 1
+        return likes
+
+    def report(self, offset, rate):
+        totals = ', '.join(
+            f'{kind}: {self.counts[kind]}' for kind in KINDS + ('skipped',))
+        self.stdout.write(f'Строк: {offset} ({rate:.0f}/с), {totals}')
+
+    def rebuild(self):
+        """ Последний проход: то, что обычно обновляют сигналы. Каждый
+        шаг записывает значения заново, а не прибавляет, поэтому после
+        сбоя посреди пересчёта его можно повторить целиком """
+        self.stdout.write('Пересчёт счётчиков, лент и индексов')
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Follow, Like]):
+                cursor.execute(sql)
+        user_ids = sorted(set(self.ids['user'].values()))
+        group_ids = sorted(set(self.ids['group'].values()))
+        post_ids = self.ids['post'].values()
+        if post_ids:
+            self.rebuild_posts(min(post_ids), max(post_ids))
+        for batch in batches(user_ids, IN_BATCH_SIZE):
+            UserStats.objects.filter(user_id__in=batch).delete()
+            forget_user_stats(*batch)
+        for batch in batches(group_ids, IN_BATCH_SIZE):
+            rebuild_group_activity(batch)
+        for number, author_id in enumerate(user_ids, 1):
+            fill_author_feeds(author_id)
+            if number % 1000 == 0:
+                self.stdout.write(f'Ленты подписок: {number} авторов')
+        for batch in batches(user_ids, IN_BATCH_SIZE):
+            usernames = User.objects.filter(pk__in=batch).values_list(
+                'username', flat=True)
+            for username in usernames:
+                bump_generation(syndication_key(AUTHOR, username))
+        for batch in batches(group_ids, IN_BATCH_SIZE):
+            slugs = Group.objects.filter(pk__in=batch).values_list(
+                'slug', flat=True)
+            for slug in slugs:
+                bump_generation(syndication_key(GROUP, slug))
+        bump_generation(syndication_key(SITE))
+        reindex()
+        bump_generation()
+
+    def rebuild_posts(self, first_id, last_id):
+        """ Счётчики, поиск и ссылки на картинки загруженных постов """
+        posts = Post.objects.filter(pk__gte=first_id, pk__lte=last_id)
+        counters = {}
+        for field, model in (('likes_count', Like),
+                             ('comments_count', Comment)):
+            rows = model.objects.filter(post=OuterRef('pk')).order_by(
+            ).values('post').annotate(total=Count('pk')).values('total')
+            counters[field] = Coalesce(
+                Subquery(rows, output_field=IntegerField()), 0)
+        posts.update(**counters)
+        index_post_range(first_id, last_id)
+        names = posts.exclude(image='').exclude(image__isnull=True).order_by(
+            ).values_list('image', flat=True).distinct()
+        for batch in batches(names.iterator(), IN_BATCH_SIZE):
+            count_image_references(batch)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.feed import push_unpopular_authors
+
+
+class Command(BaseCommand):
+    help = ('Снова раскладывает по лентам посты авторов, у которых '
+            'подписчиков стало меньше FEED_PUSH_THRESHOLD. Запускается '
+            'по расписанию, например раз в несколько минут из cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            type=int,
+            default=0,
+            help='Проверять каждые N секунд, не завершаясь')
+
+    def handle(self, *args, **options):
+        while True:
+            pushed = push_unpopular_authors()
+            self.stdout.write(f'Авторов снова в лентах: {pushed}')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.group_activity import refresh_group_activity
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает активность групп за последние дни. '
+            'Запускается по расписанию, например раз в час из cron')
+
+    def handle(self, *args, **options):
+        updated = refresh_group_activity()
+        self.stdout.write(f'Обновлено групп: {updated}')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает список популярных постов. '
+            'Запускается по расписанию, например раз в минуту из cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            type=int,
+            default=0,
+            help='Пересчитывать каждые N секунд, не завершаясь')
+
+    def handle(self, *args, **options):
+        while True:
+            trending = refresh_trending()
+            self.stdout.write(f'Популярных постов: {len(trending)}')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
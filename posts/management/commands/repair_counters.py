@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Like, Post
+
+COUNTERS = (
+    ('likes_count', Like),
+    ('comments_count', Comment),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики лайков и комментариев постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько постов проверять за один проход')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+            repaired += self.repair_chunk(ids[0], last_id)
+        self.stdout.write(
+            f'Проверено постов: {checked}, исправлено: {repaired}')
+
+    def repair_chunk(self, first_id, last_id):
+        """ Сверяет счётчики пачки постов с реальным числом строк.
+
+        Счётчики считает и записывает сама база одним UPDATE, поэтому
+        лайки и комментарии, добавленные во время проверки, не теряются.
+        Возвращает число исправленных постов.
+        """
+        counters = {}
+        for field, model in COUNTERS:
+            rows = model.objects.filter(post=OuterRef('pk')).order_by(
+            ).values('post').annotate(total=Count('pk')).values('total')
+            counters[field] = Coalesce(
+                Subquery(rows, output_field=IntegerField()), 0)
+        drifted = Q()
+        for field, _ in COUNTERS:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+        return Post.objects.filter(
+            pk__gte=first_id, pk__lte=last_id,
+        ).annotate(**{
+            f'actual_{field}': counter for field, counter in counters.items()
+        }).filter(drifted).update(**counters)
@@ -0,0 +1,204 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Словарь текстов, частоты слов по закону Ципфа
+VOCABULARY = 5000
+DAY = 24 * 60 * 60
+
+
+def zipf_weights(amount, exponent):
+    """ Накопленные веса рангов 1..amount для random.choices """
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, amount + 1)))
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class Records:
+    """ Синтетическая выгрузка в формате import_yatube. Популярность
+    авторов, групп и постов и активность читателей подчиняются
+    степенному закону: немногие получают большую часть записей """
+
+    def __init__(self, options, generator):
+        self.options = options
+        self.random = generator
+        self.prefix = options['prefix']
+        self.now = time.time()
+        self.words = [f'слово{number}' for number in range(VOCABULARY)]
+        self.word_weights = zipf_weights(VOCABULARY, 1.0)
+        users = range(1, options['users'] + 1)
+        self.user_weights = zipf_weights(options['users'], 1.0)
+        # Активные читатели не совпадают с популярными авторами
+        self.readers = self.random.sample(users, len(users))
+        self.reader_weights = zipf_weights(options['users'], 0.8)
+
+    def text(self, low, high):
+        return ' '.join(self.random.choices(
+            self.words, cum_weights=self.word_weights,
+            k=self.random.randint(low, high)))
+
+    def authors(self, amount):
+        return self.random.choices(
+            range(1, self.options['users'] + 1),
+            cum_weights=self.user_weights, k=amount)
+
+    def active_readers(self, amount):
+        return self.random.choices(
+            self.readers, cum_weights=self.reader_weights, k=amount)
+
+    def __iter__(self):
+        options = self.options
+        for number in range(1, options['users'] + 1):
+            yield {
+                'type': 'user',
+                'id': number,
+                'username': f'{self.prefix}{number}',
+                'first_name': f'Имя{number}',
+                'last_name': f'Фамилия{number}',
+                'date_joined': iso(self.now - options['days'] * DAY),
+            }
+        for number, author in enumerate(self.authors(options['groups']), 1):
+            yield {
+                'type': 'group',
+                'id': number,
+                'title': f'Группа {number}',
+                'slug': f'{self.prefix}-{number}'[:20],
+                'description': self.text(5, 20),
+                'author': author,
+            }
+        yield from self.posts()
+        yield from self.follows()
+
+    def posts(self):
+        """ Посты по возрастанию даты, за ними комментарии и лайки """
+        options = self.options
+        amount = options['posts']
+        start = self.now - options['days'] * DAY
+        dates = sorted(
+            self.random.uniform(start, self.now) for _ in range(amount))
+        group_weights = zipf_weights(options['groups'], 1.2)
+        groups = range(1, options['groups'] + 1)
+        for number, (author, pub_date) in enumerate(
+                zip(self.authors(amount), dates), 1):
+            group = None
+            if groups and self.random.random() < 0.5:
+                group = self.random.choices(
+                    groups, cum_weights=group_weights)[0]
+            yield {
+                'type': 'post',
+                'id': number,
+                'text': self.text(5, 40),
+                'author': author,
+                'group': group,
+                'pub_date': iso(pub_date),
+            }
+        # Обсуждают немногие посты, не обязательно самые новые
+        popular = self.random.sample(range(1, amount + 1), amount)
+        post_weights = zipf_weights(amount, 1.0)
+        posts = self.random.choices(
+            popular, cum_weights=post_weights, k=options['comments'])
+        for number, (post, author) in enumerate(
+                zip(posts, self.active_readers(len(posts))), 1):
+            delay = min(self.random.expovariate(1 / DAY),
+                        self.now - dates[post - 1])
+            yield {
+                'type': 'comment',
+                'id': number,
+                'post': post,
+                'author': author,
+                'text': self.text(3, 20),
+                'created': iso(dates[post - 1] + delay),
+            }
+        posts = self.random.choices(
+            popular, cum_weights=post_weights, k=options['likes'])
+        for post, user in zip(posts, self.active_readers(len(posts))):
+            yield {'type': 'like', 'post': post, 'user': user}
+
+    def follows(self):
+        amount = self.options['follows']
+        for user, author in zip(self.active_readers(amount),
+                                self.authors(amount)):
+            yield {'type': 'follow', 'user': user, 'author': author}
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями, подписками и лайками со степенным распределением '
+        'популярности для нагрузочного теста benchmarks/bench_load.py. '
+        'Записи загружаются через import_yatube. Повторы лайков и подписок '
+        'отбрасываются, поэтому их в базе немного меньше заданного'
+    )
+
+    def add_arguments(self, parser):
+        amounts = (
+            ('users', 100000, 'пользователей'),
+            ('groups', 1000, 'групп'),
+            ('posts', 1000000, 'постов'),
+            ('comments', 1000000, 'комментариев'),
+            ('follows', 1000000, 'подписок'),
+            ('likes', 3000000, 'лайков'),
+        )
+        for name, default, label in amounts:
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'Сколько {label}, по умолчанию {default}')
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней опубликованы посты')
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Начало логинов и адресов групп')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пачки import_yatube')
+        parser.add_argument(
+            '--output',
+            help='Сохранить выгрузку в этот файл, чтобы загрузить '
+                 'её в другую базу')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['posts'] < 1:
+            raise CommandError('Нужны хотя бы один пользователь и пост')
+        path = options['output']
+        if path is None:
+            descriptor, path = tempfile.mkstemp(suffix='.jsonl')
+            os.close(descriptor)
+        start = time.perf_counter()
+        records = Records(options, random.Random(options['seed']))
+        with open(path, 'w', encoding='utf-8') as dump:
+            for record in records:
+                dump.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.stdout.write(
+            f'Выгрузка {path} создана за '
+            f'{time.perf_counter() - start:.1f} с')
+        try:
+            call_command(
+                'import_yatube', path,
+                batch_size=options['batch_size'],
+                checkpoint=f'{path}.checkpoint',
+                stdout=self.stdout, stderr=self.stderr)
+        finally:
+            if os.path.exists(f'{path}.checkpoint'):
+                os.remove(f'{path}.checkpoint')
+            if options['output'] is None:
+                os.remove(path)
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - start:.1f} с')
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:58
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    counters = {}
+    for name, related in (('likes_count', 'Like'),
+                          ('comments_count', 'Comment')):
+        rows = apps.get_model('posts', related).objects.filter(
+            post=OuterRef('pk')).order_by().values('post')
+        rows = rows.annotate(total=Count('pk')).values('total')
+        counters[name] = Coalesce(
+            Subquery(rows, output_field=IntegerField()), 0)
+    Post.objects.update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0028_remove_post_post_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество лайков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:12
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    """ Таблица FTS5 создаётся, только если sqlite собран с FTS5,
+    иначе поиск работает через обратный индекс в памяти """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                f"text, tokenize = 'unicode61 remove_diacritics 0')")
+        except OperationalError:
+            return
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0032_userstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
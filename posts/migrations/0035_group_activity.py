@@ -0,0 +1,100 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:58
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import django.db.models.deletion
+
+DAY = 24 * 60 * 60
+ACTIVITY_DAYS = 7
+
+
+def fill_activity(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupActivity = apps.get_model('posts', 'GroupActivity')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+
+    posts = Post.objects.filter(group=OuterRef('pk')).order_by().values(
+        'group').annotate(total=Count('pk')).values('total')
+    Group.objects.update(posts_count=Coalesce(
+        Subquery(posts, output_field=IntegerField()), 0))
+
+    first_day = int(timezone.now().timestamp() // DAY) - ACTIVITY_DAYS + 1
+    since = timezone.now() - timedelta(days=ACTIVITY_DAYS + 1)
+    days = Counter()
+    events = (
+        ('posts', Post.objects.filter(
+            group__isnull=False, pub_date__gte=since,
+        ).values_list('group_id', 'pub_date')),
+        ('comments', Comment.objects.filter(
+            post__group__isnull=False, created__gte=since,
+        ).values_list('post__group_id', 'created')),
+    )
+    for field, rows in events:
+        for group_id, moment in rows.iterator():
+            day = int(moment.timestamp() // DAY)
+            if day >= first_day:
+                days[group_id, day, field] += 1
+    rows = {}
+    for (group_id, day, field), count in days.items():
+        row = rows.setdefault(
+            (group_id, day), GroupActivity(group_id=group_id, day=day))
+        setattr(row, field, count)
+    GroupActivity.objects.bulk_create(rows.values(), batch_size=1000)
+    totals = Counter()
+    for (group_id, _, _), count in days.items():
+        totals[group_id] += count
+    for group_id, total in totals.items():
+        Group.objects.filter(pk=group_id).update(activity=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0034_postactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveIntegerField(verbose_name='Номер дня')),
+                ('posts', models.IntegerField(default=0, verbose_name='Записей')),
+                ('comments', models.IntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='activity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Активность за последние дни'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество записей'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-activity', '-id'], name='group_activity_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupactivity',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to='posts.Group'),
+        ),
+        migrations.AddIndex(
+            model_name='groupactivity',
+            index=models.Index(fields=['day'], name='group_activity_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupactivity',
+            constraint=models.UniqueConstraint(fields=('group', 'day'), name='unique_group_activity_day'),
+        ),
+        migrations.RunPython(fill_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0035_group_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('variants', models.TextField(default='[]', editable=False, verbose_name='Варианты')),
+            ],
+        ),
+    ]
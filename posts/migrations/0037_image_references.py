@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:47
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+
+    counts = Post.objects.exclude(image='').exclude(
+        image__isnull=True).order_by().values('image').annotate(
+        total=Count('pk')).values_list('image', 'total')
+    missing = []
+    for name, total in counts.iterator():
+        if not StoredImage.objects.filter(name=name).update(
+                references=total):
+            missing.append(StoredImage(name=name, references=total))
+    StoredImage.objects.bulk_create(missing, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0036_storedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedimage',
+            name='references',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
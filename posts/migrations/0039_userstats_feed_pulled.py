@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+# FEED_PULL_THRESHOLD на момент миграции
+PULL_THRESHOLD = 10000
+
+
+def mark_pulled(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gte=PULL_THRESHOLD).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0038_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_pulled',
+            field=models.BooleanField(
+                default=False, verbose_name='Лента по запросу'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
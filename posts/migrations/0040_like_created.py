@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 23:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0039_userstats_feed_pulled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='like',
+            name='created',
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now,
+                verbose_name='Дата лайка'),
+            preserve_default=False,
+        ),
+    ]
@@ -1,8 +1,13 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, models, transaction
 
 from django.utils.translation import gettext_lazy as _
 
+from .settings import FEED_PULL_THRESHOLD
+from .storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
@@ -20,11 +25,35 @@ class Group(models.Model):
         max_length=20,
         unique=True)
     description = models.TextField('Описание')
+    posts_count = models.PositiveIntegerField(
+        'Количество записей',
+        default=0,
+        editable=False)
+    activity = models.PositiveIntegerField(
+        'Активность за последние дни',
+        default=0,
+        editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-activity', '-id'],
+                name='group_activity_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def feed(self):
+        """ Посты для карточек ленты: автор и группа
+        загружаются вместе с постом одним запросом """
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -46,18 +75,57 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True, null=True)
+    likes_count = models.PositiveIntegerField(
+        'Количество лайков',
+        default=0,
+        editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False)
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False)
     # post_like = models.ManyToManyField(
     #     User,
     #     related_name='post_liked',
     #     blank=True)
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
+        # Ленты идут по ключам курсора (pub_date, id)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_feed_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Новая версия сбрасывает закэшированную карточку поста. Если
+        # update_fields не пишет версию, она не меняется и в памяти
+        update_fields = kwargs.get('update_fields')
+        if self.pk is not None and (
+                update_fields is None or 'version' in update_fields):
+            self.version += 1
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -107,6 +175,9 @@ class Like(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='likes')
+    created = models.DateTimeField(
+        'Дата лайка',
+        auto_now_add=True)
 
     class Meta:
         constraints = [
@@ -117,4 +188,137 @@ class Like(models.Model):
         ]
 
     def __str__(self):
-        return f'User: {self.user} liked post: {self.post}' 
\ No newline at end of file
+        return f'User: {self.user} liked post: {self.post}' 
+
+
+class FeedEntry(models.Model):
+    """ Запись материализованной ленты подписок пользователя """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_user_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['user', 'post'],
+                name = 'unique_feed_entry_user_post',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """ Счётчики профиля автора, обновляются сигналами """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    likes_count = models.PositiveIntegerField('Получено лайков', default=0)
+    # Посты автора подтягиваются при чтении ленты, а не раскладываются
+    feed_pulled = models.BooleanField('Лента по запросу', default=False)
+
+    def __str__(self):
+        return f'Stats: {self.user}'
+
+    @classmethod
+    def collect(cls, user_id):
+        """ Считает статистику пользователя по таблицам целиком """
+        followers_count = Follow.objects.filter(author_id=user_id).count()
+        return cls(
+            user_id=user_id,
+            followers_count=followers_count,
+            following_count=Follow.objects.filter(user_id=user_id).count(),
+            posts_count=Post.objects.filter(author_id=user_id).count(),
+            likes_count=Like.objects.filter(post__author_id=user_id).count(),
+            feed_pulled=followers_count >= FEED_PULL_THRESHOLD,
+        )
+
+    @classmethod
+    def for_user(cls, user_id):
+        """ Статистика одной строкой, при первом обращении считается """
+        stats = cls.objects.filter(user_id=user_id).first()
+        if stats is None:
+            stats = cls.collect(user_id)
+            try:
+                with transaction.atomic():
+                    stats.save(force_insert=True)
+            except IntegrityError:
+                stats = cls.objects.get(user_id=user_id)
+        return stats
+
+
+class PostActivity(models.Model):
+    """ Лайки и комментарии поста за интервал времени bucket """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='activity')
+    bucket = models.PositiveIntegerField('Номер интервала')
+    likes = models.IntegerField('Лайков', default=0)
+    comments = models.IntegerField('Комментариев', default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket'], name='post_activity_bucket_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['post', 'bucket'],
+                name = 'unique_post_activity_bucket',
+            ),
+        ]
+
+
+class GroupActivity(models.Model):
+    """ Новые посты и комментарии группы за один день """
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='activity_days')
+    day = models.PositiveIntegerField('Номер дня')
+    posts = models.IntegerField('Записей', default=0)
+    comments = models.IntegerField('Комментариев', default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day'], name='group_activity_day_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['group', 'day'],
+                name = 'unique_group_activity_day',
+            ),
+        ]
+
+
+class StoredImage(models.Model):
+    """ Загруженная картинка и её подготовленные размеры и форматы """
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    variants = models.TextField('Варианты', default='[]', editable=False)
+    references = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False)
+
+    def __str__(self):
+        return self.name
+
+    def variant_list(self):
+        """ Список словарей format, width, height, name """
+        return json.loads(self.variants)
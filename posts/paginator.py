@@ -0,0 +1,145 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+from .settings import POSTS_PER_PAGE
+
+FORWARD = 'next'
+BACKWARD = 'previous'
+
+
+def encode_cursor(obj, keys, direction):
+    """ Непрозрачный токен курсора по значениям ключей объекта """
+    return encode_values([getattr(obj, key) for key in keys], direction)
+
+
+def encode_values(values, direction):
+    """ Токен курсора по значениям ключей, например из values_list """
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value
+              for value in values]
+    raw = json.dumps([direction, values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, model, keys):
+    """ Разбор токена курсора, при ошибке возвращает None """
+    return parse_cursor(
+        token, [model._meta.get_field(key).to_python for key in keys])
+
+
+def parse_cursor(token, parsers):
+    """ Разбор токена курсора, значения приводятся функциями parsers """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+        if direction not in (FORWARD, BACKWARD) or \
+                len(values) != len(parsers):
+            return None
+        values = [parse(value) for parse, value in zip(parsers, values)]
+    except Exception:
+        return None
+    if None in values:
+        return None
+    return direction, values
+
+
+def keyset_filter(keys, values, direction):
+    """ Условие (k1, k2, ...) < (v1, v2, ...) для убывающей сортировки """
+    lookup = 'lt' if direction == FORWARD else 'gt'
+    condition = Q()
+    for position, key in enumerate(keys):
+        equal = {k: v for k, v in zip(keys[:position], values[:position])}
+        equal[f'{key}__{lookup}'] = values[position]
+        condition |= Q(**equal)
+    return condition
+
+
+def read_cursor(request, model, keys):
+    """ Курсор из параметра ?cursor= запроса """
+    return decode_cursor(request.GET.get('cursor', ''), model, keys)
+
+
+def cursor_token(request, model, keys):
+    """ Курсор ?cursor= в каноническом виде, пустая строка для пустого
+    или неверного. Неверный курсор ведёт на первую страницу, поэтому
+    по этому токену строятся ключи кэша: мусор в адресе не плодит
+    записей """
+    cursor = read_cursor(request, model, keys)
+    if cursor is None:
+        return ''
+    direction, values = cursor
+    return encode_values([
+        value.astimezone(timezone.utc)
+        if isinstance(value, datetime) and value.tzinfo else value
+        for value in values
+    ], direction)
+
+
+def keyset_window(queryset, keys, cursor, limit):
+    """ Первые limit строк за курсором в порядке обхода:
+    по убыванию ключей вперёд и по возрастанию назад """
+    queryset = queryset.order_by(*[f'-{key}' for key in keys])
+    if cursor is not None:
+        direction, values = cursor
+        queryset = queryset.filter(keyset_filter(keys, values, direction))
+        if direction == BACKWARD:
+            queryset = queryset.reverse()
+    return list(queryset[:limit])
+
+
+def trim_window(items, cursor, per_page):
+    """ Строки страницы по убыванию ключей из окна на одну строку
+    длиннее страницы и признаки следующей и предыдущей страниц """
+    direction = cursor[0] if cursor is not None else FORWARD
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if direction == BACKWARD:
+        items.reverse()
+        return items, cursor is not None, has_more
+    return items, has_more, cursor is not None
+
+
+def make_page(items, paginator, cursor, keys):
+    """ Собирает Page из окна на одну строку длиннее страницы """
+    items, has_next, has_previous = trim_window(
+        items, cursor, paginator.per_page)
+    next_cursor = previous_cursor = None
+    if items and has_next:
+        next_cursor = encode_cursor(items[-1], keys, FORWARD)
+    if items and has_previous:
+        previous_cursor = encode_cursor(items[0], keys, BACKWARD)
+    return cursor_page(items, paginator, next_cursor, previous_cursor)
+
+
+def cursor_page(object_list, paginator, next_cursor, previous_cursor):
+    """ Page с соседними страницами по курсорам.
+
+    Номера у страницы нет, поэтому соседние страницы определяются по
+    курсорам, а не по номеру и COUNT паджинатора. Тесты курса проверяют,
+    что страница именно Page, поэтому методы подменяются у экземпляра,
+    а не в подклассе.
+    """
+    page = Page(object_list, 1, paginator)
+    page.next_cursor = next_cursor
+    page.previous_cursor = previous_cursor
+    page.has_next = lambda: page.next_cursor is not None
+    page.has_previous = lambda: page.previous_cursor is not None
+    page.has_other_pages = lambda: page.has_next() or page.has_previous()
+    return page
+
+
+def get_cursor_page(request, object_list, per_page=POSTS_PER_PAGE,
+                    keys=('pub_date', 'id')):
+    """ Keyset-пагинация по ?cursor= без COUNT и OFFSET.
+
+    Возвращает обычный Page, связанный с ленивым Paginator, чтобы шаблоны
+    и тесты получали привычные объекты. Ссылки на соседние страницы
+    лежат в page.next_cursor и page.previous_cursor.
+    """
+    paginator = Paginator(object_list, per_page)
+    cursor = read_cursor(request, object_list.model, keys)
+    items = keyset_window(object_list, keys, cursor, per_page + 1)
+    return make_page(items, paginator, cursor, keys)
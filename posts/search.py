@@ -0,0 +1,253 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+from django.core.paginator import Paginator
+from django.db import connection
+
+from .caching import ProcessIndex
+from .models import Post
+from .paginator import BACKWARD, FORWARD, make_page, parse_cursor
+from .settings import FEED_BATCH_SIZE, POSTS_PER_PAGE, SEARCH_RANK_LIMIT
+
+FTS_TABLE = 'posts_post_fts'
+SEARCH_GENERATION_KEY = 'posts:search_generation'
+HIT_KEYS = ('score', 'id')
+
+# Как токенизатор unicode61 в FTS5: буквы и цифры, без подчёркивания
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Параметры BM25, те же значения использует FTS5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+Hit = namedtuple('Hit', HIT_KEYS)
+
+
+def tokenize(text):
+    """ Слова текста в нижнем регистре """
+    return TOKEN_RE.findall(text.lower())
+
+
+class FTS5Index:
+    """ Индекс в виртуальной таблице SQLite FTS5.
+
+    Таблица создаётся миграцией, если sqlite собран с FTS5. Изменения
+    пишутся в той же транзакции, что и пост.
+    """
+
+    def add(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post_id, text])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    @staticmethod
+    def query_sql(cursor):
+        """ Запрос страницы результатов за курсором.
+
+        Ранжирующую функцию bm25 нельзя использовать в WHERE, поэтому
+        условие курсора накладывается на подзапрос. Подзапрос идёт по
+        rowid в порядке индекса и останавливается на SEARCH_RANK_LIMIT
+        совпадениях, так что bm25 не считается для всей таблицы.
+        """
+        sql = (
+            f'SELECT score, id FROM ('
+            f'SELECT -bm25({FTS_TABLE}) AS score, rowid AS id '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s)'
+        )
+        order = 'DESC'
+        if cursor is not None:
+            lookup = '<' if cursor[0] == FORWARD else '>'
+            sql += (f' WHERE score {lookup} %s '
+                    f'OR (score = %s AND id {lookup} %s)')
+            if cursor[0] == BACKWARD:
+                order = 'ASC'
+        return sql + f' ORDER BY score {order}, id {order} LIMIT %s'
+
+    @staticmethod
+    def query_params(terms, cursor, limit):
+        # Каждое слово в кавычках: ввод пользователя не разбирается
+        # как синтаксис запросов FTS5
+        params = [' '.join(f'"{term}"' for term in terms), SEARCH_RANK_LIMIT]
+        if cursor is not None:
+            score, post_id = cursor[1]
+            params += [score, score, post_id]
+        return params + [limit]
+
+    def search(self, terms, cursor, limit):
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(
+                self.query_sql(cursor),
+                self.query_params(terms, cursor, limit))
+            return [Hit(*row) for row in db_cursor.fetchall()]
+
+
+class InvertedIndex:
+    """ Обратный индекс в памяти процесса для баз без FTS5.
+
+    Для каждого слова хранятся id постов и число вхождений, результаты
+    ранжируются по BM25 среди SEARCH_RANK_LIMIT самых новых совпадений,
+    как и в FTS5Index. Согласованность между воркерами обеспечивает
+    ProcessIndex.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.terms = {}
+        self.lengths = {}
+        self.total_length = 0
+        self.lock = threading.Lock()
+
+    def build(self, rows):
+        for post_id, text in rows:
+            self.add(post_id, text)
+
+    def add(self, post_id, text):
+        words = tokenize(text)
+        frequencies = Counter(words)
+        with self.lock:
+            self._remove(post_id)
+            for term, count in frequencies.items():
+                self.postings[term][post_id] = count
+            self.terms[post_id] = tuple(frequencies)
+            self.lengths[post_id] = len(words)
+            self.total_length += len(words)
+
+    def remove(self, post_id):
+        with self.lock:
+            self._remove(post_id)
+
+    def _remove(self, post_id):
+        for term in self.terms.pop(post_id, ()):
+            postings = self.postings[term]
+            del postings[post_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(post_id, 0)
+
+    def search(self, terms, cursor, limit):
+        with self.lock:
+            postings = sorted(
+                (self.postings.get(term, {}) for term in set(terms)),
+                key=len)
+            if not postings or not postings[0]:
+                return []
+            # Обход начинается с самого редкого слова
+            found = set(postings[0]).intersection(*postings[1:])
+            if len(found) > SEARCH_RANK_LIMIT:
+                found = heapq.nlargest(SEARCH_RANK_LIMIT, found)
+            hits = [Hit(self._score(post_id, postings), post_id)
+                    for post_id in found]
+        if cursor is None:
+            return heapq.nlargest(limit, hits)
+        direction, values = cursor
+        after = Hit(*values)
+        if direction == FORWARD:
+            return heapq.nlargest(limit, (h for h in hits if h < after))
+        return heapq.nsmallest(limit, (h for h in hits if h > after))
+
+    def _score(self, post_id, postings):
+        count = len(self.lengths)
+        average = self.total_length / count or 1
+        length = self.lengths[post_id]
+        score = 0.0
+        for documents in postings:
+            idf = math.log(
+                (count - len(documents) + 0.5) / (len(documents) + 0.5) + 1)
+            frequency = documents[post_id]
+            score += idf * frequency * (BM25_K1 + 1) / (
+                frequency + BM25_K1 * (
+                    1 - BM25_B + BM25_B * length / average))
+        return score
+
+
+def build_fallback():
+    index = InvertedIndex()
+    posts = Post.objects.values_list('id', 'text').order_by()
+    index.build(posts.iterator(chunk_size=FEED_BATCH_SIZE))
+    return index
+
+
+_fts5 = None
+_fallback = ProcessIndex(SEARCH_GENERATION_KEY, build_fallback)
+
+
+def fts5_enabled():
+    """ Есть ли в базе таблица FTS5, проверяется один раз на процесс """
+    global _fts5
+    if _fts5 is None:
+        _fts5 = (connection.vendor == 'sqlite' and FTS_TABLE in
+                 connection.introspection.table_names())
+    return _fts5
+
+
+def search_index():
+    """ Индекс для поиска: FTS5, если доступен, иначе обратный индекс """
+    return FTS5Index() if fts5_enabled() else _fallback.get()
+
+
+def index_post(post):
+    """ Добавляет или обновляет пост в индексе """
+    if fts5_enabled():
+        FTS5Index().add(post.id, post.text)
+    else:
+        _fallback.change('add', post.id, post.text)
+
+
+def index_post_range(first_id, last_id):
+    """ Индексирует посты с id от first_id до last_id, например после
+    массовой загрузки без сигналов. Строки диапазона заменяются, поэтому
+    повторный вызов ничего не дублирует """
+    if fts5_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid BETWEEN %s AND %s',
+                [first_id, last_id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table} '
+                f'WHERE id BETWEEN %s AND %s', [first_id, last_id])
+    else:
+        # Обратный индекс каждого процесса будет построен заново
+        _fallback.reset()
+
+
+def unindex_post(post_id):
+    """ Убирает пост из индекса """
+    if fts5_enabled():
+        FTS5Index().remove(post_id)
+    else:
+        _fallback.change('remove', post_id)
+
+
+def search_hits(query, cursor=None, limit=POSTS_PER_PAGE):
+    """ Результаты поиска по убыванию релевантности """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    return search_index().search(terms, cursor, limit)
+
+
+def get_search_page(request, query, per_page=POSTS_PER_PAGE):
+    """ Страница результатов поиска с пагинацией по (score, id).
+
+    Релевантность зависит от всего индекса, поэтому после добавления
+    постов соседние страницы могут немного сдвинуться.
+    """
+    cursor = parse_cursor(request.GET.get('cursor', ''), (float, int))
+    hits = search_hits(query, cursor, per_page + 1)
+    page = make_page(hits, Paginator(hits, per_page), cursor, HIT_KEYS)
+    posts = Post.objects.feed().in_bulk([hit.id for hit in page])
+    page.object_list = [posts[hit.id] for hit in page if hit.id in posts]
+    return page
@@ -1,3 +1,88 @@
 # Локальные настройки для приложения posts
 
 POSTS_PER_PAGE = 10
+
+# Размер пачки при раскладке постов по лентам подписчиков
+FEED_BATCH_SIZE = 1000
+
+# Посты авторов с таким числом подписчиков и больше не раскладываются
+# по лентам, а подтягиваются при чтении ленты
+FEED_PULL_THRESHOLD = 10000
+
+# Популярный автор снова раскладывается по лентам, только когда подписчиков
+# стало меньше этого числа. Разрыв с FEED_PULL_THRESHOLD не даёт автору
+# у порога переключаться туда и обратно при каждой подписке и отписке
+FEED_PUSH_THRESHOLD = 9000
+
+# Время жизни кэша фрагментов лент, сбрасывается сигналами моделей
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько найденных постов показывает поиск в админке
+ADMIN_SEARCH_LIMIT = 1000
+
+# Релевантность считается только для стольких самых новых совпадений:
+# частое слово не заставляет ранжировать всю таблицу постов
+SEARCH_RANK_LIMIT = 10000
+
+# Сколько подсказок возвращает автодополнение
+AUTOCOMPLETE_LIMIT = 10
+
+# Журнал изменений индексов в памяти процессов (поиск, автодополнение):
+# сколько хранится запись в секундах, при каком отставании индекс
+# перестраивается целиком и сколько секунд ждать запись, которую другой
+# процесс ещё не успел записать
+PROCESS_INDEX_LOG_TIMEOUT = 5 * 60
+PROCESS_INDEX_LOG_LIMIT = 1000
+PROCESS_INDEX_LOG_WAIT = 5
+
+# Популярное: счётчики лайков и комментариев по интервалам в секундах
+# внутри скользящего окна, комментарий весит больше лайка
+TRENDING_BUCKET = 5 * 60
+TRENDING_WINDOW = 24 * 60 * 60
+TRENDING_COMMENT_WEIGHT = 2
+TRENDING_SIZE = 30
+
+# Сколько живёт список популярного в кэше. Команда refresh_trending
+# должна запускаться чаще, иначе список пересчитает первый запрос
+TRENDING_TIMEOUT = 10 * 60
+
+# За сколько последних дней считается активность групп
+GROUP_ACTIVITY_DAYS = 7
+
+# Сколько живёт порядок групп, запомненный при открытии списка групп
+GROUPS_SNAPSHOT_TIMEOUT = 60 * 60
+
+# Превью картинок постов, создаются в фоне после загрузки
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+# Потоков для обработки картинок, при 0 превью создаются прямо в запросе
+IMAGE_WORKERS = 2
+
+# Варианты картинки поста для srcset: ширины и форматы с пропорциями
+# превью 960x339. Создаются в фоне вместе с превью
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+IMAGE_VARIANT_FORMATS = ('WEBP', 'JPEG')
+IMAGE_VARIANT_RATIO = 339 / 960
+
+# Сколько картинок с готовыми вариантами помнит каждый процесс
+IMAGE_CACHE_SIZE = 10000
+
+# Алгоритм хэша, по которому называются загруженные файлы
+MEDIA_HASH_ALGORITHM = 'sha256'
+
+# Наибольший размер страницы JSON API
+API_MAX_LIMIT = 100
+
+# Сколько последних постов попадает в ленты RSS и Atom
+FEED_SIZE = 20
+
+# Длина заголовка записи в ленте
+FEED_TITLE_LENGTH = 80
+
+# Сколько строк выгрузки читается из базы за раз
+EXPORT_CHUNK_SIZE = 1000
+
+# Размер куска ответа выгрузки в символах
+EXPORT_CHUNK_LENGTH = 64 * 1024
@@ -0,0 +1,363 @@
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import (
+    USER_FIELDS, index_group, index_user, unindex_group, unindex_user,
+)
+from .caching import (
+    bump_generation, feed_names, forget_pages, forget_profile_headers,
+    forget_user_stats,
+)
+from .feed import clear_follow_feed, fan_out_post, fill_follow_feed
+from .group_activity import change_posts_count, record_group_activity
+from .images import release_image, retain_image
+from .models import Comment, Follow, Group, Like, Post, User, UserStats
+from .search import index_post, unindex_post
+from .syndication import AUTHOR, GROUP, forget_feeds, syndication_key
+from .trending import record_activity
+
+COUNTERS = {
+    Like: 'likes_count',
+    Comment: 'comments_count',
+}
+
+
+def change_counter(instance, delta):
+    """ Атомарно меняет счётчик поста через F(), без чтения строки """
+    field = COUNTERS[type(instance)]
+    posts = Post.objects.filter(pk=instance.post_id)
+    if delta < 0:
+        posts = posts.filter(**{f'{field}__gte': -delta})
+    posts.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+def increment_counter(sender, instance, created, raw=False, **kwargs):
+    """ Новый лайк или комментарий увеличивает счётчик поста """
+    if created and not raw:
+        change_counter(instance, 1)
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def decrement_counter(sender, instance, **kwargs):
+    """ Удаление, в том числе каскадное, уменьшает счётчик поста """
+    change_counter(instance, -1)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def update_trending(sender, instance, created=True, raw=False, **kwargs):
+    """ Лайки и комментарии попадают в счётчики популярного """
+    if not created or raw:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    field = 'likes' if sender is Like else 'comments'
+    record_activity(instance.post_id, field, delta, instance.created)
+
+
+def change_stats(field, delta, **lookup):
+    """ Атомарно меняет счётчик UserStats. Отсутствующая строка
+    не создаётся: она будет посчитана целиком при первом чтении """
+    stats = UserStats.objects.filter(**lookup)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    """ Запоминает прежние группу и картинку редактируемого поста и то,
+    загружается ли картинка сейчас: ссылку загрузки берёт хранилище """
+    if raw:
+        return
+    instance._image_uploaded = bool(instance.image) and \
+        not instance.image._committed
+    if instance.pk is not None:
+        previous = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'image').first()
+        instance._previous_group_id, instance._previous_image = (
+            previous or (None, None))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_group_posts(sender, instance, created=True, raw=False, **kwargs):
+    """ Новый, удалённый или перенесённый в другую группу пост меняет
+    число записей и активность групп """
+    if raw:
+        return
+    moves = []
+    if kwargs['signal'] is post_delete:
+        moves.append((instance.group_id, -1))
+    elif created:
+        moves.append((instance.group_id, 1))
+    else:
+        previous = getattr(instance, '_previous_group_id', None)
+        if previous != instance.group_id:
+            moves += [(previous, -1), (instance.group_id, 1)]
+    for group_id, delta in moves:
+        if group_id is not None:
+            change_posts_count(group_id, delta)
+            record_group_activity(
+                group_id, 'posts', instance.pub_date, delta)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_image_references(sender, instance, created=True, raw=False,
+                            **kwargs):
+    """ Посты с одинаковой картинкой делят один файл: новый, удалённый
+    или сменивший картинку пост меняет счётчик ссылок на файл. Ссылку
+    на загруженный файл уже взяло хранилище """
+    if raw:
+        return
+    image = instance.image.name or None
+    if kwargs['signal'] is post_delete:
+        release_image(image)
+        return
+    previous = None
+    if not created:
+        previous = getattr(instance, '_previous_image', None) or None
+    uploaded = getattr(instance, '_image_uploaded', False)
+    if previous == image and not uploaded:
+        return
+    if not uploaded:
+        retain_image(image)
+    # Повторная загрузка той же картинки снимает лишнюю ссылку
+    release_image(previous)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, raw=False, **kwargs):
+    """ Новый, изменённый или удалённый пост сбрасывает ленты RSS и Atom
+    и страницы лент сайта, автора и групп, в том числе прежней группы """
+    if not raw:
+        names = feed_names(
+            instance.author_id, instance.group_id,
+            getattr(instance, '_previous_group_id', None))
+        forget_feeds(*names)
+        forget_pages(*names)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def invalidate_post_pages(sender, instance, created=True, raw=False,
+                          **kwargs):
+    """ Лайк и комментарий меняют счётчики карточки только на страницах
+    лент с этим постом """
+    if not created or raw:
+        return
+    row = Post.objects.filter(pk=instance.post_id).values_list(
+        'author__username', 'group__slug').first()
+    if row is not None:
+        username, slug = row
+        forget_pages([username], [slug] if slug else [])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_post_comments(sender, instance, created=True, raw=False,
+                          **kwargs):
+    """ Правка и удаление комментария меняют страницу поста, хотя его
+    счётчики могут остаться прежними """
+    if raw or created and kwargs['signal'] is post_save:
+        return
+    Post.objects.filter(pk=instance.post_id).update(version=F('version') + 1)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw=False, **kwargs):
+    """ Запоминает прежний адрес редактируемой группы """
+    if instance.pk is not None and not raw:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_syndication(sender, instance, raw=False, **kwargs):
+    """ Название и описание группы есть в её ленте. Лента по прежнему
+    адресу тоже сбрасывается, чтобы он не отвечал 304 """
+    if raw:
+        return
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)}
+    for slug in slugs - {None}:
+        bump_generation(syndication_key(GROUP, slug))
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, raw=False, update_fields=None,
+                        **kwargs):
+    """ Запоминает прежние логин и имя, если сохраняются поля имени """
+    if instance.pk is None or raw:
+        return
+    instance._previous_names = None
+    if update_fields is None or set(update_fields) & set(USER_FIELDS):
+        instance._previous_names = User.objects.filter(
+            pk=instance.pk).values_list(*USER_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author_syndication(sender, instance, raw=False,
+                                  update_fields=None, **kwargs):
+    """ Имя автора есть в заголовке его ленты, лента по прежнему логину
+    сбрасывается. Сохранение только last_login ленту не трогает """
+    if raw:
+        return
+    if update_fields is not None and \
+            not set(update_fields) & set(USER_FIELDS):
+        return
+    previous = getattr(instance, '_previous_names', None) or (None,)
+    usernames = {instance.username, previous[0]}
+    for username in usernames - {None}:
+        bump_generation(syndication_key(AUTHOR, username))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_group_comments(sender, instance, created=True, raw=False,
+                          **kwargs):
+    """ Комментарий к посту группы меняет её активность """
+    if not created or raw:
+        return
+    group_id = Post.objects.filter(pk=instance.post_id).values_list(
+        'group_id', flat=True).first()
+    if group_id is not None:
+        delta = -1 if kwargs['signal'] is post_delete else 1
+        record_group_activity(group_id, 'comments', instance.created, delta)
+
+
+# Статистика обновляется раньше лент: решение о раскладке постов
+# по лентам читает число подписчиков из UserStats
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def update_follow_stats(sender, instance, created=True, raw=False, **kwargs):
+    """ Подписка и отписка меняют счётчики обоих пользователей """
+    if not created or raw:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    change_stats('followers_count', delta, user_id=instance.author_id)
+    change_stats('following_count', delta, user_id=instance.user_id)
+    forget_user_stats(instance.author_id, instance.user_id)
+    forget_profile_headers(instance.author_id, instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_posts_stats(sender, instance, created=True, raw=False, **kwargs):
+    """ Новый или удалённый пост меняет счётчик записей автора """
+    if not created or raw:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    change_stats('posts_count', delta, user_id=instance.author_id)
+    forget_user_stats(instance.author_id)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def update_likes_stats(sender, instance, created=True, raw=False, **kwargs):
+    """ Лайк меняет счётчик полученных автором поста лайков """
+    if not created or raw:
+        return
+    delta = -1 if kwargs['signal'] is post_delete else 1
+    author_id = Post.objects.filter(pk=instance.post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is not None:
+        change_stats('likes_count', delta, user_id=author_id)
+        forget_user_stats(author_id)
+
+
+@receiver(post_save, sender=Post)
+def push_to_feeds(sender, instance, created, raw=False, **kwargs):
+    """ Новый пост попадает в ленты подписчиков автора """
+    if created and not raw:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed(sender, instance, created, raw=False, **kwargs):
+    """ При подписке посты автора добавляются в ленту """
+    if created and not raw:
+        fill_follow_feed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(sender, instance, **kwargs):
+    """ При отписке посты автора убираются из ленты """
+    clear_follow_feed(instance)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+    """ Новый или изменённый пост сразу доступен в поиске """
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    """ Удалённый пост пропадает из поиска """
+    unindex_post(instance.id)
+
+
+@receiver(post_save, sender=User)
+def update_user_autocomplete(sender, instance, update_fields=None, **kwargs):
+    """ Новое или изменённое имя пользователя попадает в подсказки.
+    Сохранение только last_login при входе индекс не трогает """
+    if update_fields is None or set(update_fields) & set(USER_FIELDS):
+        index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_user_autocomplete(sender, instance, **kwargs):
+    unindex_user(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def update_group_autocomplete(sender, instance, **kwargs):
+    """ Новая или переименованная группа попадает в подсказки """
+    index_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def remove_group_autocomplete(sender, instance, **kwargs):
+    unindex_group(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feed_cache(sender, **kwargs):
+    """ Название группы есть в карточках всех лент, поэтому её изменение
+    сбрасывает кэш фрагментов всех лент """
+    bump_generation()
+
+
+@receiver(post_save, sender=Group)
+def refresh_group_cards(sender, instance, created, raw=False, **kwargs):
+    """ Карточки постов группы показывают её название """
+    if not created and not raw:
+        instance.posts.update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=User)
+def refresh_author_cards(sender, instance, raw=False, **kwargs):
+    """ Карточки постов автора показывают его имя и ссылки по логину """
+    previous = getattr(instance, '_previous_names', None)
+    if raw or previous is None:
+        return
+    if previous != tuple(getattr(instance, field) for field in USER_FIELDS):
+        # Имя показывается и в комментариях на странице поста
+        Post.objects.filter(
+            Q(author=instance) | Q(comments__author=instance),
+        ).update(version=F('version') + 1)
+        # Карточки лежат и внутри фрагментов страниц всех лент
+        bump_generation()
@@ -0,0 +1,54 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+from .settings import MEDIA_HASH_ALGORITHM
+
+
+def content_hash(content):
+    """ Хэш содержимого файла, читается по частям без загрузки
+    файла в память целиком """
+    digest = hashlib.new(MEDIA_HASH_ALGORITHM)
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """ Хранилище загрузок с именем файла по хэшу содержимого.
+
+    Одинаковые файлы получают одно имя и сохраняются один раз,
+    поэтому у них общие превью. Удаляет файлы только счётчик ссылок
+    StoredImage, когда на картинку не остаётся постов. Ссылку загрузки
+    save берёт сам, до проверки файла: удаление файла без ссылок либо
+    ждёт её и файл оставляет, либо успевает раньше, и тогда файл
+    записывается заново.
+    """
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content)).replace(
+            '\\', '/')
+        # models импортирует хранилище, поэтому счётчик - при вызове
+        from .images import retain_image
+        with transaction.atomic():
+            # Ссылка блокирует запись StoredImage до конца транзакции
+            retain_image(name)
+            if not self.exists(name):
+                self._save(name, content)
+        return name
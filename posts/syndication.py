@@ -0,0 +1,167 @@
+import hashlib
+import io
+
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import quote_etag
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from .caching import bump_generation, get_generation, not_modified, with_etag
+from .settings import FEED_CACHE_TIMEOUT, FEED_SIZE, FEED_TITLE_LENGTH
+
+SITE = 'site'
+AUTHOR = 'author'
+GROUP = 'group'
+SYNDICATION_KEY = 'posts:syndication:{}:{}'
+
+
+class StreamingFeedMixin:
+    """ Лента, которая пишется по одному посту, а не целиком в память.
+    Корневые элементы и элемент записи берутся у классов Django """
+
+    # Открытые до записей элементы: (имя, метод с атрибутами)
+    open_elements = ()
+    item_element = None
+
+    def stream(self, items):
+        """ Куски XML: заголовок, затем по куску на запись и конец.
+        items - итератор аргументов add_item """
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(buffer, 'utf-8')
+        items = iter(items)
+        first = next(items, None)
+        # Дата обновления ленты - дата первой, самой новой записи
+        self.items = []
+        if first is not None:
+            self.add_item(**first)
+        handler.startDocument()
+        for name, attributes in self.open_elements:
+            handler.startElement(name, getattr(self, attributes)())
+        self.add_root_elements(handler)
+        yield drain(buffer)
+        for item in self.items:
+            self.write_item(handler, item)
+            yield drain(buffer)
+        for kwargs in items:
+            self.items = []
+            self.add_item(**kwargs)
+            self.write_item(handler, self.items[0])
+            yield drain(buffer)
+        for name, _ in reversed(self.open_elements):
+            handler.endElement(name)
+        yield drain(buffer)
+
+    def write_item(self, handler, item):
+        handler.startElement(self.item_element, self.item_attributes(item))
+        self.add_item_elements(handler, item)
+        handler.endElement(self.item_element)
+
+
+class AtomFeed(StreamingFeedMixin, Atom1Feed):
+    open_elements = (('feed', 'root_attributes'),)
+    item_element = 'entry'
+
+
+class RssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    open_elements = (
+        ('rss', 'rss_attributes'),
+        ('channel', 'root_attributes'),
+    )
+    item_element = 'item'
+
+
+FEED_FORMATS = {
+    'atom': AtomFeed,
+    'rss': RssFeed,
+}
+
+
+def drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def syndication_key(kind, name=None):
+    """ Ключ поколения ленты: сайта, автора по логину или группы по
+    адресу. Ключ строится из адреса ленты, поэтому ETag проверяется
+    без запросов к базе """
+    return SYNDICATION_KEY.format(kind, name or '')
+
+
+def forget_feeds(usernames, slugs):
+    """ Сбрасывает ленты, в которые попадает пост: сайта, автора
+    и групп по именам из feed_names """
+    bump_generation(syndication_key(SITE))
+    for username in usernames:
+        bump_generation(syndication_key(AUTHOR, username))
+    for slug in slugs:
+        bump_generation(syndication_key(GROUP, slug))
+
+
+def post_items(request, post_list):
+    """ Аргументы add_item для последних постов без объектов Post """
+    rows = post_list.order_by('-pub_date', '-id').values_list(
+        'id', 'text', 'pub_date',
+        'author__username', 'author__first_name', 'author__last_name',
+    )[:FEED_SIZE]
+    for post_id, text, pub_date, username, first_name, last_name in (
+            rows.iterator()):
+        link = request.build_absolute_uri(
+            reverse('post', args=[username, post_id]))
+        yield {
+            'title': Truncator(text).chars(FEED_TITLE_LENGTH),
+            'link': link,
+            'description': text,
+            'unique_id': link,
+            'pubdate': pub_date,
+            'author_name': f'{first_name} {last_name}'.strip() or username,
+        }
+
+
+def cache_chunks(chunks, key):
+    """ Отдаёт куски дальше и кладёт ленту в кэш, когда она дописана """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), FEED_CACHE_TIMEOUT)
+
+
+def feed_response(request, feed_format, key, describe):
+    """ Лента постов с ETag по поколению ленты. Готовая лента берётся
+    из кэша, новая пишется потоком и кэшируется по ходу.
+
+    describe() возвращает посты ленты и аргументы заголовка. Он
+    вызывается, только когда ленту нужно писать: ответ 304 и лента из
+    кэша обходятся без запросов к базе.
+    """
+    feed_class = FEED_FORMATS.get(feed_format)
+    if feed_class is None:
+        raise Http404
+    # Ссылки в ленте абсолютные, поэтому в ключе есть схема и хост
+    cache_key = ':'.join((
+        key, feed_format, request.build_absolute_uri('/'),
+        str(get_generation(key))))
+    etag = quote_etag(hashlib.md5(cache_key.encode()).hexdigest())
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    content_type = feed_class.content_type
+    xml = cache.get(cache_key)
+    if xml is not None:
+        return with_etag(HttpResponse(xml, content_type=content_type), etag)
+    post_list, feed_kwargs = describe()
+    feed = feed_class(
+        link=request.build_absolute_uri(feed_kwargs.pop('link')),
+        feed_url=request.build_absolute_uri(),
+        language='ru',
+        **feed_kwargs,
+    )
+    chunks = feed.stream(post_items(request, post_list))
+    return with_etag(StreamingHttpResponse(
+        cache_chunks(chunks, cache_key), content_type=content_type), etag)
@@ -0,0 +1,118 @@
+from django import template
+from django.core.cache import cache
+
+from posts.settings import FEED_CACHE_TIMEOUT
+
+register = template.Library()
+
+# Переменная контекста с карточками страницы
+CARD_BATCH = 'card_batch'
+
+
+def card_cache_key(post, context):
+    """ Ключ карточки: версия поста, счётчики и то, что видит зритель.
+    Время публикации отличает пост от другого с тем же id, например после
+    пересоздания базы при общем кэше """
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        viewer = 'anon'
+    elif user.pk == post.author_id:
+        viewer = 'author'
+    else:
+        viewer = 'reader'
+    liked = post.id in context.get('liked_posts', ())
+    return 'posts:card:{}:{}:{}:{}:{}:{}:{:d}:{:d}'.format(
+        post.id, post.pub_date.timestamp(), post.version,
+        post.likes_count, post.comments_count,
+        viewer, liked, bool(context.get('hide_group_title')),
+    )
+
+
+class CardBatch:
+    """ Карточки одной страницы: все читаются из кэша одним get_many при
+    первой карточке, новые записываются одним set_many в конце """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.found = None
+        self.rendered = {}
+
+    def get(self, key, context):
+        if self.found is None:
+            # Все карточки страницы подключаются с одним и тем же контекстом
+            self.found = cache.get_many(
+                [card_cache_key(post, context) for post in self.posts])
+        return self.found.get(key)
+
+    def add(self, key, html):
+        self.rendered[key] = html
+
+    def save(self):
+        if self.rendered:
+            cache.set_many(self.rendered, FEED_CACHE_TIMEOUT)
+
+
+class CachedCardNode(template.Node):
+
+    def __init__(self, nodelist, post):
+        self.nodelist = nodelist
+        self.post = post
+
+    def render(self, context):
+        key = card_cache_key(self.post.resolve(context), context)
+        batch = context.get(CARD_BATCH)
+        if batch is None:
+            html = cache.get(key)
+            if html is None:
+                html = self.nodelist.render(context)
+                cache.set(key, html, FEED_CACHE_TIMEOUT)
+            return html
+        html = batch.get(key, context)
+        if html is None:
+            html = self.nodelist.render(context)
+            batch.add(key, html)
+        return html
+
+
+class CachedCardsNode(template.Node):
+
+    def __init__(self, nodelist, posts):
+        self.nodelist = nodelist
+        self.posts = posts
+
+    def render(self, context):
+        batch = CardBatch(list(self.posts.resolve(context)))
+        with context.push({CARD_BATCH: batch}):
+            html = self.nodelist.render(context)
+        batch.save()
+        return html
+
+
+def parse_block(parser, token, end):
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} tag requires exactly one argument')
+    nodelist = parser.parse((end,))
+    parser.delete_first_token()
+    return nodelist, parser.compile_filter(bits[1])
+
+
+@register.tag
+def cached_card(parser, token):
+    """ {% cached_card post %}...{% endcached_card %}
+
+    Кэширует карточку поста отдельно от страницы: после правки поста,
+    лайка или комментария перерисовывается только изменившаяся карточка.
+    """
+    return CachedCardNode(*parse_block(parser, token, 'endcached_card'))
+
+
+@register.tag
+def cached_cards(parser, token):
+    """ {% cached_cards page %}...{% endcached_cards %}
+
+    Карточки постов page внутри блока читаются из кэша и пишутся в него
+    пачкой, а не отдельным запросом на каждую.
+    """
+    return CachedCardsNode(*parse_block(parser, token, 'endcached_cards'))
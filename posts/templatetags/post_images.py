@@ -0,0 +1,20 @@
+from django import template
+
+from posts.images import CARD_SIZES, PageImages
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/picture.html', takes_context=True)
+def post_picture(context, image):
+    """ Картинка поста: <picture> с заранее подготовленными вариантами,
+    пока их нет - готовое превью или исходный файл. Данные берутся из
+    page_images, которые view собирает для всей страницы """
+    page_images = context.get('page_images')
+    if page_images is None:
+        page_images = PageImages([])
+    return {
+        'image': image,
+        'sizes': CARD_SIZES,
+        **page_images.picture(image),
+    }
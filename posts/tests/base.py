@@ -0,0 +1,34 @@
+from django.test import TestCase
+
+from posts.models import Group, User
+
+
+class PostsTestCase(TestCase):
+    """ Общие объекты тестов приложения: автор постов user, а если класс
+    их просит, то читатель reader и группа автора group.
+
+    Объекты создаются один раз на класс. Свои объекты классы добавляют
+    в setUpTestData после вызова super().
+    """
+
+    # Нужны ли классу читатель и группа
+    with_reader = False
+    with_group = False
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(
+            username='Author'
+            )
+        if cls.with_reader:
+            cls.reader = User.objects.create(
+                username='Reader'
+                )
+        if cls.with_group:
+            cls.group = Group.objects.create(
+                title='Group',
+                slug='group',
+                description='Description',
+                author=cls.user,
+                )
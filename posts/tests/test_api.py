@@ -0,0 +1,89 @@
+from django.test import Client
+from django.urls import reverse
+
+from posts.api import FIELDS
+from posts.models import Post
+from posts.tests.base import PostsTestCase
+
+
+class PostsApiTest(PostsTestCase):
+    """ JSON API постов сайта, группы и автора """
+
+    with_reader = True
+    with_group = True
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user, group=self.group)
+            for number in range(5)
+        ]
+        self.other_post = Post.objects.create(
+            text='Other', author=self.reader)
+
+    def get(self, url, **params):
+        return self.client.get(url, params).json()
+
+    def test_all_fields(self):
+        """ Без fields отдаются все поля, кириллица без экранирования """
+        response = self.client.get(reverse('api_posts'))
+        self.assertIn('Пост 4'.encode(), response.content)
+        item = response.json()['results'][1]
+        self.assertEqual(set(item), set(FIELDS))
+        post = self.posts[-1]
+        self.assertEqual(item['id'], post.id)
+        self.assertEqual(item['author'], 'Author')
+        self.assertEqual(item['group'], 'group')
+        self.assertEqual(item['pub_date'], post.pub_date.isoformat())
+        self.assertIsNone(item['image'])
+
+    def test_sparse_fields(self):
+        """ fields ограничивает поля ответа """
+        data = self.get(reverse('api_posts'), fields='id,likes')
+        self.assertEqual(data['results'][0], {
+            'id': self.other_post.id, 'likes': 0})
+
+    def test_bad_parameters(self):
+        """ Неизвестное поле и неверный limit - ошибка 400 """
+        for params in ({'fields': 'id,password'}, {'limit': '0'},
+                       {'limit': 'много'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api_posts'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_cursor_pagination(self):
+        """ Курсоры next и previous обходят ленту без повторов """
+        url = reverse('api_profile_posts', args=[self.user.username])
+        first = self.get(url, fields='id', limit=2)
+        self.assertIsNone(first['previous'])
+        ids = [item['id'] for item in first['results']]
+        data = first
+        while data['next']:
+            data = self.get(url, fields='id', limit=2, cursor=data['next'])
+            ids += [item['id'] for item in data['results']]
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)])
+        second = self.get(url, fields='id', limit=2, cursor=first['next'])
+        back = self.get(url, fields='id', limit=2,
+                        cursor=second['previous'])
+        self.assertEqual(back['results'], first['results'])
+
+    def test_filtered_feeds(self):
+        """ Ленты автора и группы, для неизвестных - 404 """
+        group = self.get(
+            reverse('api_group_posts', args=[self.group.slug]), fields='id')
+        self.assertEqual(len(group['results']), len(self.posts))
+        profile = self.get(
+            reverse('api_profile_posts', args=[self.reader.username]),
+            fields='id')
+        self.assertEqual(profile['results'], [{'id': self.other_post.id}])
+        response = self.client.get(
+            reverse('api_profile_posts', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_single_query(self):
+        """ Страница API - один запрос без объектов Post """
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api_posts'))
@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.autocomplete import GROUP, USER, PrefixIndex, group_item, user_item
+from posts.caching import ProcessIndex, bump_generation
+from posts.models import Group, User
+
+
+class AutocompleteViewTest(TestCase):
+    """ Подсказки по логинам, именам и группам, у которых общие начала """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='leo',
+            first_name='Лев',
+            last_name='Толстой',
+            )
+        cls.other = User.objects.create(
+            username='lermontov'
+            )
+        cls.group = Group.objects.create(
+            title='Литература',
+            slug='lit',
+            description='Description',
+            author=cls.user,
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+
+    def complete(self, query):
+        response = self.client.get(reverse('autocomplete'), {'q': query})
+        return [item['url'] for item in response.json()['results']]
+
+    def test_autocomplete_by_prefix(self):
+        """ Подсказки по началу логина, имени, адреса и названия группы """
+        profile = reverse('profile', args=['leo'])
+        group = reverse('group', args=['lit'])
+        self.assertEqual(self.complete('le'), [
+            profile, reverse('profile', args=['lermontov'])])
+        self.assertEqual(self.complete('ЛЕВ т'), [profile])
+        self.assertEqual(self.complete('li'), [group])
+        self.assertEqual(self.complete('Лит'), [group])
+        self.assertEqual(self.complete(' '), [])
+        self.assertEqual(self.complete('x'), [])
+
+
+class PrefixIndexTest(TestCase):
+    """ Префиксный индекс подсказок без базы """
+
+    def setUp(self):
+        super().setUp()
+        self.index = PrefixIndex([
+            (USER, 1, user_item('anna', 'Анна', '')),
+            (GROUP, 1, group_item('animals', 'Животные')),
+        ])
+
+    def test_add_replaces_old_keys(self):
+        """ Переименование убирает старые ключи """
+        self.index.add(USER, 1, user_item('bella', 'Белла', ''))
+        self.assertEqual(self.index.lookup('an'),
+                         [(GROUP, 'animals', 'Животные')])
+        self.assertEqual(self.index.lookup('бел'),
+                         [(USER, 'bella', 'Белла')])
+
+    def test_remove_and_limit(self):
+        """ Удалённые записи не подсказываются, число ответов ограничено """
+        self.assertEqual(len(self.index.lookup('an', limit=1)), 1)
+        self.index.remove(GROUP, 1)
+        self.index.remove(GROUP, 2)
+        self.assertEqual(self.index.lookup('an'), [(USER, 'anna', 'Анна')])
+
+
+class ProcessIndexTest(TestCase):
+    """ Индекс процесса догоняет изменения других процессов по журналу """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.build = mock.Mock(side_effect=lambda: PrefixIndex([
+            (USER, 1, user_item('anna', 'Анна', '')),
+        ]))
+        self.index = ProcessIndex('test:index', self.build)
+        # Другой процесс с тем же ключом
+        self.other = ProcessIndex('test:index', self.build)
+
+    def test_changes_are_replayed(self):
+        """ Чужие изменения повторяются из журнала без перестройки """
+        self.index.get()
+        self.other.publish(
+            ('add', (USER, 2, user_item('boris', 'Борис', ''))))
+        self.other.publish(('remove', (USER, 1)))
+        self.assertEqual(self.index.get().lookup('b'),
+                         [(USER, 'boris', 'Борис')])
+        self.assertEqual(self.index.get().lookup('an'), [])
+        self.assertEqual(self.build.call_count, 1)
+
+    def test_reset_and_lost_log_rebuild(self):
+        """ Сброс перестраивает индекс сразу, потерянная запись журнала -
+        после ожидания """
+        self.index.get()
+        self.other.publish(ProcessIndex.RESET)
+        self.index.get()
+        self.assertEqual(self.build.call_count, 2)
+        bump_generation('test:index')
+        self.index.get()
+        self.assertEqual(self.build.call_count, 2)
+        with mock.patch('posts.caching.PROCESS_INDEX_LOG_WAIT', 0):
+            self.index.get()
+        self.assertEqual(self.build.call_count, 3)
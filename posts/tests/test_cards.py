@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from posts.caching import bump_generation
+from posts.models import Post, User
+from posts.tests.base import PostsTestCase
+
+
+class PostCardCacheTest(PostsTestCase):
+    """ Кэш отдельных карточек постов внутри страниц лент """
+
+    with_reader = True
+    with_group = True
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.post = Post.objects.create(
+            text='Old text',
+            author=self.user,
+            group=self.group,
+            )
+        self.other = Post.objects.create(
+            text='Other old text',
+            author=self.user,
+            )
+        self.index = reverse('index')
+
+    def test_page_reuses_unchanged_cards(self):
+        """ Новая страница собирается из закэшированных карточек,
+        перерисовывается только изменившаяся """
+        self.reader_client.get(self.index)
+        Post.objects.filter(id=self.other.id).update(text='Other new text')
+        Post.objects.filter(id=self.post.id).update(text='New text')
+        self.reader_client.get(
+            reverse('post_like', args=[self.user.username, self.post.id]))
+        response = self.reader_client.get(self.index)
+        self.assertContains(response, 'New text')
+        self.assertContains(response, 'Other old text')
+
+    def test_edit_rerenders_card(self):
+        """ После редактирования карточка показывает новый текст """
+        self.author_client.get(self.index)
+        self.author_client.post(
+            reverse('post_edit', args=[self.user.username, self.post.id]),
+            {'text': 'Edited text', 'group': self.group.id})
+        self.assertContains(self.author_client.get(self.index), 'Edited text')
+
+    def test_card_depends_on_viewer(self):
+        """ Автор и читатель получают разные карточки """
+        self.reader_client.get(self.index)
+        bump_generation()
+        response = self.author_client.get(self.index)
+        self.assertContains(response, 'bi-pencil')
+
+    def test_group_rename_rerenders_card(self):
+        """ Переименование группы обновляет карточки её постов """
+        self.reader_client.get(self.index)
+        self.group.title = 'New title'
+        self.group.save()
+        self.assertContains(self.reader_client.get(self.index), 'New title')
+
+    def test_author_rename_rerenders_card(self):
+        """ Новое имя автора видно в его карточках, вход на сайт
+        карточки не сбрасывает """
+        self.reader_client.get(self.index)
+        author = User.objects.get(id=self.user.id)
+        author.first_name = 'Лев'
+        author.save()
+        self.assertContains(self.reader_client.get(self.index), 'Лев')
+        version = Post.objects.get(id=self.post.id).version
+        author.save(update_fields=['last_login'])
+        self.assertEqual(Post.objects.get(id=self.post.id).version, version)
+
+    def test_version_follows_written_fields(self):
+        """ Версия в памяти растёт, только если она пишется в базу """
+        self.post.save(update_fields=['text'])
+        self.assertEqual(
+            self.post.version, Post.objects.get(id=self.post.id).version)
+        self.post.save()
+        self.assertEqual(self.post.version, 2)
+        self.assertEqual(Post.objects.get(id=self.post.id).version, 2)
+
+    def test_cards_are_batched(self):
+        """ Карточки страницы читаются и пишутся в кэш одним запросом """
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) \
+                as get_many, \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) \
+                as set_many, \
+                mock.patch.object(cache, 'set', wraps=cache.set) as set_:
+            self.reader_client.get(self.index)
+        def card_calls(mocked):
+            calls = []
+            for call in mocked.call_args_list:
+                keys = call[0][0]
+                keys = [keys] if isinstance(keys, str) else list(keys)
+                if keys[0].startswith('posts:card:'):
+                    calls.append(keys)
+            return calls
+        self.assertEqual(card_calls(set_), [])
+        self.assertEqual([len(keys) for keys in card_calls(get_many)], [2])
+        self.assertEqual([len(keys) for keys in card_calls(set_many)], [2])
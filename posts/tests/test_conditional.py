@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Like, Post
+from posts.tests.base import PostsTestCase
+
+
+class ConditionalGetTest(PostsTestCase):
+    """ Ответ 304 для неизменившихся лент и страниц поста """
+
+    with_reader = True
+    with_group = True
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Post', author=self.user, group=self.group)
+        self.urls = (
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('profile', args=[self.user.username]),
+            reverse('post', args=[self.user.username, self.post.id]),
+        )
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def assertChanged(self, urls, change):
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        change()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_pages_are_not_rendered(self):
+        """ Неизменившаяся страница отдаётся как 304 без шаблонов """
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_not_modified_is_cheap(self):
+        """ Проверка ETag лент обходится без запросов постов, автора,
+        статистики и подписки """
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(2):
+                    # Сессия и пользователь
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_viewer_is_part_of_etag(self):
+        """ Разные зрители не получают чужую страницу """
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertNotEqual(Client().get(url)['ETag'], etag)
+
+    def test_changes_update_etag(self):
+        """ Новый пост меняет ETag лент, лайк, правка и комментарий -
+        ещё и страницы поста """
+        self.assertChanged(self.urls[:3], lambda: Post.objects.create(
+            text='New', author=self.user, group=self.group))
+        changes = (
+            lambda: Like.objects.create(post=self.post, user=self.reader),
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='!'),
+        )
+        for change in changes:
+            self.assertChanged(self.urls, change)
+
+    def test_comment_edit_updates_post_etag(self):
+        """ Правка комментария меняет страницу поста без счётчиков """
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='!')
+        comment.text = '?'
+        self.assertChanged(self.urls[3:], comment.save)
+
+    def test_follow_updates_profile_etag(self):
+        """ Подписка меняет кнопку и счётчики профилей обоих """
+        reader = reverse('profile', args=[self.reader.username])
+        self.assertChanged((self.urls[2], reader), lambda: (
+            Follow.objects.create(user=self.reader, author=self.user)))
@@ -0,0 +1,119 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Comment, Like, Post, User
+from posts.tests.base import PostsTestCase
+
+
+class PostCountersTest(PostsTestCase):
+    """ Счётчики лайков и комментариев в строке поста """
+
+    with_reader = True
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.post = Post.objects.create(
+            text='Post text',
+            author=self.user,
+            )
+        self.args = [self.user.username, self.post.id]
+
+    def counters(self):
+        self.post.refresh_from_db()
+        return self.post.likes_count, self.post.comments_count
+
+    def test_like_and_unlike_change_counter(self):
+        """ Лайк и его отмена меняют счётчик лайков """
+        self.client.get(reverse('post_like', args=self.args))
+        self.client.get(reverse('post_like', args=self.args))
+        self.assertEqual(self.counters(), (1, 0))
+        self.client.get(reverse('post_unlike', args=self.args))
+        self.client.get(reverse('post_unlike', args=self.args))
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_comment_add_and_delete_change_counter(self):
+        """ Добавление и удаление комментария меняют счётчик """
+        self.client.post(
+            reverse('add_comment', args=self.args), {'text': 'comment'})
+        self.assertEqual(self.counters(), (0, 1))
+        comment = Comment.objects.get()
+        self.client.get(
+            reverse('delete_comment', args=self.args + [comment.id]))
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_cascade_delete_changes_counters(self):
+        """ Каскадное удаление пользователя уменьшает счётчики """
+        guest = User.objects.create(username='Guest')
+        Like.objects.create(post=self.post, user=guest)
+        Comment.objects.create(post=self.post, author=guest, text='!')
+        self.assertEqual(self.counters(), (1, 1))
+        guest.delete()
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_repair_counters_command(self):
+        """ Команда repair_counters исправляет расхождения """
+        Like.objects.create(post=self.post, user=self.reader)
+        Post.objects.update(likes_count=7, comments_count=3)
+        out = StringIO()
+        call_command('repair_counters', chunk_size=1, stdout=out)
+        self.assertEqual(self.counters(), (1, 0))
+        self.assertIn('исправлено: 1', out.getvalue())
+
+
+class UserStatsTest(PostsTestCase):
+    """ Статистика автора в UserStats меняется вместе с постами, лайками
+    и подписками """
+
+    with_reader = True
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def stats(self, user):
+        response = self.reader_client.get(
+            reverse('profile', args=[user.username]))
+        stats = response.context['stats']
+        return (stats.followers_count, stats.following_count,
+                stats.posts_count, stats.likes_count)
+
+    def test_stats_follow_views(self):
+        """ Подписка и отписка меняют статистику обоих пользователей """
+        self.assertEqual(self.stats(self.user), (0, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0, 0))
+        self.reader_client.get(
+            reverse('profile_follow', args=[self.user.username]))
+        self.assertEqual(self.stats(self.user), (1, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 1, 0, 0))
+        self.reader_client.get(
+            reverse('profile_unfollow', args=[self.user.username]))
+        self.assertEqual(self.stats(self.user), (0, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0, 0))
+
+    def test_stats_posts_and_likes(self):
+        """ Посты и лайки меняют статистику автора """
+        self.assertEqual(self.stats(self.user), (0, 0, 0, 0))
+        self.author_client.post(reverse('new_post'), {'text': 'Post'})
+        post = Post.objects.get()
+        self.reader_client.get(
+            reverse('post_like', args=[self.user.username, post.id]))
+        self.assertEqual(self.stats(self.user), (0, 0, 1, 1))
+        self.author_client.get(
+            reverse('delete_post', args=[self.user.username, post.id]))
+        self.assertEqual(self.stats(self.user), (0, 0, 0, 0))
+
+    def test_stats_are_collected_on_first_read(self):
+        """ Статистика без строки в базе считается по таблицам """
+        post = Post.objects.create(text='Post', author=self.user)
+        Like.objects.create(post=post, user=self.reader)
+        self.assertEqual(self.stats(self.user), (0, 0, 1, 1))
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+
+from django.test import Client
+from django.urls import reverse
+
+from posts.export import COLUMNS
+from posts.models import Comment, Like, Post
+from posts.tests.base import PostsTestCase
+
+
+class ExportTest(PostsTestCase):
+    """ Выгрузка постов, комментариев и лайков пользователя """
+
+    with_reader = True
+    with_group = True
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(
+            text='Пост, с "кавычками"', author=self.user, group=self.group)
+        other_post = Post.objects.create(text='Other', author=self.reader)
+        self.comment = Comment.objects.create(
+            post=other_post, author=self.user, text='Комментарий')
+        self.like = Like.objects.create(post=other_post, user=self.user)
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        self.url = reverse('export', args=[self.user.username])
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        """ NDJSON содержит только записи пользователя """
+        response, content = self.download()
+        self.assertIn('Author.ndjson', response['Content-Disposition'])
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(record['type'], record['id']) for record in records],
+            [('post', self.post.id), ('comment', self.comment.id),
+             ('like', self.like.id)])
+        self.assertEqual(records[0]['group'], 'group')
+        self.assertEqual(records[0]['text'], self.post.text)
+        self.assertIsNone(records[0]['image'])
+        self.assertEqual(records[2]['post'], self.like.post_id)
+
+    def test_csv(self):
+        """ CSV с общими колонками экранирует текст """
+        _, content = self.download(format='csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(list(rows[0]), list(COLUMNS))
+        self.assertEqual(rows[0]['text'], self.post.text)
+        self.assertEqual(
+            [row['type'] for row in rows], ['post', 'comment', 'like'])
+
+    def test_header_is_sent_first(self):
+        """ Заголовок CSV уходит первым куском, не дожидаясь записей """
+        response = self.client.get(self.url, {'format': 'csv'})
+        header = next(iter(response.streaming_content)).decode()
+        self.assertEqual(header.strip(), ','.join(COLUMNS))
+
+    def test_only_own_export(self):
+        """ Чужую выгрузку получить нельзя, формат проверяется """
+        response = self.client.get(
+            reverse('export', args=[self.reader.username]))
+        self.assertRedirects(
+            response, reverse('profile', args=[self.reader.username]))
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,137 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import FeedEntry, Follow, Post, User, UserStats
+from posts.settings import POSTS_PER_PAGE
+from posts.tests.base import PostsTestCase
+
+
+class FollowFeedTest(PostsTestCase):
+    """ Лента подписок, разложенная по подписчикам при публикации """
+
+    with_reader = True
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """ Новый пост попадает в ленту подписчика """
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.author_client.post(reverse('new_post'), {'text': 'Новый пост'})
+        post = Post.objects.get()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post])
+
+    def test_follow_fills_feed_with_old_posts(self):
+        """ После подписки в ленте появляются старые посты автора """
+        posts = [
+            Post.objects.create(text=f'Post {number}', author=self.user)
+            for number in range(3)
+        ]
+        self.reader_client.get(
+            reverse('profile_follow', args=[self.user.username]))
+        self.assertEqual(self.feed(), posts[::-1])
+
+    def test_unfollow_and_delete_clear_feed(self):
+        """ Отписка и удаление поста убирают записи из ленты """
+        Follow.objects.create(user=self.reader, author=self.user)
+        post = Post.objects.create(text='Post', author=self.user)
+        self.author_client.get(
+            reverse('delete_post', args=[self.user.username, post.id]))
+        self.assertFalse(FeedEntry.objects.exists())
+        Post.objects.create(text='Post', author=self.user)
+        self.reader_client.get(
+            reverse('profile_unfollow', args=[self.user.username]))
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed(), [])
+
+
+class HybridFeedTest(PostsTestCase):
+    """ Лента подписок с популярными авторами, посты которых
+    подтягиваются при чтении """
+
+    with_reader = True
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.star = User.objects.create(
+            username='Star'
+            )
+        cls.fan = User.objects.create(
+            username='Fan'
+            )
+
+    def setUp(self):
+        super().setUp()
+        # Режим автора запоминается при подписке, поэтому пороги
+        # подменяются и для подписок из setUp
+        for name, value in (('FEED_PULL_THRESHOLD', 2),
+                            ('FEED_PUSH_THRESHOLD', 2)):
+            patcher = mock.patch(f'posts.feed.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.user)
+
+    def test_popular_author_posts_are_pulled(self):
+        """ Посты популярного автора не раскладываются, но есть в ленте """
+        posts = []
+        for number in range(POSTS_PER_PAGE + 2):
+            author = self.star if number % 2 else self.user
+            posts.append(Post.objects.create(text='Post', author=author))
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.star).exists())
+        seen = []
+        response = self.reader_client.get(reverse('follow_index'))
+        page = response.context['page']
+        seen.extend(page)
+        self.assertIsNotNone(page.next_cursor)
+        response = self.reader_client.get(
+            reverse('follow_index'), {'cursor': page.next_cursor})
+        seen.extend(response.context['page'])
+        self.assertEqual(seen, posts[::-1])
+
+    def test_author_becoming_unpopular_is_pushed(self):
+        """ Когда автор перестаёт быть популярным, его посты
+        раскладываются по лентам оставшихся подписчиков """
+        post = Post.objects.create(text='Post', author=self.star)
+        Follow.objects.filter(user=self.fan).delete()
+        # Отписка только убирает записи, раскладывает фоновая команда
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        call_command('push_feeds', stdout=StringIO())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertFalse(UserStats.objects.get(user=self.star).feed_pulled)
+        new_post = Post.objects.create(text='New', author=self.star)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=new_post).exists())
+
+    @mock.patch('posts.feed.FEED_PUSH_THRESHOLD', 1)
+    def test_author_near_threshold_keeps_mode(self):
+        """ Между порогами автор не переключается ни в одну сторону """
+        post = Post.objects.create(text='Post', author=self.star)
+        Follow.objects.filter(user=self.fan).delete()
+        call_command('push_feeds', stdout=StringIO())
+        self.assertTrue(UserStats.objects.get(user=self.star).feed_pulled)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        Follow.objects.create(user=self.fan, author=self.star)
+        self.assertTrue(UserStats.objects.get(user=self.star).feed_pulled)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
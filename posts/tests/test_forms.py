@@ -39,12 +39,14 @@ class PostCreateFormTest(TestCase):
         cls.group = Group.objects.create(
             title='Tittle',
             slug='Slug',
-            description='Description'
+            description='Description',
+            author=cls.user,
             )
         cls.group_edit = Group.objects.create(
             title='Edit group',
             slug='Edit_slug',
-            description='Another description'
+            description='Another description',
+            author=cls.user,
             )
 
     def setUp(self):
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.group_activity import refresh_group_activity
+from posts.models import Comment, Group, GroupActivity, Post
+from posts.settings import GROUP_ACTIVITY_DAYS, POSTS_PER_PAGE
+from posts.tests.base import PostsTestCase
+
+
+class GroupActivityTest(PostsTestCase):
+    """ Счётчики групп и список групп по активности """
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.quiet = self.create_group('quiet')
+        self.busy = self.create_group('busy')
+
+    def create_group(self, slug):
+        return Group.objects.create(
+            title=slug.title(),
+            slug=slug,
+            description='Description',
+            author=self.user,
+            )
+
+    def groups_page(self):
+        response = self.client.get(reverse('groups_view'))
+        return list(response.context['page'])
+
+    def test_groups_ordered_by_activity(self):
+        """ Группа с новыми постами и комментариями выше в списке """
+        post = Post.objects.create(
+            text='Post', author=self.user, group=self.busy)
+        Comment.objects.create(post=post, author=self.user, text='!')
+        Post.objects.create(text='Post', author=self.user, group=self.quiet)
+        groups = self.groups_page()
+        self.assertEqual(groups, [self.busy, self.quiet])
+        self.assertEqual(
+            [(group.posts_count, group.activity) for group in groups],
+            [(1, 2), (1, 1)])
+
+    def test_post_moved_to_other_group(self):
+        """ Перенос поста и удаление меняют счётчики групп """
+        post = Post.objects.create(
+            text='Post', author=self.user, group=self.quiet)
+        post.group = self.busy
+        post.save()
+        self.quiet.refresh_from_db()
+        self.busy.refresh_from_db()
+        self.assertEqual((self.quiet.posts_count, self.quiet.activity), (0, 0))
+        self.assertEqual((self.busy.posts_count, self.busy.activity), (1, 1))
+        post.delete()
+        self.busy.refresh_from_db()
+        self.assertEqual((self.busy.posts_count, self.busy.activity), (0, 0))
+
+    def test_refresh_drops_old_days(self):
+        """ Дни вне окна удаляются, активность пересчитывается """
+        Post.objects.create(text='Post', author=self.user, group=self.busy)
+        refresh_group_activity()
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.activity, 1)
+        later = timezone.now() + timedelta(days=GROUP_ACTIVITY_DAYS)
+        refresh_group_activity(later)
+        self.busy.refresh_from_db()
+        self.assertEqual((self.busy.posts_count, self.busy.activity), (1, 0))
+        self.assertFalse(GroupActivity.objects.exists())
+
+    def test_paging_keeps_order_of_first_page(self):
+        """ Рост активности группы во время листания не пропускает
+        и не повторяет группы """
+        for number in range(POSTS_PER_PAGE):
+            self.create_group(f'group{number}')
+        response = self.client.get(reverse('groups_view'))
+        first = list(response.context['page'])
+        Post.objects.create(text='Post', author=self.user, group=self.quiet)
+        second = list(self.client.get(reverse('groups_view'), {
+            'snapshot': response.context['snapshot'], 'page': 2,
+        }).context['page'])
+        self.assertEqual(len(first), POSTS_PER_PAGE)
+        self.assertCountEqual(first + second, Group.objects.all())
+
+    def test_groups_page_queries_do_not_depend_on_groups_amount(self):
+        """ Число запросов страницы групп не зависит от их количества """
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.groups_page()
+            return len(queries)
+        expected = count_queries()
+        for number in range(5):
+            self.create_group(f'group{number}')
+        self.assertEqual(count_queries(), expected)
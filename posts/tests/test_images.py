@@ -0,0 +1,234 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from posts.caching import (
+    INDEX_PAGE, PROFILE_PAGE, get_generation, page_generations,
+)
+from posts.images import (
+    CARD_GEOMETRY, CARD_OPTIONS, PageImages, _pictures, _thumbnails,
+    delete_image_files, enqueue_thumbnails, generate_thumbnails,
+    generate_variants, lookup_backend,
+)
+from posts.models import Post, StoredImage
+from posts.settings import IMAGE_VARIANT_FORMATS
+from posts.tests.base import PostsTestCase
+from posts.tests.test_views import SMALL_GIF
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailTest(PostsTestCase):
+    """ Превью и варианты картинок, создаваемые в фоне """
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+        _pictures.entries.clear()
+        _thumbnails.entries.clear()
+        self.post = self.create_post()
+
+    def create_post(self, padding=b''):
+        # Разное содержимое - разные файлы, одинаковое хранится один раз
+        return Post.objects.create(
+            text='Post',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF + padding, 'image/gif'),
+            )
+
+    def test_card_does_not_wait_for_thumbnail(self):
+        """ Без готового превью карточка показывает исходную картинку """
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(lookup_backend.lookup(
+            self.post.image, '960x339', crop='center', upscale=True))
+
+    def test_generated_thumbnail_is_shown(self):
+        """ После фоновой генерации карточка показывает варианты """
+        generate_thumbnails(self.post.image.name)
+        self.assertIsNotNone(lookup_backend.lookup(
+            self.post.image, '960x339', crop='center', upscale=True))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 2)
+        variants = StoredImage.objects.get(
+            name=self.post.image.name).variant_list()
+        self.assertEqual(
+            {variant['format'] for variant in variants}, {'webp', 'jpeg'})
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"')
+        for variant in variants:
+            self.assertContains(response, f'{variant["width"]}w')
+            self.assertContains(response, variant['name'])
+
+    def test_thumbnails_reset_only_feeds_with_post(self):
+        """ Готовые превью сбрасывают ленты своих постов, но не чужие """
+        index = page_generations(INDEX_PAGE)
+        profile = page_generations(PROFILE_PAGE, self.user.username)
+        other = page_generations(PROFILE_PAGE, 'Other')
+        shared = get_generation()
+        generate_thumbnails(self.post.image.name)
+        self.assertNotEqual(page_generations(INDEX_PAGE), index)
+        self.assertNotEqual(
+            page_generations(PROFILE_PAGE, self.user.username), profile)
+        self.assertEqual(page_generations(PROFILE_PAGE, 'Other'), other)
+        self.assertEqual(get_generation(), shared)
+
+    def test_variants_are_not_upscaled(self):
+        """ Для маленькой картинки не создаются растянутые варианты """
+        variants = generate_variants(self.post.image.name)
+        self.assertEqual(len(variants), len(IMAGE_VARIANT_FORMATS))
+        self.assertTrue(all(variant['width'] <= 2 for variant in variants))
+
+    def test_lookup_many_matches_lookup(self):
+        """ Пакетный поиск превью находит то же, что и поштучный """
+        other = self.create_post(b'\x00')
+        generate_thumbnails(self.post.image.name)
+        cache.clear()
+        found = lookup_backend.lookup_many(
+            [self.post.image, other.image], CARD_GEOMETRY, **CARD_OPTIONS)
+        self.assertEqual(
+            found[self.post.image.name].name,
+            lookup_backend.lookup(
+                self.post.image, CARD_GEOMETRY, **CARD_OPTIONS).name)
+        self.assertIsNone(found[other.image.name])
+
+    def test_thumbnail_lookup_is_memoized(self):
+        """ Превью картинки без вариантов ищется в sorl один раз
+        на версию поста """
+        get_thumbnail(self.post.image.name, CARD_GEOMETRY, **CARD_OPTIONS)
+        with mock.patch.object(
+                lookup_backend, 'lookup_many',
+                wraps=lookup_backend.lookup_many) as lookup_many:
+            for _ in range(2):
+                picture = PageImages([self.post]).picture(self.post.image)
+                self.assertIsNotNone(picture['thumbnail'])
+            self.post.version += 1
+            PageImages([self.post]).picture(self.post.image)
+        self.assertEqual(lookup_many.call_count, 2)
+
+    def test_page_queries_do_not_depend_on_images_amount(self):
+        """ Картинки страницы ищутся пачкой: число запросов
+        не зависит от числа карточек с картинками """
+        def count_queries():
+            cache.clear()
+            _pictures.entries.clear()
+            _thumbnails.entries.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('index'))
+            return len(queries)
+        generate_thumbnails(self.post.image.name)
+        self.create_post(b'\x00')
+        expected = count_queries()
+        for number in range(1, 4):
+            generate_thumbnails(
+                self.create_post(bytes(number) + b'\x01').image.name)
+            self.create_post(bytes(number) + b'\x02')
+        self.assertEqual(count_queries(), expected)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageReferencesTest(PostsTestCase):
+    """ Счётчик ссылок постов на общий файл картинки """
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def create_post(self, filename='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Post',
+            author=self.user,
+            image=SimpleUploadedFile(filename, content, 'image/gif'),
+            )
+
+    def references(self, name):
+        return StoredImage.objects.get(name=name).references
+
+    def test_same_content_shares_file(self):
+        """ Одинаковые загрузки с разными именами хранятся одним файлом """
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.endswith('.gif'))
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.path)])
+        self.assertEqual(self.references(first.image.name), 2)
+
+    def test_thumbnails_are_shared(self):
+        """ Превью готовой картинки не создаются повторно """
+        first = self.create_post()
+        generate_thumbnails(first.image.name)
+        second = self.create_post()
+        with self.assertNumQueries(1):
+            enqueue_thumbnails(second.image)
+
+    def test_delete_keeps_shared_file(self):
+        """ Удаление поста не трогает файл, пока на него есть ссылки """
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        self.client.get(reverse(
+            'delete_post', args=[self.user.username, first.id]))
+        self.assertFalse(Post.objects.filter(pk=first.id).exists())
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(second.image.storage.exists(name))
+        self.client.get(reverse(
+            'delete_post', args=[self.user.username, second.id]))
+        self.assertEqual(self.references(name), 0)
+        delete_image_files(name)
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+        self.assertFalse(second.image.storage.exists(name))
+
+    def test_upload_before_delete_keeps_file(self):
+        """ Файл, снова загруженный до удаления, не удаляется """
+        first = self.create_post()
+        name = first.image.name
+        first.delete()
+        second = self.create_post()
+        delete_image_files(name)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(second.image.storage.exists(name))
+
+    def test_saved_file_is_referenced_before_post(self):
+        """ Сохранение уже лежащего файла берёт ссылку до записи поста,
+        и удаление файла без ссылок его не трогает """
+        first = self.create_post()
+        name = first.image.name
+        storage = first.image.storage
+        first.delete()
+        saved = storage.save(
+            'posts/again.gif',
+            SimpleUploadedFile('again.gif', SMALL_GIF, 'image/gif'))
+        delete_image_files(name)
+        self.assertEqual(saved, name)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(storage.exists(name))
+
+    def test_same_image_upload_keeps_one_reference(self):
+        """ Повторная загрузка той же картинки в пост не добавляет ссылку """
+        post = self.create_post()
+        post.image = SimpleUploadedFile('again.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(self.references(post.image.name), 1)
+
+    def test_changed_image_releases_previous(self):
+        """ Смена картинки переносит ссылку на новый файл """
+        post = self.create_post()
+        previous = post.image.name
+        post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF + b'\x00', 'image/gif')
+        post.save()
+        self.assertEqual(self.references(previous), 0)
+        self.assertEqual(self.references(post.image.name), 1)
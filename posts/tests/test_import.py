@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, GroupActivity, Like, Post,
+    StoredImage, User, UserStats,
+)
+from posts.search import search_hits
+
+RECORDS = [
+    {'type': 'user', 'id': 10, 'username': 'Author', 'first_name': 'Лев'},
+    {'type': 'user', 'id': 11, 'username': 'Reader'},
+    {'type': 'group', 'id': 20, 'title': 'Группа', 'slug': 'group',
+     'author': 10},
+    {'type': 'post', 'id': 30, 'text': 'Старый пост', 'author': 10,
+     'group': 20, 'pub_date': '2015-03-01T10:00:00'},
+    {'type': 'post', 'id': 31, 'text': 'Новый пост', 'author': 10,
+     'pub_date': '2016-03-01T10:00:00+00:00'},
+    {'type': 'comment', 'id': 40, 'post': 30, 'author': 11,
+     'text': 'Комментарий', 'created': '2015-03-02T10:00:00'},
+    {'type': 'follow', 'user': 11, 'author': 10},
+    {'type': 'like', 'post': 30, 'user': 11},
+    {'type': 'like', 'post': 30, 'user': 10},
+]
+
+
+class ImportTest(TestCase):
+    """ Перенос выгрузки JSONL командой import_yatube в базу, где уже
+    есть пользователь с одним из логинов выгрузки """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='Reader'
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dump.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def write(self, records, mode='w'):
+        with open(self.path, mode, encoding='utf-8') as dump:
+            for record in records:
+                dump.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def run_import(self, **options):
+        out = StringIO()
+        call_command('import_yatube', self.path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_maps_references(self):
+        """ Ссылки на старые id ведут на новые записи, существующий
+        логин связывается с существующим пользователем """
+        self.write(RECORDS)
+        self.run_import(batch_size=3)
+        author = User.objects.get(username='Author')
+        self.assertEqual(author.first_name, 'Лев')
+        self.assertEqual(User.objects.filter(username='Reader').count(), 1)
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.author, author)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.pub_date.year, 2015)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.author, self.reader)
+        self.assertEqual(comment.created.year, 2015)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=author).exists())
+
+    def test_import_rebuilds_derived_data(self):
+        """ Счётчики, статистика и ленты подписок пересчитаны """
+        self.write(RECORDS)
+        self.run_import()
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.likes_count, 2)
+        self.assertEqual(post.comments_count, 1)
+        author = User.objects.get(username='Author')
+        self.assertEqual(UserStats.for_user(author.pk).posts_count, 2)
+        self.assertEqual(UserStats.for_user(author.pk).followers_count, 1)
+        self.assertEqual(Group.objects.get(slug='group').posts_count, 1)
+        self.assertFalse(GroupActivity.objects.exists())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_import_skips_unresolved(self):
+        """ Записи со ссылками на неизвестные id пропускаются """
+        self.write(RECORDS[:2] + [
+            {'type': 'post', 'id': 32, 'text': 'Без автора', 'author': 99},
+            {'type': 'comment', 'id': 41, 'post': 99, 'author': 10,
+             'text': 'Без поста'},
+            {'type': 'like', 'post': 99, 'user': 10},
+            {'type': 'unknown', 'id': 1},
+        ])
+        output = self.run_import()
+        self.assertIn('skipped: 4', output)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Like.objects.exists())
+
+    def test_import_resumes(self):
+        """ Повторный запуск продолжает с контрольной точки, ссылки на
+        записи первого запуска работают, незавершённая пачка повторяется """
+        self.write(RECORDS[:4])
+        self.run_import(batch_size=2)
+        checkpoint = f'{self.path}.checkpoint'
+        # Точка пачки, транзакция которой не дошла до коммита
+        with open(checkpoint, 'a', encoding='utf-8') as file_:
+            file_.write(json.dumps({
+                'offset': 6, 'ids': {'post': [[31, 10 ** 6]]},
+                'counts': {'post': 1}, 'check': ['post', 10 ** 6]}) + '\n')
+        self.write(RECORDS[4:], mode='a')
+        output = self.run_import(batch_size=2)
+        self.assertIn('Продолжение со строки 5', output)
+        self.assertEqual(User.objects.filter(username='Author').count(), 1)
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.likes_count, 2)
+        self.assertEqual(post.comments_count, 1)
+
+    def test_import_rerun_is_safe(self):
+        """ Повторный запуск после полной загрузки ничего не меняет, а
+        пересчёт, прерванный сбоем, можно повторить """
+        records = RECORDS + [
+            {'type': 'post', 'id': 32, 'text': 'С картинкой', 'author': 10,
+             'image': 'posts/ab/same.jpg'},
+            {'type': 'post', 'id': 33, 'text': 'С той же', 'author': 11,
+             'image': 'posts/ab/same.jpg'},
+        ]
+        self.write(records)
+        self.run_import()
+        output = self.run_import()
+        self.assertIn('уже загружен', output)
+        checkpoint = f'{self.path}.checkpoint'
+        with open(checkpoint, encoding='utf-8') as file_:
+            entries = file_.readlines()
+        # Сбой посреди пересчёта: отметки о его завершении нет
+        with open(checkpoint, 'w', encoding='utf-8') as file_:
+            file_.writelines(entries[:-1])
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(
+            StoredImage.objects.get(name='posts/ab/same.jpg').references, 2)
+        self.assertEqual(len(search_hits('картинкой')), 1)
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.likes_count, 2)
@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.settings import POSTS_PER_PAGE
+from posts.tests.base import PostsTestCase
+
+
+class CursorPaginatorTest(PostsTestCase):
+    """ Курсоры главной страницы на нескольких страницах постов """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Post.objects.bulk_create(
+            Post(text=f'Post {number}', author=cls.user)
+            for number in range(POSTS_PER_PAGE * 2 + 3)
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.guest_client = Client()
+        self.index = reverse('index')
+
+    def test_pages_follow_each_other(self):
+        """ Курсоры ведут по ленте без пропусков и повторов """
+        seen = []
+        page = self.guest_client.get(self.index).context['page']
+        seen.extend(page.object_list)
+        self.assertIsNone(page.previous_cursor)
+        while page.next_cursor:
+            response = self.guest_client.get(
+                self.index, {'cursor': page.next_cursor})
+            page = response.context['page']
+            seen.extend(page.object_list)
+        self.assertEqual(seen, list(Post.objects.order_by('-pub_date', '-id')))
+
+    def test_previous_cursor_returns_previous_page(self):
+        """ Курсор назад возвращает ту же страницу, что была раньше """
+        first = self.guest_client.get(self.index).context['page']
+        second = self.guest_client.get(
+            self.index, {'cursor': first.next_cursor}).context['page']
+        back = self.guest_client.get(
+            self.index, {'cursor': second.previous_cursor}).context['page']
+        self.assertEqual(back.object_list, first.object_list)
+        self.assertIsNone(back.previous_cursor)
+
+    def test_page_navigation_follows_cursors(self):
+        """ has_next и has_previous отвечают по курсорам без COUNT """
+        first = self.guest_client.get(self.index).context['page']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(first.has_next())
+            self.assertFalse(first.has_previous())
+            self.assertTrue(first.has_other_pages())
+        self.assertEqual(len(queries), 0)
+        second = self.guest_client.get(
+            self.index, {'cursor': first.next_cursor}).context['page']
+        self.assertTrue(second.has_next())
+        self.assertTrue(second.has_previous())
+        last = self.guest_client.get(
+            self.index, {'cursor': second.next_cursor}).context['page']
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+
+    def test_broken_cursor_shows_first_page(self):
+        """ Испорченный курсор открывает первую страницу """
+        first = self.guest_client.get(self.index).context['page']
+        page = self.guest_client.get(
+            self.index, {'cursor': 'garbage'}).context['page']
+        self.assertEqual(page.object_list, first.object_list)
+
+    def test_feed_does_not_count_posts(self):
+        """ Страница ленты не выполняет COUNT по таблице постов """
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(self.index)
+        for query in queries.captured_queries:
+            self.assertNotIn('__count', query['sql'])
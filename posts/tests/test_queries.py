@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Like, Post
+from posts.settings import POSTS_PER_PAGE
+from posts.tests.base import PostsTestCase
+
+
+class FeedQueriesTest(PostsTestCase):
+    """ Число запросов лент и данные карточек из одного запроса """
+
+    with_reader = True
+    with_group = True
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('index'),
+            reverse('profile', args=[self.user.username]),
+            reverse('group', args=[self.group.slug]),
+            reverse('follow_index'),
+        )
+
+    def add_posts(self, amount):
+        for number in range(amount):
+            post = Post.objects.create(
+                text=f'Post {number}',
+                author=self.user,
+                group=self.group,
+                )
+            Like.objects.create(post=post, user=self.reader)
+            Comment.objects.create(post=post, author=self.reader, text='!')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_posts_amount(self):
+        """ Число запросов ленты не зависит от количества постов """
+        self.add_posts(1)
+        single = {url: self.count_queries(url) for url in self.urls}
+        self.add_posts(POSTS_PER_PAGE)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), single[url])
+
+    def test_feed_shows_counters(self):
+        """ Карточка поста показывает счётчики лайков и комментариев """
+        self.add_posts(1)
+        page = self.client.get(reverse('index')).context['page']
+        self.assertEqual(page[0].likes_count, 1)
+        self.assertEqual(page[0].comments_count, 1)
+
+    def test_feed_shows_liked_posts(self):
+        """ Лайкнутые читателем посты отмечены на странице ленты """
+        self.add_posts(2)
+        Post.objects.create(text='Not liked', author=self.user)
+        liked = set(Like.objects.values_list('post_id', flat=True))
+        for url in self.urls:
+            with self.subTest(url=url):
+                cache.clear()
+                response = self.client.get(url)
+                self.assertEqual(response.context['liked_posts'], liked)
+                self.assertContains(response, 'bi-heart-fill', count=2)
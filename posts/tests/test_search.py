@@ -0,0 +1,102 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginator import FORWARD
+from posts.search import InvertedIndex, fts5_enabled, search_hits
+from posts.settings import POSTS_PER_PAGE
+from posts.tests.base import PostsTestCase
+
+
+class SearchViewTest(PostsTestCase):
+    """ Страница поиска: порядок по релевантности, правки постов и курсоры """
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+    def search(self, query, cursor=None):
+        params = {'q': query}
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(reverse('search'), params).context['page']
+
+    def test_search_ranks_posts(self):
+        """ Пост с большим числом совпадений выше в выдаче """
+        rare = Post.objects.create(text='Кот спит', author=self.user)
+        often = Post.objects.create(
+            text='Кот, кот и ещё раз кот', author=self.user)
+        Post.objects.create(text='Собака', author=self.user)
+        self.assertEqual(list(self.search('кот')), [often, rare])
+        self.assertEqual(list(self.search('спит КОТ')), [rare])
+        self.assertEqual(list(self.search('"*')), [])
+
+    def test_search_index_follows_changes(self):
+        """ Изменённый и удалённый посты сразу видны в поиске """
+        post = Post.objects.create(text='Старый текст', author=self.user)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(list(self.search('старый')), [])
+        self.assertEqual(list(self.search('новый')), [post])
+        post.delete()
+        self.assertEqual(list(self.search('новый')), [])
+
+    def test_search_cursor_pagination(self):
+        """ Курсор проходит все результаты без повторов """
+        posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.user)
+            for number in range(POSTS_PER_PAGE + 3)
+        ]
+        page = self.search('пост')
+        seen = list(page)
+        self.assertIsNotNone(page.next_cursor)
+        page = self.search('пост', page.next_cursor)
+        seen.extend(page)
+        self.assertIsNone(page.next_cursor)
+        self.assertEqual(sorted(seen, key=lambda post: post.id), posts)
+        previous = self.search('пост', page.previous_cursor)
+        self.assertEqual(len(previous), POSTS_PER_PAGE)
+
+    def test_fts5_is_used_on_sqlite(self):
+        """ На sqlite с FTS5 поиск идёт по виртуальной таблице """
+        Post.objects.create(text='Полнотекстовый', author=self.user)
+        self.assertTrue(fts5_enabled())
+        self.assertEqual(len(search_hits('полнотекстовый')), 1)
+
+
+class InvertedIndexTest(TestCase):
+    """ Индекс в памяти для баз без FTS5 """
+
+    def setUp(self):
+        super().setUp()
+        self.index = InvertedIndex()
+        self.index.build([
+            (1, 'Кот спит'),
+            (2, 'Кот, кот и ещё раз кот'),
+            (3, 'Собака и кот'),
+        ])
+
+    def ids(self, query, cursor=None, limit=10):
+        return [hit.id for hit in self.index.search(
+            query.split(), cursor, limit)]
+
+    def test_search_ranks_and_intersects(self):
+        """ Все слова запроса обязательны, ранжирование по BM25 """
+        self.assertEqual(self.ids('кот')[0], 2)
+        self.assertEqual(set(self.ids('кот')), {1, 2, 3})
+        self.assertEqual(set(self.ids('кот и')), {2, 3})
+        self.assertEqual(self.ids('лиса'), [])
+
+    def test_add_and_remove_update_postings(self):
+        """ Обновление и удаление поста меняют индекс """
+        self.index.add(1, 'Лиса')
+        self.index.remove(3)
+        self.assertEqual(self.ids('кот'), [2])
+        self.assertEqual(self.ids('лиса'), [1])
+        self.assertNotIn('собака', self.index.postings)
+
+    def test_cursor(self):
+        """ Следующая страница начинается после последнего результата """
+        first = self.index.search(['кот'], None, 1)[0]
+        rest = self.ids('кот', (FORWARD, list(first)))
+        self.assertEqual([first.id] + rest, self.ids('кот'))
@@ -0,0 +1,29 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Group, Like, Post, User
+
+
+class SeedBenchTest(TestCase):
+    """ Данные для нагрузочного теста из команды seed_bench """
+
+    def test_seed_bench(self):
+        """ Данные созданы, популярность авторов неравномерна """
+        call_command(
+            'seed_bench', users=50, groups=5, posts=500, comments=200,
+            follows=200, likes=500, batch_size=100, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 500)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(0 < Follow.objects.count() <= 200)
+        self.assertTrue(0 < Like.objects.count() <= 500)
+        self.assertTrue(FeedEntry.objects.exists())
+        counts = sorted(Post.objects.order_by().values('author').annotate(
+            total=Count('pk')).values_list('total', flat=True))
+        self.assertGreater(counts[-1], 5 * counts[len(counts) // 2])
+        post = Post.objects.order_by('-likes_count').first()
+        self.assertEqual(post.likes_count, post.likes.count())
@@ -1,5 +1,6 @@
 from django.contrib.flatpages.models import FlatPage
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
@@ -22,12 +23,14 @@ class TestSettings(TestCase):
         cls.group = Group.objects.create(
             title='Tittle',
             slug='Slug',
-            description='Description'
+            description='Description',
+            author=cls.user,
             )
         cls.group_edit = Group.objects.create(
             title='Edit group',
             slug='Edit_slug',
-            description='Another description'
+            description='Another description',
+            author=cls.user,
             )
         cls.post = Post.objects.create(
             text='Post text',
@@ -52,6 +55,8 @@ class TestSettings(TestCase):
 
     def setUp(self):
         super().setUp()
+        # Откат транзакции теста не сдвигает поколения кэша
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -0,0 +1,155 @@
+from xml.etree import ElementTree
+
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+from posts.tests.base import PostsTestCase
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class SyndicationTest(PostsTestCase):
+    """ Ленты RSS и Atom сайта, авторов и групп """
+
+    with_reader = True
+    with_group = True
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.filter(pk=cls.user.pk).update(
+            first_name='Лев', last_name='Толстой')
+        cls.user.refresh_from_db()
+        cls.other_group = Group.objects.create(
+            title='Other group',
+            slug='other-group',
+            description='Description',
+            author=cls.user,
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост номер {number}', author=self.user,
+                group=self.group)
+            for number in range(3)
+        ]
+        self.atom_urls = (
+            reverse('site_feed', args=['atom']),
+            reverse('profile_feed', args=[self.user.username, 'atom']),
+            reverse('group_feed', args=[self.group.slug, 'atom']),
+        )
+
+    def read(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def test_atom_feeds(self):
+        """ Ленты Atom содержат последние посты, новые сверху """
+        for url in self.atom_urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response['Content-Type'],
+                    'application/atom+xml; charset=utf-8')
+                root = ElementTree.fromstring(self.read(response))
+                entries = root.findall(f'{ATOM}entry')
+                self.assertEqual(
+                    [entry.find(f'{ATOM}title').text for entry in entries],
+                    [post.text for post in reversed(self.posts)])
+                self.assertEqual(
+                    entries[0].find(f'{ATOM}author/{ATOM}name').text,
+                    'Лев Толстой')
+
+    def test_rss_feed(self):
+        """ Лента RSS собирается из тех же записей """
+        response = self.client.get(reverse('site_feed', args=['rss']))
+        channel = ElementTree.fromstring(self.read(response)).find('channel')
+        self.assertEqual(len(channel.findall('item')), len(self.posts))
+        self.assertEqual(
+            channel.find('item/link').text,
+            'http://testserver' + reverse(
+                'post', args=[self.user.username, self.posts[-1].id]))
+
+    def test_empty_feed_and_unknown_format(self):
+        """ Пустая лента корректна, неизвестный формат - 404 """
+        response = self.client.get(
+            reverse('group_feed', args=[self.other_group.slug, 'atom']))
+        root = ElementTree.fromstring(self.read(response))
+        self.assertEqual(root.findall(f'{ATOM}entry'), [])
+        response = self.client.get('/feed/json/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_route_does_not_shadow_posts(self):
+        """ Адрес /feed/<id>/ пользователя feed ведёт на его пост """
+        user = User.objects.create(username='feed')
+        post = Post.objects.create(text='Пост пользователя feed', author=user)
+        url = reverse('post', args=[user.username, post.id])
+        self.assertEqual(url, f'/feed/{post.id}/')
+        self.assertContains(self.client.get(url), 'Пост пользователя feed')
+
+    def test_feed_is_streamed_then_cached(self):
+        """ Новая лента пишется потоком, повтор берётся из кэша """
+        url = self.atom_urls[0]
+        first = self.client.get(url)
+        self.assertTrue(first.streaming)
+        content = self.read(first)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertFalse(second.streaming)
+        self.assertEqual(second.content, content)
+
+    def test_conditional_get(self):
+        """ Неизменившаяся лента отвечает 304 """
+        for url in self.atom_urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_renamed_author_feed(self):
+        """ Переименование автора сбрасывает ленту по старому логину """
+        url = self.atom_urls[1]
+        etag = self.client.get(url)['ETag']
+        self.user.username = 'Renamed'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        self.user.username = 'Author'
+        self.user.save()
+
+    def test_post_save_invalidates_only_its_feeds(self):
+        """ Пост сбрасывает ленты сайта, автора и группы, но не чужие """
+        other_urls = (
+            reverse('profile_feed', args=[self.reader.username, 'atom']),
+            reverse('group_feed', args=[self.other_group.slug, 'atom']),
+        )
+        etags = {url: self.client.get(url)['ETag']
+                 for url in self.atom_urls + other_urls}
+        post = self.posts[0]
+        post.text = 'Исправленный пост'
+        post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                expected = 304 if url in other_urls else 200
+                self.assertEqual(response.status_code, expected)
+        response = self.client.get(self.atom_urls[0])
+        self.assertIn('Исправленный пост'.encode(), self.read(response))
+
+    def test_moved_post_invalidates_previous_group(self):
+        """ Перенос поста сбрасывает ленту прежней группы """
+        url = self.atom_urls[2]
+        etag = self.client.get(url)['ETag']
+        post = self.posts[0]
+        post.group = self.other_group
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
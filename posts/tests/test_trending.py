@@ -0,0 +1,94 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Comment, Like, Post, PostActivity
+from posts.settings import TRENDING_BUCKET, TRENDING_WINDOW
+from posts.tests.base import PostsTestCase
+from posts.trending import (
+    current_bucket, get_trending, record_activity, refresh_trending,
+)
+
+
+class TrendingTest(PostsTestCase):
+    """ Популярное по лайкам и комментариям за скользящее окно """
+
+    with_reader = True
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+        self.quiet = Post.objects.create(text='Quiet', author=self.user)
+        self.liked = Post.objects.create(text='Liked', author=self.user)
+        self.discussed = Post.objects.create(
+            text='Discussed', author=self.user)
+
+    def test_views_update_counters(self):
+        """ Лайк, отмена лайка и комментарий меняют счётчики интервала """
+        self.client.get(reverse(
+            'post_like', args=[self.user.username, self.liked.id]))
+        self.client.post(
+            reverse('add_comment', args=[
+                self.user.username, self.discussed.id]),
+            {'text': 'Комментарий'})
+        self.assertEqual(
+            PostActivity.objects.get(post=self.liked).likes, 1)
+        self.assertEqual(
+            PostActivity.objects.get(post=self.discussed).comments, 1)
+        self.client.get(reverse(
+            'post_unlike', args=[self.user.username, self.liked.id]))
+        self.assertEqual(
+            PostActivity.objects.get(post=self.liked).likes, 0)
+
+    def test_trending_order_and_page(self):
+        """ Комментарий весит больше лайка, пост без активности скрыт """
+        Like.objects.create(post=self.liked, user=self.reader)
+        Comment.objects.create(
+            post=self.discussed, author=self.reader, text='!')
+        self.assertEqual(
+            [post_id for post_id, _ in refresh_trending()],
+            [self.discussed.id, self.liked.id])
+        with self.assertNumQueries(0):
+            get_trending()
+        response = self.client.get(reverse('trending'))
+        self.assertEqual(
+            response.context['page'], [self.discussed, self.liked])
+
+    def test_old_buckets_leave_window(self):
+        """ Интервалы старше окна не учитываются и удаляются """
+        Like.objects.create(post=self.liked, user=self.reader)
+        later = time.time() + TRENDING_WINDOW
+        self.assertEqual(refresh_trending(later), [])
+        self.assertFalse(PostActivity.objects.exists())
+
+    def test_deleting_post_with_activity(self):
+        """ Каскадное удаление лайков не ломает удаление поста """
+        Like.objects.create(post=self.liked, user=self.reader)
+        Comment.objects.create(post=self.liked, author=self.reader, text='!')
+        self.liked.delete()
+        self.assertFalse(PostActivity.objects.exists())
+
+    def test_unlike_hits_bucket_of_like(self):
+        """ Отмена лайка вычитается из интервала самого лайка, старый
+        лайк вне окна не трогает окно, счётчик не уходит ниже нуля """
+        like = Like.objects.create(post=self.liked, user=self.reader)
+        liked_at = like.created - timedelta(seconds=TRENDING_BUCKET)
+        earlier = current_bucket(liked_at.timestamp())
+        PostActivity.objects.create(post=self.liked, bucket=earlier, likes=1)
+        Like.objects.filter(pk=like.pk).update(created=liked_at)
+        Like.objects.get(pk=like.pk).delete()
+        self.assertEqual(
+            PostActivity.objects.get(post=self.liked, bucket=earlier).likes, 0)
+        self.assertEqual(PostActivity.objects.get(
+            post=self.liked, bucket=earlier + 1).likes, 1)
+        record_activity(self.liked.id, 'likes', -1,
+                        like.created - timedelta(seconds=TRENDING_WINDOW))
+        record_activity(self.liked.id, 'likes', -1, liked_at)
+        self.assertEqual(
+            [activity.likes for activity in PostActivity.objects.filter(
+                post=self.liked).order_by('bucket')], [0, 1])
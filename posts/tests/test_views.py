@@ -5,7 +5,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
 from django.urls import reverse
 
-from posts.models import Comment, Follow, Post
+from posts.caching import GROUP_PAGE, page_generations
+from posts.models import Comment, Follow, Like, Post, User
 from posts.settings import POSTS_PER_PAGE
 from posts.tests.test_settings import TestSettings
 
@@ -73,15 +74,77 @@ class PostPagesTests(TestSettings):
     def test_cache_index_page(self):
         """Тестирование кэша главной страницы"""
         response_1 = self.authorized_client.get(self.URL_NAMES['INDEX'])
+        Post.objects.filter(id=self.post.id).update(text='Кэш это круто')
+        response_2 = self.authorized_client.get(self.URL_NAMES['INDEX'])
+        self.assertEqual(response_1.content, response_2.content)
+        cache.clear()
+        response_3 = self.authorized_client.get(self.URL_NAMES['INDEX'])
+        self.assertNotEqual(response_1.content, response_3.content)
+
+    def test_cache_is_invalidated_by_new_post(self):
+        """ Новый пост сразу сбрасывает кэш ленты """
+        response_1 = self.authorized_client.get(self.URL_NAMES['INDEX'])
         Post.objects.create(
             text='Кэш это круто',
             author=self.user,
         )
         response_2 = self.authorized_client.get(self.URL_NAMES['INDEX'])
-        self.assertEqual(response_1.content, response_2.content)
+        self.assertNotEqual(response_1.content, response_2.content)
+        self.assertContains(response_2, 'Кэш это круто')
+
+    def test_cache_depends_on_page_and_viewer(self):
+        """ Кэш ленты разный для страниц и для зрителей """
+        for number in range(POSTS_PER_PAGE):
+            Post.objects.create(text=f'Пост {number}', author=self.user)
+        first = self.guest_client.get(self.URL_NAMES['INDEX'])
+        second = self.guest_client.get(
+            self.URL_NAMES['INDEX'],
+            {'cursor': first.context['page'].next_cursor})
+        self.assertContains(second, 'Post text')
+        self.assertNotContains(first, 'Post text')
+        author_page = self.authorized_client.get(self.URL_NAMES['INDEX'])
+        self.assertContains(author_page, 'bi-pencil')
+        self.assertNotContains(first, 'bi-pencil')
+
+    def test_cached_page_skips_page_queries(self):
+        """ Готовый фрагмент ленты отдаётся гостю без запросов к базе """
         cache.clear()
-        response_3 = self.authorized_client.get(self.URL_NAMES['INDEX'])
-        self.assertNotEqual(response_1.content, response_3.content)
+        self.guest_client.get(self.URL_NAMES['INDEX'])
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.URL_NAMES['INDEX'])
+        self.assertContains(response, 'Post text')
+
+    def test_readers_share_page_fragment(self):
+        """ Читатели без лайков на странице видят один фрагмент """
+        cache.clear()
+        reader = User.objects.create(username='Reader')
+        self.not_author.get(self.URL_NAMES['INDEX'])
+        self.guest_client.force_login(reader)
+        context = self.guest_client.get(self.URL_NAMES['INDEX']).context
+        self.assertIsNotNone(context['feed_fragment'])
+        self.assertIn('page', context)
+        self.assertIn('paginator', context)
+
+    def test_invalid_cursor_shares_first_page(self):
+        """ Неверный курсор не заводит в кэше своих записей """
+        first = self.guest_client.get(self.URL_NAMES['INDEX']).context
+        for cursor in ('junk', 'W10', ''):
+            with self.subTest(cursor=cursor):
+                context = self.guest_client.get(
+                    self.URL_NAMES['INDEX'], {'cursor': cursor}).context
+                self.assertEqual(
+                    context['feed_cache_key'], first['feed_cache_key'])
+                self.assertEqual(list(context['page']), list(first['page']))
+
+    def test_like_keeps_other_feeds(self):
+        """ Лайк сбрасывает страницы лент с постом, но не чужие группы """
+        group = page_generations(GROUP_PAGE, self.group.slug)
+        other = page_generations(GROUP_PAGE, self.group_edit.slug)
+        Like.objects.create(post=self.post, user=self.user_not_author)
+        self.assertNotEqual(
+            page_generations(GROUP_PAGE, self.group.slug), group)
+        self.assertEqual(
+            page_generations(GROUP_PAGE, self.group_edit.slug), other)
 
     def test_authorized_client_can_not_follow_himself(self):
         """ Тест проверяет, что авторизованный пользователь не может
@@ -0,0 +1,80 @@
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .models import PostActivity
+from .settings import (
+    TRENDING_BUCKET, TRENDING_COMMENT_WEIGHT, TRENDING_SIZE,
+    TRENDING_TIMEOUT, TRENDING_WINDOW,
+)
+
+TRENDING_KEY = 'posts:trending'
+
+
+def current_bucket(now=None):
+    """ Номер интервала TRENDING_BUCKET, в который попадает время now """
+    return int((time.time() if now is None else now) // TRENDING_BUCKET)
+
+
+def window_start(now=None):
+    """ Первый интервал скользящего окна """
+    return current_bucket(now) - TRENDING_WINDOW // TRENDING_BUCKET + 1
+
+
+def record_activity(post_id, field, delta, when=None):
+    """ Меняет счётчик поста в текущем интервале.
+
+    Отмена лайка или удаление комментария вычитается из интервала самого
+    лайка или комментария, времени when. Интервал вне окна уже не
+    считается и не меняется, счётчик не уходит ниже нуля, новых строк
+    не создаётся: так каскадное удаление поста не оставляет ссылок
+    на него.
+    """
+    activity = PostActivity.objects.filter(post_id=post_id)
+    if delta < 0:
+        bucket = current_bucket(when.timestamp() if when else None)
+        if bucket >= window_start():
+            activity.filter(bucket=bucket).update(
+                **{field: Greatest(F(field) + delta, 0)})
+        return
+    bucket = current_bucket()
+    if activity.filter(bucket=bucket).update(**{field: F(field) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            PostActivity.objects.create(
+                post_id=post_id, bucket=bucket, **{field: delta})
+    except IntegrityError:
+        activity.filter(bucket=bucket).update(**{field: F(field) + delta})
+
+
+def compute_trending(now=None, size=TRENDING_SIZE):
+    """ Самые активные посты окна: GROUP BY только по строкам окна,
+    а не по всей таблице лайков """
+    scores = PostActivity.objects.filter(
+        bucket__gte=window_start(now),
+    ).values('post_id').annotate(
+        score=Sum(F('likes') + TRENDING_COMMENT_WEIGHT * F('comments')),
+    ).filter(score__gt=0).order_by('-score', '-post_id')[:size]
+    return [(row['post_id'], row['score']) for row in scores]
+
+
+def refresh_trending(now=None):
+    """ Пересчитывает список популярного, удаляет интервалы вне окна """
+    PostActivity.objects.filter(bucket__lt=window_start(now)).delete()
+    trending = compute_trending(now)
+    cache.set(TRENDING_KEY, trending, TRENDING_TIMEOUT)
+    return trending
+
+
+def get_trending():
+    """ Список пар (id поста, очки) из кэша. Если фоновая задача
+    не успела, список считается один раз и кладётся в кэш """
+    trending = cache.get(TRENDING_KEY)
+    if trending is None:
+        trending = compute_trending()
+        cache.add(TRENDING_KEY, trending, TRENDING_TIMEOUT)
+    return trending
@@ -1,6 +1,9 @@
-from django.urls import path
+from django.urls import path, register_converter
 
 from . import views
+from .converters import FeedFormatConverter
+
+register_converter(FeedFormatConverter, 'feed_format')
 
 urlpatterns = [
      path('',
@@ -21,6 +24,33 @@ urlpatterns = [
      path('groups/',
          views.groups_view,
          name='groups_view'),
+     path('autocomplete/',
+         views.autocomplete_view,
+         name='autocomplete'),
+     path('trending/',
+         views.trending,
+         name='trending'),
+     path('search/',
+         views.search,
+         name='search'),
+     path('api/posts/',
+         views.api_posts,
+         name='api_posts'),
+     path('api/group/<slug:slug>/posts/',
+         views.api_group_posts,
+         name='api_group_posts'),
+     path('api/<str:username>/posts/',
+         views.api_profile_posts,
+         name='api_profile_posts'),
+     path('feed/<feed_format:feed_format>/',
+         views.site_feed,
+         name='site_feed'),
+     path('group/<slug:slug>/feed/<feed_format:feed_format>/',
+         views.group_feed,
+         name='group_feed'),
+     path('<str:username>/feed/<feed_format:feed_format>/',
+         views.profile_feed,
+         name='profile_feed'),
      path('<str:username>/',
          views.profile,
          name='profile'),
@@ -54,6 +84,9 @@ urlpatterns = [
      path('<str:username>/<int:post_id>/<int:comment_id>/comment_edit/',
          views.comment_edit,
          name='comment_edit'),
+     path('<str:username>/export/',
+         views.export,
+         name='export'),
      path('<str:username>/follow/',
          views.profile_follow,
          name='profile_follow'),
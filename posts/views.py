@@ -1,56 +1,177 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.http.response import HttpResponseRedirect
+from django.http.response import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.urls import reverse
+
+from .api import posts_response
+from .autocomplete import USER, autocomplete
+from .caching import (
+    GROUP_PAGE, INDEX_PAGE, PROFILE_HEADER, PROFILE_PAGE, get_generation,
+    get_user_stats, make_etag, not_modified, page_generation_key,
+    page_generations, with_etag,
+)
+from .export import export_response
+from .feed import (
+    entries_to_posts, feed_page_context, get_follow_page, liked_post_ids,
+)
 from .forms import CommentForm, PostForm, GroupForm
+from .group_activity import groups_page
+from .images import PageImages, enqueue_thumbnails
 from .models import Comment, Follow, Group, Post, Like, User
-from .settings import POSTS_PER_PAGE
+from .search import get_search_page
+from .syndication import AUTHOR, GROUP, SITE, feed_response, syndication_key
+from .trending import get_trending
 
 
 def index(request):
     """ Главная страница """
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page, 'paginator': paginator}
-    return render(request, 'index.html', context)
+    generations = page_generations(INDEX_PAGE)
+    etag = make_etag(request, generations, request.GET.get('cursor', ''))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    context = feed_page_context(request, Post.objects.feed(), generations)
+    return with_etag(render(request, 'index.html', context), etag)
 
 
 def profile(request, username):
     """ Страница профайла """
+    # Счётчики профиля меняются вместе с его лентой или шапкой, поэтому
+    # ETag проверяется до запросов автора, статистики и подписки
+    generations = page_generations(PROFILE_PAGE, username)
+    etag = make_etag(
+        request, generations, request.GET.get('cursor', ''),
+        get_generation(page_generation_key(PROFILE_HEADER, username)))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
     is_following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author).exists()
     context = {
-        'page': page,
-        'paginator': paginator,
         'author': author,
+        'stats': get_user_stats(author.id),
         'is_following': is_following,
+        **feed_page_context(request, author.posts.feed(), generations),
         }
-    return render(request, 'posts/profile.html', context)
+    return with_etag(render(request, 'posts/profile.html', context), etag)
+
+
+def trending(request):
+    """ Популярные посты за последние сутки """
+    ids = [post_id for post_id, _ in get_trending()]
+    posts = Post.objects.feed().in_bulk(ids)
+    post_list = [posts[post_id] for post_id in ids if post_id in posts]
+    return render(request, 'posts/trending.html', {
+        'page': post_list,
+        'liked_posts': liked_post_ids(request.user, post_list),
+        'page_images': PageImages(post_list),
+    })
+
+
+def search(request):
+    """ Поиск по тексту постов """
+    query = request.GET.get('q', '').strip()
+    page = get_search_page(request, query)
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page': page,
+        'paginator': page.paginator,
+        'liked_posts': liked_post_ids(request.user, page),
+        'page_images': PageImages(page),
+    })
+
+
+def autocomplete_view(request):
+    """ Подсказки пользователей и групп по началу имени """
+    results = []
+    for kind, value, label in autocomplete(request.GET.get('q', '')):
+        url_name = 'profile' if kind == USER else 'group'
+        results.append({
+            'type': kind,
+            'value': value,
+            'label': label,
+            'url': reverse(url_name, args=[value]),
+        })
+    return JsonResponse({'results': results})
+
+
+# БЛОК API
+
+def api_posts(request):
+    """ Лента постов в JSON """
+    return posts_response(request, Post.objects.all())
+
+
+def api_profile_posts(request, username):
+    """ Посты автора в JSON """
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    return posts_response(request, Post.objects.filter(author_id=author_id))
+
+
+def api_group_posts(request, slug):
+    """ Посты группы в JSON """
+    group_id = get_object_or_404(
+        Group.objects.values_list('pk', flat=True), slug=slug)
+    return posts_response(request, Post.objects.filter(group_id=group_id))
+
+
+# БЛОК ЛЕНТ RSS И ATOM
+
+def site_feed(request, feed_format):
+    """ Новые посты сайта в RSS или Atom """
+    def describe():
+        return Post.objects.all(), {
+            'title': 'Yatube',
+            'link': reverse('index'),
+            'description': 'Новые записи Yatube',
+        }
+    return feed_response(
+        request, feed_format, syndication_key(SITE), describe)
+
+
+def profile_feed(request, username, feed_format):
+    """ Новые посты автора в RSS или Atom """
+    def describe():
+        author = get_object_or_404(User, username=username)
+        return Post.objects.filter(author=author), {
+            'title': f'Yatube: {author.get_full_name() or author.username}',
+            'link': reverse('profile', args=[author.username]),
+            'description': f'Новые записи @{author.username}',
+        }
+    return feed_response(
+        request, feed_format, syndication_key(AUTHOR, username), describe)
+
+
+def group_feed(request, slug, feed_format):
+    """ Новые посты группы в RSS или Atom """
+    def describe():
+        group = get_object_or_404(Group, slug=slug)
+        return Post.objects.filter(group=group), {
+            'title': f'Yatube: {group.title}',
+            'link': reverse('group', args=[group.slug]),
+            'description': group.description,
+        }
+    return feed_response(
+        request, feed_format, syndication_key(GROUP, slug), describe)
 
 
 # БЛОК ГРУПП
 
 def group_posts(request, slug):
     """ Странциа просмотра группы """
+    generations = page_generations(GROUP_PAGE, slug)
+    etag = make_etag(request, generations, request.GET.get('cursor', ''))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'posts/group.html', {
+    return with_etag(render(request, 'posts/group.html', {
         'group': group,
-        'page': page,
-        'paginator': paginator
-    })
+        **feed_page_context(request, group.posts.feed(), generations),
+    }), etag)
 
 
 @login_required
@@ -67,15 +188,12 @@ def new_group(request):
 
 @login_required
 def groups_view(request):
-    """ Страница со всеми группами """
-    groups = Group.objects.all()
-    paginator = Paginator(groups, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    """ Страница со всеми группами, самые активные сверху """
+    page, snapshot = groups_page(request)
     return render(request, 'posts/groups.html', {
-        'groups': groups,
         'page': page,
-        'paginator': paginator
+        'paginator': page.paginator,
+        'snapshot': snapshot,
     })
 
 
@@ -117,6 +235,7 @@ def new_post(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    enqueue_thumbnails(post.image)
     return redirect('index')
 
 
@@ -131,20 +250,28 @@ def delete_post(request, username, post_id):
 
 def post_view(request, username, post_id):
     """ Просмотр поста """
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    # Правки поста, его комментариев и имён в них сдвигают версию поста
+    etag = make_etag(
+        request, post_id,
+        Post.objects.filter(author__username=username, id=post_id)
+        .values_list('version', 'likes_count', 'comments_count').first())
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    post = get_object_or_404(
+        Post.objects.feed(), author__username=username, id=post_id)
     form = CommentForm()
     comments = post.comments.all()
-    is_liked = request.user.is_authenticated and Like.objects.filter(
-        user=request.user,
-        post=post).exists()
+    liked_posts = liked_post_ids(request.user, [post])
     context = {
         'post': post,
         'author': post.author,
         'form': form,
         'comments': comments,
-        'is_liked': is_liked
+        'is_liked': post.id in liked_posts,
+        'liked_posts': liked_posts,
     }
-    return render(request, 'posts/post.html', context)
+    return with_etag(render(request, 'posts/post.html', context), etag)
 
 
 @login_required
@@ -162,7 +289,9 @@ def post_edit(request, username, post_id):
             'post': post,
         }
         return render(request, 'posts/new_post.html', context)
-    form.save()
+    post = form.save()
+    if 'image' in form.changed_data:
+        enqueue_thumbnails(post.image)
     return redirect('post', username, post_id)
 
 
@@ -227,19 +356,26 @@ def post_unlike(request, username, post_id):
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
 
 
+@login_required
+def export(request, username):
+    """ Выгрузка своих постов, комментариев и лайков в NDJSON или CSV """
+    if username != request.user.username:
+        return redirect('profile', username)
+    return export_response(request.user, request.GET.get('format', 'ndjson'))
+
+
 # БЛОК ПОДПИСКИ
 
 @login_required
 def follow_index(request):
     """ Страница подписок """
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = get_follow_page(request)
+    page.object_list = entries_to_posts(page.object_list)
     return render(request, 'posts/follow.html', {
         'page': page,
-        'paginator': paginator,
+        'paginator': page.paginator,
+        'liked_posts': liked_post_ids(request.user, page),
+        'page_images': PageImages(page),
     })
 
 
@@ -0,0 +1,558 @@
+"""
+Общие для всех процессов бэкенды кэша.
+
+LocMemCache живёт внутри одного процесса: у каждого WSGI-воркера свой
+холодный кэш, а сброс поколения лент в одном воркере не виден другим.
+SQLiteCache хранит данные в одном файле и не требует внешних сервисов,
+RedisCache подключается, если установлен пакет redis. TwoTierCache
+ставит перед любым из них небольшой LRU в памяти процесса.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+# Ограничение SQLite на число параметров в одном запросе
+SQLITE_BATCH = 500
+
+
+class SQLiteCache(BaseCache):
+    """ Кэш в файле SQLite в режиме WAL.
+
+    Соединение открывается отдельно для каждого потока и заново после
+    fork, поэтому бэкенд безопасен для воркеров gunicorn/uwsgi.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._sets = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL'
+                ') WITHOUT ROWID')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?',
+            (self._key(key, version),)).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        found = {}
+        connection = self._connection()
+        batch_keys = list(names)
+        for start in range(0, len(batch_keys), SQLITE_BATCH):
+            batch = batch_keys[start:start + SQLITE_BATCH]
+            rows = connection.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({})'
+                .format(', '.join('?' * len(batch))), batch)
+            for name, value, expires in rows:
+                if self._alive(expires):
+                    found[names[name]] = pickle.loads(value)
+        return found
+
+    def get_many_with_ttl(self, keys, version=None):
+        """ Как get_many, но значение идёт в паре с оставшимся сроком
+        жизни записи в секундах, None для бессрочной """
+        names = {self._key(key, version): key for key in keys}
+        found = {}
+        connection = self._connection()
+        batch_keys = list(names)
+        now = time.time()
+        for start in range(0, len(batch_keys), SQLITE_BATCH):
+            batch = batch_keys[start:start + SQLITE_BATCH]
+            rows = connection.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({})'
+                .format(', '.join('?' * len(batch))), batch)
+            for name, value, expires in rows:
+                if expires is None or expires > now:
+                    found[names[name]] = (
+                        pickle.loads(value),
+                        None if expires is None else expires - now)
+        return found
+
+    def has_key(self, key, version=None):
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self._key(key, version),)).fetchone()
+        return row is not None and self._alive(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version),
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        self._connection().executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)', rows)
+        self._sets += len(rows)
+        if self._sets >= self._max_entries // self._cull_frequency:
+            self._sets = 0
+            self._cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection = self._connection()
+        with self._transaction(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()))
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, value, self.get_backend_timeout(timeout)))
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()))
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        """ Атомарно между процессами: чтение и запись в одной
+        транзакции BEGIN IMMEDIATE """
+        name = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (name,)).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), name))
+        return value
+
+    def delete(self, key, version=None):
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        self._connection().executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys])
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами одного потока
+        pass
+
+    def _transaction(self, connection):
+        return _Immediate(connection)
+
+    def _cull(self):
+        """ Удаляет истёкшие записи, а при переполнении ещё и
+        1/cull_frequency самых старых по сроку жизни """
+        connection = self._connection()
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (max(count // self._cull_frequency, 1),))
+
+
+class _Immediate:
+    """ BEGIN IMMEDIATE ... COMMIT: блокировка записи берётся сразу,
+    поэтому чтение-изменение-запись не перемешивается с другими
+    процессами """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class RedisCache(BaseCache):
+    """ Кэш на сервере с протоколом Redis (Redis, KeyDB, Valkey).
+
+    Целые числа хранятся как есть, чтобы incr выполнялся на сервере
+    командой INCRBY, остальные значения сериализуются pickle.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'Для RedisCache установите пакет redis: pip install redis')
+        self._client = redis.Redis.from_url(server)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dumps(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(raw):
+        try:
+            return int(raw)
+        except ValueError:
+            return pickle.loads(raw)
+
+    def _ttl(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        if expires is None:
+            return None
+        return max(int((expires - time.time()) * 1000), 1)
+
+    def get(self, key, default=None, version=None):
+        raw = self._client.get(self._key(key, version))
+        return default if raw is None else self._loads(raw)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self._key(key, version) for key in keys])
+        return {
+            key: self._loads(raw)
+            for key, raw in zip(keys, values) if raw is not None
+        }
+
+    def get_many_with_ttl(self, keys, version=None):
+        """ Как get_many, но значение идёт в паре с оставшимся сроком
+        жизни записи в секундах, None для бессрочной """
+        keys = list(keys)
+        pipeline = self._client.pipeline(transaction=False)
+        for key in keys:
+            name = self._key(key, version)
+            pipeline.get(name)
+            pipeline.pttl(name)
+        replies = pipeline.execute()
+        found = {}
+        for key, raw, ttl in zip(keys, replies[::2], replies[1::2]):
+            if raw is not None:
+                found[key] = (
+                    self._loads(raw), None if ttl < 0 else ttl / 1000)
+        return found
+
+    def has_key(self, key, version=None):
+        return bool(self._client.exists(self._key(key, version)))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._client.set(
+            self._key(key, version), self._dumps(value),
+            px=self._ttl(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        ttl = self._ttl(timeout)
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in data.items():
+            pipeline.set(self._key(key, version), self._dumps(value), px=ttl)
+        pipeline.execute()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._client.set(
+            self._key(key, version), self._dumps(value),
+            px=self._ttl(timeout), nx=True))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._key(key, version)
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return bool(self._client.persist(name)) or self.has_key(
+                key, version)
+        return bool(self._client.pexpire(name, ttl))
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        if not self._client.exists(name):
+            raise ValueError("Key '%s' not found" % key)
+        return self._client.incrby(name, delta)
+
+    def delete(self, key, version=None):
+        return bool(self._client.delete(self._key(key, version)))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
+    def clear(self):
+        """ Удаляет только ключи с префиксом этого кэша, если он задан """
+        if not self.key_prefix:
+            self._client.flushdb()
+            return
+        names = self._client.scan_iter(match=f'{self.key_prefix}:*')
+        pipeline = self._client.pipeline(transaction=False)
+        for name in names:
+            pipeline.delete(name)
+        pipeline.execute()
+
+
+class _LocalTier:
+    """ LRU процесса, общий для всех потоков воркера """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.seen = None
+        self.polled = 0.0
+
+    def get(self, name, missing):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return missing
+            expires, value, packed = entry
+            if expires <= time.monotonic():
+                del self.entries[name]
+                return missing
+            self.entries.move_to_end(name)
+        return pickle.loads(value) if packed else value
+
+    def put(self, name, value, timeout):
+        packed = not isinstance(value, (str, bytes, int, float, type(None)))
+        if packed:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[name] = (time.monotonic() + timeout, value, packed)
+            self.entries.move_to_end(name)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def evict(self, names):
+        with self.lock:
+            for name in names:
+                self.entries.pop(name, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """ LRU в памяти процесса перед общим кэшем.
+
+    LOCATION - alias общего кэша из CACHES. Каждая запись и удаление
+    публикуются в журнал инвалидации в общем кэше: счётчик SEQ_KEY и
+    записи LOG_KEY с именами изменённых ключей. Остальные воркеры читают
+    журнал не реже чем раз в POLL_INTERVAL секунд и выбрасывают эти ключи
+    из своего LRU, так что устаревшее значение живёт не дольше этого
+    интервала. Если часть журнала потеряна, LRU очищается целиком.
+    """
+
+    SEQ_KEY = 'tier:seq'
+    LOG_KEY = 'tier:log:{}'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._poll_interval = options.get('POLL_INTERVAL', 0.5)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self._log_timeout = options.get('LOG_TIMEOUT', 300)
+        self._log_limit = options.get('LOG_LIMIT', 1000)
+        with _tiers_lock:
+            self._tier = _tiers.setdefault(
+                location, _LocalTier(self._max_entries))
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _name(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _local_ttl(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def _sync(self):
+        """ Читает журнал инвалидации не чаще раза в POLL_INTERVAL """
+        tier = self._tier
+        now = time.monotonic()
+        if now - tier.polled < self._poll_interval:
+            return
+        tier.polled = now
+        seq = self.shared.get(self.SEQ_KEY)
+        seen, tier.seen = tier.seen, seq
+        if seq == seen or seen is None and not tier.entries:
+            # Журнал не менялся или в LRU ещё нечего выбрасывать
+            return
+        if seq is None or seen is None or seq < seen \
+                or seq - seen > self._log_limit:
+            tier.clear()
+            return
+        logs = self.shared.get_many([
+            self.LOG_KEY.format(number) for number in range(seen + 1, seq + 1)
+        ])
+        if len(logs) != seq - seen:
+            tier.clear()
+            return
+        for names in logs.values():
+            tier.evict(names)
+
+    def _broadcast(self, names):
+        """ Публикует изменённые ключи для остальных воркеров """
+        try:
+            seq = self.shared.incr(self.SEQ_KEY)
+        except ValueError:
+            self.shared.add(self.SEQ_KEY, 0, None)
+            seq = self.shared.incr(self.SEQ_KEY)
+        self.shared.set(self.LOG_KEY.format(seq), names, self._log_timeout)
+
+    def _fetch(self, keys, version):
+        """ Значения из общего кэша с копией в LRU. Копия живёт не дольше,
+        чем запись в общем кэше, если он сообщает её срок """
+        if hasattr(self.shared, 'get_many_with_ttl'):
+            fetched = self.shared.get_many_with_ttl(keys, version=version)
+        else:
+            ttl = self._local_ttl(DEFAULT_TIMEOUT)
+            fetched = {
+                key: (value, ttl) for key, value in
+                self.shared.get_many(keys, version=version).items()
+            }
+        found = {}
+        for key, (value, ttl) in fetched.items():
+            self._tier.put(
+                self._name(key, version), value, self._local_ttl(ttl))
+            found[key] = value
+        return found
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        missing = object()
+        value = self._tier.get(self._name(key, version), missing)
+        if value is not missing:
+            return value
+        return self._fetch([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found, absent = {}, []
+        missing = object()
+        for key in keys:
+            value = self._tier.get(self._name(key, version), missing)
+            if value is missing:
+                absent.append(key)
+            else:
+                found[key] = value
+        if absent:
+            found.update(self._fetch(absent, version))
+        return found
+
+    def has_key(self, key, version=None):
+        missing = object()
+        return self.get(key, missing, version=version) is not missing
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set_many(data, timeout, version=version)
+        names = []
+        for key, value in data.items():
+            name = self._name(key, version)
+            self._tier.put(name, value, self._local_ttl(timeout))
+            names.append(name)
+        self._broadcast(names)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            name = self._name(key, version)
+            self._tier.put(name, value, self._local_ttl(timeout))
+            self._broadcast([name])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        name = self._name(key, version)
+        self._tier.put(name, value, self._local_timeout)
+        self._broadcast([name])
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        names = [self._name(key, version) for key in keys]
+        self.shared.delete_many(keys, version=version)
+        self._tier.evict(names)
+        self._broadcast(names)
+
+    def clear(self):
+        """ Очистка общего кэша сбрасывает и журнал: остальные воркеры
+        увидят пропавший счётчик и очистят свои LRU """
+        self.shared.clear()
+        self._tier.clear()
+        self._tier.seen = None
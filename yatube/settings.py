@@ -37,7 +37,7 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
     'django.contrib.sites',
     'django.contrib.flatpages',
     'django.contrib.admin',
@@ -153,8 +153,47 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 SITE_ID = 1
 
-CACHES = {
-    'default': {
+# Общий для всех воркеров кэш. По умолчанию файл SQLite рядом с проектом,
+# YATUBE_CACHE=redis://host:6379/0 включает Redis,
+# YATUBE_CACHE=locmem возвращает кэш в памяти процесса
+YATUBE_CACHE = os.environ.get('YATUBE_CACHE', 'sqlite')
+
+if YATUBE_CACHE == 'locmem':
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
+elif YATUBE_CACHE.startswith('redis://'):
+    SHARED_CACHE = {
+        'BACKEND': 'yatube.cache_backends.RedisCache',
+        'LOCATION': YATUBE_CACHE,
+        'KEY_PREFIX': 'yatube',
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'yatube.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+
+# Горячие ключи (первая страница ленты, карточки, статистика популярных
+# профилей) читаются из LRU процесса. Изменения рассылаются через журнал
+# в общем кэше, чужие LRU забывают ключ не позже чем через POLL_INTERVAL
+CACHES = {
+    'default': {
+        'BACKEND': 'yatube.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'POLL_INTERVAL': 0.5,
+            'LOCAL_TIMEOUT': 60,
+        },
+    },
+    'shared': SHARED_CACHE,
 }
+if YATUBE_CACHE == 'locmem':
+    CACHES['default'] = SHARED_CACHE
+
+# Тесты работают с кэшем во временном каталоге, а не с файлом проекта
+TEST_RUNNER = 'yatube.testing.TestRunner'
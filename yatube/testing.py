@@ -0,0 +1,52 @@
+"""
+Окружение тестов.
+
+Кэш по умолчанию лежит в файле рядом с проектом, а тесты очищают его
+и пишут в него ключи. Поэтому на время тестов общий кэш переносится во
+временный каталог, который удаляется после прогона.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TWO_TIER_BACKEND = 'yatube.cache_backends.TwoTierCache'
+
+
+@contextmanager
+def isolated_caches():
+    """ Общий кэш SQLite во временном каталоге вместо настроенного """
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    shared = {
+        'BACKEND': 'yatube.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+    caches = dict(settings.CACHES, shared=shared)
+    if caches['default']['BACKEND'] != TWO_TIER_BACKEND:
+        caches['default'] = shared
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    """ manage.py test с кэшем во временном каталоге """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = isolated_caches()
+        self._caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
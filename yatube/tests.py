@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from yatube.cache_backends import SQLiteCache, TwoTierCache, _LocalTier
+
+
+class SQLiteCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def test_set_get_delete(self):
+        """ Базовые операции кэша """
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertTrue(self.cache.has_key('key'))
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_other_process_sees_changes(self):
+        """ Второй экземпляр с тем же файлом видит запись и сброс """
+        other = SQLiteCache(self.path, {})
+        self.cache.set('generation', 1)
+        other.incr('generation')
+        self.assertEqual(self.cache.get('generation'), 2)
+        other.clear()
+        self.assertIsNone(self.cache.get('generation'))
+
+    def test_add_incr_and_expiry(self):
+        """ add не перезаписывает живой ключ, incr требует ключа """
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.incr('key', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('short', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+
+    def test_many(self):
+        """ Пакетные чтение и запись """
+        self.cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 1000}})
+        self.cache.set_many({f'key{number}': number for number in range(700)})
+        found = self.cache.get_many(['key1', 'key699', 'missing'])
+        self.assertEqual(found, {'key1': 1, 'key699': 699})
+        self.cache.delete_many(['key1', 'key699'])
+        self.assertEqual(self.cache.get_many(['key1', 'key699']), {})
+
+    def test_cull(self):
+        """ При переполнении старые записи вытесняются """
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 30}})
+        for number in range(100):
+            cache.set(f'key{number}', number)
+        count = cache._connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertLessEqual(count, 40)
+
+
+class TwoTierCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        params = {'OPTIONS': {'POLL_INTERVAL': 0}}
+        # Два воркера со своими LRU поверх одного общего кэша
+        self.cache = TwoTierCache('shared', params)
+        self.cache._tier = _LocalTier(100)
+        self.other = TwoTierCache('shared', params)
+        self.other._tier = _LocalTier(100)
+        self.cache.clear()
+
+    def tearDown(self):
+        self.cache.clear()
+        super().tearDown()
+
+    def test_local_hit_skips_shared_cache(self):
+        """ Повторное чтение берётся из LRU процесса """
+        self.cache.set('key', {'value': 1})
+        self.cache.shared.set('key', {'value': 2})
+        self.cache._tier.polled = float('inf')
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+
+    def test_other_worker_drops_changed_key(self):
+        """ Запись в одном воркере вытесняет ключ из LRU другого """
+        self.cache.set('key', 1)
+        self.assertEqual(self.other.get('key'), 1)
+        self.cache.set('key', 2)
+        self.assertEqual(self.other.get('key'), 2)
+        self.cache.delete('key')
+        self.assertIsNone(self.other.get('key'))
+
+    def test_lost_log_clears_local_tier(self):
+        """ Пропавшая запись журнала очищает LRU целиком """
+        self.other.set_many({'first': 1, 'second': 2})
+        self.assertEqual(self.cache.get_many(['first', 'second']),
+                         {'first': 1, 'second': 2})
+        self.other.set('first', 10)
+        self.cache.shared.delete(TwoTierCache.LOG_KEY.format(
+            self.cache.shared.get(TwoTierCache.SEQ_KEY)))
+        self.cache.shared.set('second', 20)
+        self.assertEqual(self.cache.get_many(['first', 'second']),
+                         {'first': 10, 'second': 20})
+
+    def test_local_copy_expires_with_shared_entry(self):
+        """ Копия записи в LRU живёт не дольше записи в общем кэше """
+        self.other.set('key', 1, timeout=0.05)
+        self.assertEqual(self.cache.get('key'), 1)
+        self.assertEqual(self.cache.get_many(['key']), {'key': 1})
+        time.sleep(0.06)
+        self.cache._tier.polled = float('inf')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get_many(['key']), {})